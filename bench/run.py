@@ -0,0 +1,531 @@
+"""
+bench/run.py
+Benchmark inference ai_runtime (reproducible, output JSON)
+
+Fitur:
+- Model kecil bobot acak dibuat lokal (tanpa network), atau --model <folder>
+- Mode: reply (ChatBot.reply), stream (ChatBot.stream_reply),
+  http (POST /chat), http-stream (POST /chat/stream)
+- Concurrency, panjang prompt & kedalaman history bisa diatur (distribusi)
+- Laporan p50/p95/p99 latency, time-to-first-token, tokens/sec, peak RSS
+- --compare <baseline.json> → selisih terhadap run sebelumnya
+
+Contoh:
+    python -m bench.run --mode reply,http --concurrency 1,4 --requests 32 \\
+        --prompt-tokens uniform:8:64 --history-turns 0,2,4 --output bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from pathlib import Path
+
+# Log runtime cukup WARNING agar output benchmark bersih
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+import torch  # noqa: E402
+
+from bench.tiny_model import WORDS, build_tiny_model  # noqa: E402
+
+MODES = ("reply", "stream", "http", "http-stream")
+
+
+# ===============================
+# DISTRIBUSI
+# ===============================
+def parse_distribution(spec: str):
+    """
+    "32" → tetap, "8,32,128" → pilih acak, "uniform:8:64" → acak seragam
+    Return fungsi (rng) → int
+    """
+    spec = spec.strip()
+    if spec.startswith("uniform:"):
+        _, low, high = spec.split(":")
+        low, high = int(low), int(high)
+        return lambda rng: rng.randint(low, high)
+
+    values = [int(v) for v in spec.split(",") if v.strip()]
+    if len(values) == 1:
+        return lambda rng: values[0]
+    return lambda rng: rng.choice(values)
+
+
+def percentiles(values: list[float]) -> dict | None:
+    if not values:
+        return None
+
+    data = sorted(values)
+
+    def pick(q: float) -> float:
+        # Interpolasi linear antar rank
+        pos = (len(data) - 1) * q
+        lo = int(pos)
+        hi = min(lo + 1, len(data) - 1)
+        return data[lo] + (data[hi] - data[lo]) * (pos - lo)
+
+    return {
+        "p50": round(pick(0.50), 6),
+        "p95": round(pick(0.95), 6),
+        "p99": round(pick(0.99), 6),
+        "mean": round(sum(data) / len(data), 6),
+        "max": round(data[-1], 6),
+    }
+
+
+def peak_rss_mb() -> float:
+    # Linux: ru_maxrss dalam KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# ===============================
+# WORKLOAD
+# ===============================
+class Workload:
+    """
+    Prompt & history sintetis, dibuat sebelum pengukuran (deterministik)
+    """
+
+    def __init__(self, tokenizer, args):
+        self.tokenizer = tokenizer
+        self.rng = random.Random(args.seed)
+        self.prompt_tokens = parse_distribution(args.prompt_tokens)
+        self.history_turns = parse_distribution(args.history_turns)
+        self.turn_tokens = parse_distribution(args.turn_tokens)
+
+    def text(self, n_tokens: int) -> str:
+        words: list[str] = []
+        while True:
+            words.append(self.rng.choice(WORDS))
+            if len(self.tokenizer.encode(" ".join(words), add_special_tokens=False)) >= n_tokens:
+                return " ".join(words)
+
+    def requests(self, count: int, tag: str) -> list[dict]:
+        items = []
+        for i in range(count):
+            history = []
+            for _ in range(self.history_turns(self.rng)):
+                user = self.text(max(1, self.turn_tokens(self.rng) // 2))
+                reply = self.text(max(1, self.turn_tokens(self.rng) // 2))
+                history.append(f"\nUser: {user}\nAI: {reply}")
+
+            items.append({
+                "session_id": f"bench-{tag}-{i}",
+                "text": self.text(max(1, self.prompt_tokens(self.rng))),
+                "history": history,
+            })
+        return items
+
+
+def seed_history(bot, item: dict):
+    for turn in item["history"]:
+        ids = array("I", bot.tokenizer.encode(turn, add_special_tokens=False))
+        bot.sessions.append_turn(item["session_id"], ids, max_tokens=bot.max_history_tokens)
+
+
+# ===============================
+# DRIVER
+# ===============================
+class TokenProbe:
+    """
+    Catat waktu token pertama & jumlah token per sesi lewat callback
+    on_token (reply() & /chat tidak mengekspos token). Dipasang di
+    ChatBot._submit sehingga berlaku juga untuk handler HTTP.
+
+    overrides (max_new_tokens, temperature) dipaksakan ke semua generate
+    agar mode lokal & HTTP sebanding.
+    """
+
+    def __init__(self, bot, **overrides):
+        self.overrides = overrides
+        self._records: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._submit = bot._submit
+        bot._submit = self.submit
+
+    def begin(self, session_id: str) -> dict:
+        record = {"first_token": None, "tokens": 0}
+        with self._lock:
+            self._records[session_id] = record
+        return record
+
+    def submit(self, session_id, prompt_ids, on_token=None, **kwargs):
+        with self._lock:
+            record = self._records.get(session_id)
+
+        if record is not None:
+            previous = on_token
+
+            def on_token(token):
+                if record["first_token"] is None:
+                    record["first_token"] = time.perf_counter()
+                record["tokens"] += 1
+                if previous is not None:
+                    previous(token)
+
+        kwargs.update(self.overrides)
+        return self._submit(session_id, prompt_ids, on_token=on_token, **kwargs)
+
+
+def run_local(bot, probe: TokenProbe, item: dict, mode: str, args) -> dict:
+    record = probe.begin(item["session_id"])
+    start = time.perf_counter()
+
+    if mode == "reply":
+        bot.reply(
+            item["text"],
+            session_id=item["session_id"],
+            max_new_tokens=args.max_new_tokens,
+            temperature=args.temperature,
+        )
+    else:
+        for _ in bot.stream_reply(
+            item["text"],
+            session_id=item["session_id"],
+            max_new_tokens=args.max_new_tokens,
+            temperature=args.temperature,
+        ):
+            pass
+
+    end = time.perf_counter()
+    return {
+        "start": start,
+        "end": end,
+        "first_token": record["first_token"],
+        "tokens": record["tokens"],
+    }
+
+
+_http_local = threading.local()
+
+
+def run_http(base_url: str, probe: TokenProbe, item: dict, mode: str, args) -> dict:
+    import requests
+
+    session = getattr(_http_local, "session", None)
+    if session is None:
+        session = _http_local.session = requests.Session()
+
+    # Server jalan di proses yang sama → probe tetap mencatat token engine
+    record = probe.begin(item["session_id"])
+    start = time.perf_counter()
+    first = None
+
+    if mode == "http":
+        r = session.post(
+            f"{base_url}/chat",
+            json={"text": item["text"]},
+            headers={"X-Session-Id": item["session_id"]},
+            timeout=600,
+        )
+        r.raise_for_status()
+    else:
+        with session.post(
+            f"{base_url}/chat/stream",
+            json={"text": item["text"]},
+            headers={"X-Session-Id": item["session_id"]},
+            stream=True,
+            timeout=600,
+        ) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if first is None and line.startswith(b"event: token"):
+                    first = time.perf_counter()
+
+    end = time.perf_counter()
+    return {
+        "start": start,
+        "end": end,
+        "first_token": first if mode == "http-stream" else record["first_token"],
+        "tokens": record["tokens"],
+    }
+
+
+def start_http_server(app) -> tuple[str, object]:
+    from werkzeug.serving import make_server
+
+    # Access log per request hanya menambah noise & overhead
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def run_scenario(bot, probe, mode: str, concurrency: int, items: list[dict], args, base_url=None) -> dict:
+    for item in items:
+        seed_history(bot, item)
+
+    if mode in ("reply", "stream"):
+        def task(item):
+            return run_local(bot, probe, item, mode, args)
+    else:
+        def task(item):
+            return run_http(base_url, probe, item, mode, args)
+
+    errors = 0
+    samples = []
+    wall_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(task, item) for item in items]:
+            try:
+                samples.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"[bench] request gagal: {e}", file=sys.stderr)
+
+    wall = time.perf_counter() - wall_start
+
+    for item in items:
+        bot.reset(item["session_id"])
+
+    latency = [s["end"] - s["start"] for s in samples]
+    ttft = [s["first_token"] - s["start"] for s in samples if s["first_token"] is not None]
+    decode_tps = [
+        (s["tokens"] - 1) / (s["end"] - s["first_token"])
+        for s in samples
+        if s["first_token"] is not None and s["tokens"] > 1 and s["end"] > s["first_token"]
+    ]
+    total_tokens = sum(s["tokens"] for s in samples)
+
+    prompt_lengths = [
+        len(bot.tokenizer.encode(item["text"], add_special_tokens=False)) for item in items
+    ]
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(items),
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "requests_per_second": round(len(samples) / wall, 3) if wall > 0 else None,
+        "tokens_per_second": round(total_tokens / wall, 2) if wall > 0 else None,
+        "latency_seconds": percentiles(latency),
+        "ttft_seconds": percentiles(ttft),
+        "decode_tokens_per_second": percentiles(decode_tps),
+        "output_tokens": percentiles([float(s["tokens"]) for s in samples]),
+        "input_tokens": percentiles([float(n) for n in prompt_lengths]),
+        "history_turns": percentiles([float(len(item["history"])) for item in items]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_all(tokenizer, model, modes: list[str], concurrencies: list[int], args) -> list[dict]:
+    from core.chatbot import ChatBot
+
+    bot = ChatBot(tokenizer, model, max_history_tokens=args.max_history_tokens, device="cpu")
+    probe = TokenProbe(
+        bot,
+        max_new_tokens=args.max_new_tokens,
+        temperature=args.temperature,
+    )
+    workload = Workload(tokenizer, args)
+
+    base_url = None
+    http_server = None
+    if any(m.startswith("http") for m in modes):
+        from server import runtime
+        from server.app import app
+
+        runtime.set_bot(bot)
+        base_url, http_server = start_http_server(app)
+
+    # Warmup (tidak diukur)
+    for item in workload.requests(args.warmup, "warmup"):
+        run_local(bot, probe, item, "reply", args)
+        bot.reset(item["session_id"])
+
+    results = []
+    try:
+        for mode in modes:
+            for concurrency in concurrencies:
+                items = workload.requests(args.requests, f"{mode}-{concurrency}")
+                result = run_scenario(bot, probe, mode, concurrency, items, args, base_url)
+                results.append(result)
+
+                lat = result["latency_seconds"] or {}
+                print(
+                    f"[bench] {mode:<11} c={concurrency:<3} "
+                    f"p50={lat.get('p50')}s p95={lat.get('p95')}s "
+                    f"tok/s={result['tokens_per_second']} rss={result['peak_rss_mb']}MB",
+                    file=sys.stderr,
+                )
+    finally:
+        if http_server is not None:
+            http_server.shutdown()
+        bot.close()
+
+    return results
+
+
+# ===============================
+# META & COMPARE
+# ===============================
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_key(result: dict) -> tuple:
+    return result["mode"], result["concurrency"]
+
+
+def compare(report: dict, baseline_path: Path) -> list[dict]:
+    """
+    Selisih (%) p50/p95 latency & tokens/sec terhadap baseline
+    """
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    previous = {scenario_key(r): r for r in baseline.get("results", [])}
+
+    def delta(new, old):
+        if new is None or not old:
+            return None
+        return round((new - old) / old * 100, 2)
+
+    rows = []
+    for result in report["results"]:
+        old = previous.get(scenario_key(result))
+        if old is None:
+            continue
+
+        rows.append({
+            "mode": result["mode"],
+            "concurrency": result["concurrency"],
+            "latency_p50_pct": delta(
+                (result["latency_seconds"] or {}).get("p50"),
+                (old["latency_seconds"] or {}).get("p50"),
+            ),
+            "latency_p95_pct": delta(
+                (result["latency_seconds"] or {}).get("p95"),
+                (old["latency_seconds"] or {}).get("p95"),
+            ),
+            "tokens_per_second_pct": delta(result["tokens_per_second"], old["tokens_per_second"]),
+        })
+    return rows
+
+
+# ===============================
+# MAIN
+# ===============================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inference ai_runtime")
+    parser.add_argument("--mode", default="reply,http",
+                        help=f"Daftar mode dipisah koma: {', '.join(MODES)}")
+    parser.add_argument("--concurrency", default="1,4",
+                        help="Daftar concurrency dipisah koma")
+    parser.add_argument("--requests", type=int, default=32,
+                        help="Jumlah request per skenario")
+    parser.add_argument("--prompt-tokens", default="uniform:8:64",
+                        help="Distribusi panjang input (token)")
+    parser.add_argument("--history-turns", default="0,2,4",
+                        help="Distribusi jumlah turn history per sesi")
+    parser.add_argument("--turn-tokens", default="32",
+                        help="Distribusi panjang satu turn history (token)")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--max-history-tokens", type=int, default=512)
+    parser.add_argument("--temperature", type=float, default=0.0,
+                        help="0 = greedy (deterministik)")
+    parser.add_argument("--warmup", type=int, default=2,
+                        help="Request warmup sebelum pengukuran")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default=None,
+                        help="Folder model HuggingFace (default: model kecil acak)")
+    parser.add_argument("--hidden-size", type=int, default=64)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch.set_num_threads (0 = default torch)")
+    parser.add_argument("--output", default=None, help="File JSON hasil (default stdout)")
+    parser.add_argument("--compare", default=None, help="File JSON baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    modes = [m.strip() for m in args.mode.split(",") if m.strip()]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Mode tidak dikenal: {mode}")
+    concurrencies = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    random.seed(args.seed)
+
+    from core.model_loader import load_model_from
+
+    with tempfile.TemporaryDirectory(prefix="ai_runtime_bench_") as tmp:
+        if args.model:
+            model_dir = Path(args.model)
+            model_info = {"path": str(model_dir)}
+        else:
+            model_dir = Path(tmp) / "tiny"
+            model_info = build_tiny_model(
+                model_dir,
+                hidden_size=args.hidden_size,
+                num_layers=args.layers,
+                seed=args.seed,
+            )
+
+        load_start = time.perf_counter()
+        tokenizer, model, load_info = load_model_from(model_dir, device="cpu", precision=args.precision)
+        load_seconds = time.perf_counter() - load_start
+
+        results = run_all(tokenizer, model, modes, concurrencies, args)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "model": model_info,
+            "precision": load_info["precision"].get("active"),
+            "load_seconds": round(load_seconds, 4),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    if args.compare:
+        report["compare"] = compare(report, Path(args.compare))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
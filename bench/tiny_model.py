@@ -0,0 +1,105 @@
+"""
+bench/tiny_model.py
+Model kausal kecil (bobot acak) + tokenizer untuk benchmark lokal
+
+Catatan:
+- Tanpa network: tokenizer BPE dilatih dari korpus kecil bawaan
+- Deterministik: seed sama → tokenizer & bobot sama
+- Disimpan format HuggingFace (safetensors) → di-load lewat
+  core.model_loader seperti model asli
+"""
+
+import random
+from pathlib import Path
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+EOS_TOKEN = "<eos>"
+
+WORDS = (
+    "apa itu kecerdasan buatan mesin belajar data model bahasa jawab "
+    "pertanyaan dengan jelas singkat benar halo kabar baik terima kasih "
+    "bagaimana cara kerja komputer internet jaringan server aplikasi "
+    "indonesia kota negara sejarah ilmu pengetahuan matematika fisika "
+    "kimia biologi ekonomi musik olahraga makanan minuman cuaca hari ini "
+    "besok kemarin waktu tempat orang teman keluarga sekolah kantor"
+).split()
+
+
+def _corpus(seed: int, n_lines: int = 2000) -> list[str]:
+    rng = random.Random(seed)
+    lines = ["Instruksi: Jawablah dengan bahasa Indonesia yang jelas, singkat, dan benar."]
+    for _ in range(n_lines):
+        user = " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))
+        reply = " ".join(rng.choices(WORDS, k=rng.randint(3, 20)))
+        lines.append(f"\nUser: {user}\nAI: {reply}")
+    return lines
+
+
+def build_tokenizer(vocab_size: int = 512, seed: int = 0) -> PreTrainedTokenizerFast:
+    tok = Tokenizer(models.BPE())
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=[EOS_TOKEN],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    )
+    tok.train_from_iterator(_corpus(seed), trainer)
+
+    return PreTrainedTokenizerFast(tokenizer_object=tok, eos_token=EOS_TOKEN)
+
+
+def build_tiny_model(
+    path: Path,
+    vocab_size: int = 512,
+    hidden_size: int = 64,
+    num_layers: int = 2,
+    num_heads: int = 4,
+    num_kv_heads: int = 2,
+    max_positions: int = 2048,
+    seed: int = 0,
+) -> dict:
+    """
+    Buat & simpan model ke path. Return ringkasan konfigurasi.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = build_tokenizer(vocab_size, seed)
+    eos_id = tokenizer.eos_token_id
+
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=num_heads,
+        num_key_value_heads=num_kv_heads,
+        max_position_embeddings=max_positions,
+        bos_token_id=eos_id,
+        eos_token_id=eos_id,
+        pad_token_id=eos_id,
+    )
+
+    torch.manual_seed(seed)
+    model = LlamaForCausalLM(config)
+    model.eval()
+
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+    return {
+        "architecture": "LlamaForCausalLM",
+        "vocab_size": config.vocab_size,
+        "hidden_size": hidden_size,
+        "num_layers": num_layers,
+        "num_heads": num_heads,
+        "num_kv_heads": num_kv_heads,
+        "parameters": sum(p.numel() for p in model.parameters()),
+        "seed": seed,
+    }
@@ -0,0 +1,197 @@
+"""
+batch.py
+Batch inference offline (evaluasi, generate jawaban massal)
+
+Fitur:
+- Input list / JSONL: tiap item string atau {"id": ..., "text": ...}
+- Stateless: tanpa history & KV sesi → history percakapan tidak tercemar
+- Prompt diurutkan per panjang lalu dijalankan lewat batching
+  InferenceEngine (padding minimal, throughput jauh di atas /chat berurutan)
+- Hasil di-stream sebagai JSONL begitu selesai ("index" = urutan input)
+- Dipakai endpoint /chat/batch & CLI:
+
+    python -m core.batch --input prompts.jsonl --output hasil.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterable, Iterator
+
+from core.logger import get_logger
+
+log = get_logger("BATCH")
+
+# ===============================
+# KONFIG
+# ===============================
+BATCH_MAX_PROMPTS = int(os.environ.get("BATCH_MAX_PROMPTS", "10000"))
+BATCH_MAX_NEW_TOKENS = int(os.environ.get("BATCH_MAX_NEW_TOKENS", "512"))
+
+
+# ===============================
+# INPUT
+# ===============================
+def parse_items(items: Iterable) -> list[tuple[object, str]]:
+    """
+    Normalisasi item input → [(id | None, text)].
+    ValueError jika format item salah atau jumlah melebihi BATCH_MAX_PROMPTS.
+    """
+    parsed = []
+    for n, item in enumerate(items):
+        if n >= BATCH_MAX_PROMPTS:
+            raise ValueError(f"Jumlah prompt melebihi batas {BATCH_MAX_PROMPTS}")
+
+        if isinstance(item, str):
+            parsed.append((None, item))
+        elif isinstance(item, dict) and isinstance(item.get("text"), str):
+            parsed.append((item.get("id"), item["text"]))
+        else:
+            raise ValueError(f"Item #{n} harus string atau objek dengan field 'text'")
+
+    return parsed
+
+
+def read_jsonl(lines: Iterable[str]) -> list[tuple[object, str]]:
+    """
+    Baca JSONL (satu item per baris, baris kosong dilewati)
+    """
+    items = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            raise ValueError(f"Baris {lineno} bukan JSON valid")
+    return parse_items(items)
+
+
+def check_max_new_tokens(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= BATCH_MAX_NEW_TOKENS:
+        raise ValueError(f"Field 'max_new_tokens' harus 1..{BATCH_MAX_NEW_TOKENS}")
+    return value
+
+
+# ===============================
+# RUN
+# ===============================
+def run_batch(bot, items: list[tuple[object, str]], **options) -> Iterator[dict]:
+    """
+    Jalankan batch lewat ChatBot.reply_batch. Menghasilkan record hasil:
+    {"index", "id"?, "reply", "tokens"} atau {"index", "id"?, "error"}.
+
+    options → diteruskan ke reply_batch (max_new_tokens, temperature,
+    top_p, seed, window)
+    """
+    texts = [text for _, text in items]
+
+    for index, reply, n_tokens in bot.reply_batch(texts, **options):
+        record = {"index": index}
+        if items[index][0] is not None:
+            record["id"] = items[index][0]
+
+        if isinstance(reply, Exception):
+            log.warning(f"Prompt #{index} gagal: {reply!r}")
+            record["error"] = "Gagal memproses input"
+        else:
+            record["reply"] = reply
+            record["tokens"] = n_tokens
+
+        yield record
+
+
+# ===============================
+# CLI
+# ===============================
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.batch",
+        description="Batch inference stateless dari file JSONL (model/current)",
+    )
+    parser.add_argument("--input", default="-", help="File JSONL input (default stdin)")
+    parser.add_argument("--output", default="-", help="File JSONL output (default stdout)")
+    parser.add_argument("--max-new-tokens", type=int, default=80)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--top-p", type=float, default=0.9)
+    parser.add_argument("--deterministic", action="store_true", help="Greedy (temperature 0)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="Request berjalan maksimum (default ENGINE_MAX_BATCH)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+
+    # Import berat (torch / transformers) setelah argumen valid
+    from core.chatbot import ChatBot
+    from core.engine import InferenceEngine
+    from core.model_loader import get_draft_model, get_model_key, load_model
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        items = read_jsonl(source)
+
+    tokenizer, model, device = load_model()
+
+    # CLI punya engine sendiri → --window sekaligus jadi ukuran batch
+    engine = None
+    if args.window:
+        engine = InferenceEngine(
+            model,
+            tokenizer,
+            device=device,
+            max_batch_size=args.window,
+            draft_model=get_draft_model(),
+        )
+    bot = ChatBot(
+        tokenizer,
+        model,
+        device=device,
+        engine=engine,
+        model_key=get_model_key(),
+        draft_model=get_draft_model(),
+    )
+
+    options = {
+        "max_new_tokens": check_max_new_tokens(args.max_new_tokens),
+        "temperature": 0.0 if args.deterministic else args.temperature,
+        "top_p": args.top_p,
+        "seed": args.seed,
+        "window": args.window,
+    }
+
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = time.perf_counter()
+    n_tokens = 0
+    n_errors = 0
+
+    try:
+        for record in run_batch(bot, items, **options):
+            n_tokens += record.get("tokens", 0)
+            n_errors += "error" in record
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sink.flush()
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+        bot.close()
+
+    elapsed = time.perf_counter() - start
+    log.info(
+        f"{len(items)} prompt selesai dalam {elapsed:.2f}s "
+        f"({n_tokens / elapsed if elapsed else 0:.1f} token/s, {n_errors} gagal)"
+    )
+    return 1 if n_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
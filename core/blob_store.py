@@ -0,0 +1,162 @@
+"""
+blob_store.py
+Penyimpanan file model content-addressed (model/cache/blobs)
+
+Fitur:
+- Blob disimpan berdasarkan SHA256 isi: model/cache/blobs/<2 hex>/<sha256>
+- Hash dihitung selagi menulis (tanpa baca ulang)
+- Folder versi dibangun dari hardlink ke blob (fallback copy)
+  → file yang tidak berubah antar versi tidak di-download / disalin ulang
+- Blob yang tidak dipakai versi mana pun dihapus (prune)
+
+Catatan:
+- Blob & file versi read-only secara konvensi (hardlink berbagi inode)
+"""
+
+import hashlib
+import os
+import shutil
+from pathlib import Path, PurePosixPath
+
+from core.logger import get_logger
+
+log = get_logger("BLOB_STORE")
+
+# ===============================
+# PATH
+# ===============================
+BASE_DIR = Path(__file__).resolve().parent.parent
+BLOB_ROOT = BASE_DIR / "model" / "cache" / "blobs"
+
+_BUFFER = 1024 * 1024
+
+
+class BlobHashError(RuntimeError):
+    pass
+
+
+# ===============================
+# UTIL
+# ===============================
+def blob_path(digest: str) -> Path:
+    digest = digest.lower()
+    return BLOB_ROOT / digest[:2] / digest
+
+
+def has(digest: str) -> bool:
+    return blob_path(digest).is_file()
+
+
+def safe_relpath(name: str) -> PurePosixPath:
+    """
+    Validasi path file di dalam model (tolak path absolut / '..')
+    """
+    path = PurePosixPath(name)
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        raise RuntimeError(f"Path file model tidak valid: {name}")
+    return path
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_BUFFER), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: Path, dest: Path):
+    try:
+        os.link(src, dest)
+    except OSError:
+        # Beda filesystem / tidak mendukung hardlink
+        shutil.copy2(src, dest)
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+def put_stream(src, expected_sha256: str | None = None) -> tuple[str, int]:
+    """
+    Simpan isi file-object src sebagai blob. Return (sha256, size).
+    Jika expected_sha256 tidak cocok, blob dibuang & BlobHashError dilempar.
+    """
+    BLOB_ROOT.mkdir(parents=True, exist_ok=True)
+    tmp = BLOB_ROOT / f".tmp-{os.getpid()}-{id(src)}"
+
+    h = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in iter(lambda: src.read(_BUFFER), b""):
+                f.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+
+        digest = h.hexdigest()
+        if expected_sha256 and digest != expected_sha256.lower():
+            raise BlobHashError(
+                f"Hash file tidak cocok (expected {expected_sha256[:12]}, dapat {digest[:12]})"
+            )
+
+        dest = blob_path(digest)
+        dest.parent.mkdir(exist_ok=True)
+        os.replace(tmp, dest)
+        return digest, size
+
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def put_file(path: Path) -> str:
+    """
+    Daftarkan file yang sudah ada di disk sebagai blob (hardlink, tanpa copy).
+    Return sha256.
+    """
+    digest = file_sha256(path)
+    dest = blob_path(digest)
+
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(path, dest)
+
+    return digest
+
+
+def materialize(files: dict, dest_dir: Path):
+    """
+    Bangun folder dest_dir dari blob: {relpath: {"sha256": ...}}
+    """
+    for name, meta in files.items():
+        digest = meta["sha256"]
+        src = blob_path(digest)
+        if not src.is_file():
+            raise RuntimeError(f"Blob {digest[:12]} untuk {name} tidak ditemukan")
+
+        dest = dest_dir / safe_relpath(name)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(src, dest)
+
+
+def prune(referenced: set[str]) -> int:
+    """
+    Hapus blob yang tidak ada di referenced. Return jumlah blob dihapus.
+    """
+    if not BLOB_ROOT.exists():
+        return 0
+
+    referenced = {d.lower() for d in referenced}
+    removed = 0
+    freed = 0
+
+    for path in BLOB_ROOT.glob("*/*"):
+        if path.is_file() and path.name not in referenced:
+            freed += path.stat().st_size
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    if removed:
+        log.info(f"{removed} blob tidak terpakai dihapus ({freed / 1e6:.1f} MB)")
+
+    return removed
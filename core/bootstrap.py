@@ -4,14 +4,18 @@ Bootstrap resmi ai_runtime (production-ready)
 
 Tugas:
 - Pastikan virtualenv
-- Install dependency
-- Self update (opsional)
+- Install dependency (di-skip jika requirements & interpreter tidak berubah)
+- Self update (opsional, cek remote di-cache dengan TTL)
 - Sinkronisasi model dari ai_factory
+- Laporan waktu tiap fase startup
 """
 
+import hashlib
 import os
 import sys
 import subprocess
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 from core.logger import get_logger
@@ -28,6 +32,46 @@ REQ_FILE = BASE_DIR / "requirements.txt"
 
 MODEL_DIR = BASE_DIR / "model" / "current"
 
+# Stamp & cache disimpan di venv → venv baru otomatis install ulang
+REQ_STAMP = VENV_DIR / ".requirements.stamp"
+UPDATE_CACHE = VENV_DIR / ".update_check.json"
+
+# ===============================
+# KONFIG
+# ===============================
+# 1 = paksa pip install walau stamp cocok
+FORCE_INSTALL = os.environ.get("AI_RUNTIME_FORCE_INSTALL", "0") == "1"
+# Interval minimal cek commit remote (detik, 0 = selalu cek)
+UPDATE_CHECK_TTL = int(os.environ.get("AI_RUNTIME_UPDATE_TTL", "3600"))
+# Jeda cek ulang setelah git fetch / pull gagal (detik, 0 = selalu cek)
+UPDATE_RETRY_TTL = int(os.environ.get("AI_RUNTIME_UPDATE_RETRY_TTL", "300"))
+# 0 = matikan self update
+SELF_UPDATE = os.environ.get("AI_RUNTIME_SELF_UPDATE", "1") == "1"
+
+
+# ===============================
+# TIMING
+# ===============================
+_phases: list[tuple[str, float]] = []
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def log_timing_report():
+    total = sum(elapsed for _, elapsed in _phases)
+    log.info("Waktu startup per fase:")
+    for name, elapsed in _phases:
+        log.info(f"  {name:<12} {elapsed:7.2f}s")
+    log.info(f"  {'total':<12} {total:7.2f}s")
+
+
 # ===============================
 # VIRTUAL ENV
 # ===============================
@@ -50,7 +94,28 @@ def restart_in_venv():
 # ===============================
 # REQUIREMENTS
 # ===============================
+def requirements_key() -> str:
+    """
+    Kunci stamp: isi requirements.txt + interpreter yang dipakai
+    """
+    h = hashlib.sha256()
+    h.update(REQ_FILE.read_bytes())
+    h.update(sys.executable.encode())
+    h.update(sys.version.encode())
+    return h.hexdigest()
+
+
+def requirements_up_to_date() -> bool:
+    if FORCE_INSTALL or not REQ_STAMP.exists():
+        return False
+    return REQ_STAMP.read_text(encoding="utf-8").strip() == requirements_key()
+
+
 def install_requirements():
+    if requirements_up_to_date():
+        log.info("Dependency tidak berubah sejak install terakhir (skip pip)")
+        return
+
     log.info("Memastikan dependency terinstall")
 
     pip_bin = VENV_DIR / "bin" / "pip"
@@ -64,6 +129,7 @@ def install_requirements():
         ]
     )
 
+    REQ_STAMP.write_text(requirements_key(), encoding="utf-8")
     log.info("Dependency siap")
 
 
@@ -73,19 +139,27 @@ def install_requirements():
 def validate_model() -> bool:
     """
     Validasi minimum model HuggingFace
+
+    Bobot boleh safetensors (diutamakan) atau pytorch_model.bin,
+    single file maupun sharded (index.json).
     """
     if not MODEL_DIR.exists():
         return False
 
-    required_files = [
-        "config.json",
+    if not (MODEL_DIR / "config.json").exists():
+        log.error("File model hilang: config.json")
+        return False
+
+    weight_files = [
+        "model.safetensors",
+        "model.safetensors.index.json",
         "pytorch_model.bin",
+        "pytorch_model.bin.index.json",
     ]
 
-    for f in required_files:
-        if not (MODEL_DIR / f).exists():
-            log.error(f"File model hilang: {f}")
-            return False
+    if not any((MODEL_DIR / f).exists() for f in weight_files):
+        log.error(f"File bobot model hilang: salah satu dari {weight_files}")
+        return False
 
     return True
 
@@ -105,22 +179,37 @@ def bootstrap():
         restart_in_venv()
 
     # 2️⃣ Dependency
-    install_requirements()
+    with phase("dependency"):
+        install_requirements()
 
     # 3️⃣ Self update (opsional)
-    updater = SelfUpdater(repo_dir=str(BASE_DIR))
-    if updater.update_if_needed():
-        log.warning("Source code ter-update, restart runtime...")
-        restart_in_venv()
+    if SELF_UPDATE:
+        with phase("self-update"):
+            updater = SelfUpdater(
+                repo_dir=str(BASE_DIR),
+                check_ttl=UPDATE_CHECK_TTL,
+                cache_file=UPDATE_CACHE,
+                retry_ttl=UPDATE_RETRY_TTL,
+            )
+            updated = updater.update_if_needed()
+
+        if updated:
+            log.warning("Source code ter-update, restart runtime...")
+            restart_in_venv()
 
     # 4️⃣ Model sync
-    if not validate_model():
-        log.warning("Model belum ada / tidak valid, sinkronisasi dengan ai_factory")
-        updated = download_latest_model()
-        if not updated:
-            log.error("Model gagal disinkronisasi")
-            raise RuntimeError("Runtime tidak memiliki model valid")
-    else:
-        log.info("Model valid, siap inference")
-
-    log.info("=== BOOTSTRAP AI_RUNTIME SELESAI ===")
\ No newline at end of file
+    with phase("model"):
+        if not validate_model():
+            # Import di sini: dependency (requests) baru pasti ada setelah pip
+            from core.model_downloader import download_latest_model
+
+            log.warning("Model belum ada / tidak valid, sinkronisasi dengan ai_factory")
+            updated = download_latest_model()
+            if not updated:
+                log.error("Model gagal disinkronisasi")
+                raise RuntimeError("Runtime tidak memiliki model valid")
+        else:
+            log.info("Model valid, siap inference")
+
+    log_timing_report()
+    log.info("=== BOOTSTRAP AI_RUNTIME SELESAI ===")
@@ -4,15 +4,52 @@ Runtime chatbot engine (production-ready)
 
 Fitur:
 - Prompt konsisten dengan dataset training
-- History terkontrol & token-aware
+- History per sesi (SessionStore), terkontrol & token-aware
+- KV cache per sesi → turn lanjutan hanya prefill token baru
+- KV instruksi dihitung sekali → sesi baru tidak prefill instruksi lagi
+- Streaming token (stream_reply), dibatalkan jika consumer berhenti
+- Varian async (areply / astream_reply) untuk server ASGI: event loop
+  menunggu Future engine tanpa memblok thread
+- Timeout per request → generate dibatalkan, slot batch dibebaskan
+- Mode deterministik (greedy / seed) + response cache exact-match
+  → pertanyaan yang sama dijawab tanpa inference
+- Generate lewat InferenceEngine (continuous batching antar request)
+- Berhenti di stop sequence ("\nUser:") / EOS, hanya token baru yang di-decode
+- Speculative decoding opsional (model draft) per request
+- Batch stateless (reply_batch): prompt diurutkan per panjang, tanpa
+  history / KV sesi, hasil dikirim begitu selesai
+- Metrics per tahap (prompt build, tokenize, detokenize, history)
 - Aman untuk inference jangka panjang
 """
 
+import asyncio
+import copy
+import queue
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from typing import AsyncIterator, Iterable, Iterator
+
 import torch
-from core.logger import get_logger
+from core.logger import SAMPLED, get_logger
+from core.engine import (
+    DeadlineExceededError,
+    GenerationRequest,
+    GenerationResult,
+    InferenceEngine,
+    QueueFullError,
+)
+from core.kv_cache import KVCacheStore, cache_length, common_prefix_len, crop_cache
+from core.metrics import HISTORY_TOKENS, RESPONSE_CACHE_TOTAL, STAGE_SECONDS
+from core.response_cache import ResponseCache, make_key
+from core.session_store import SessionStore
 
 log = get_logger("CHATBOT")
 
+REPETITION_PENALTY = 1.1
+
 
 class ChatBot:
     def __init__(
@@ -22,6 +59,13 @@ class ChatBot:
         instruction: str = "Instruksi: Jawablah dengan bahasa Indonesia yang jelas, singkat, dan benar.",
         max_history_tokens: int = 512,
         device: str | None = None,
+        sessions: SessionStore | None = None,
+        kv_cache: KVCacheStore | None = None,
+        engine: InferenceEngine | None = None,
+        stop_sequences: tuple[str, ...] = ("\nUser:",),
+        response_cache: ResponseCache | None = None,
+        model_key: str = "",
+        draft_model=None,
     ):
         self.tokenizer = tokenizer
         self.model = model
@@ -29,44 +73,365 @@ class ChatBot:
 
         self.instruction = instruction
         self.max_history_tokens = max_history_tokens
+        self.stop_sequences = stop_sequences
+
+        # Instruksi tetap → cukup di-tokenize sekali
+        self.instruction_ids = array("I", self._encode(instruction))
+
+        # history per sesi, disimpan sebagai token id per turn
+        self.sessions = sessions or SessionStore()
 
-        # history sebagai list of dict
-        self.history: list[dict[str, str]] = []
+        # past_key_values per sesi; ikut dibuang saat sesi di-evict
+        # (TTL / LRU) oleh SessionStore
+        self.kv_cache = kv_cache or KVCacheStore()
+        self.sessions.add_evict_callback(self.kv_cache.drop)
+
+        # Jawaban request deterministik, key diawali identitas model
+        # (hash manifest) → tidak pernah tertukar antar versi model
+        self.response_cache = response_cache or ResponseCache()
+        self.model_key = model_key
+
+        # KV instruksi (read-only), disalin sebagai state awal setiap generate.
+        # Dihitung sekali saat pertama dipakai: konstruksi di master gunicorn
+        # (preload) tidak menjalankan forward sebelum fork.
+        self.instruction_cache = None
+        self._instruction_ready = False
+        self._instruction_lock = threading.Lock()
+
+        # Semua generate lewat satu thread inference (batching antar request)
+        self.engine = engine or InferenceEngine(
+            model,
+            tokenizer,
+            device=self.device,
+            draft_model=draft_model,
+        )
+
+        # Request yang sedang memegang bot (acquire / release); close()
+        # menunggu semuanya selesai sebelum engine dihentikan
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
 
         log.info("ChatBot siap digunakan")
 
     # ===============================
     # INTERNAL
     # ===============================
-    def _build_prompt(self, user_input: str) -> str:
+    def _encode(self, text: str) -> list[int]:
+        with STAGE_SECONDS.time(stage="tokenize"):
+            return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _build_prompt(self, session_id: str, user_input: str) -> tuple[array, array]:
         """
-        Bangun prompt konsisten dengan format training
+        Bangun prompt (token id) konsisten dengan format training
+
+        Format: instruksi, lalu setiap turn "\nUser: ...\nAI: ...",
+        diakhiri "\nUser: <input>\nAI:".
+
+        Hanya input baru yang di-tokenize; history sudah berupa token id.
+        Jika terlalu panjang, turn terlama dibuang utuh.
+
+        Return (prompt_ids, user_ids)
         """
-        parts = [self.instruction]
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            return self._build_prompt_ids(session_id, user_input)
 
-        for h in self.history:
-            parts.append(f"User: {h['user']}")
-            parts.append(f"AI: {h['ai']}")
+    def _build_prompt_ids(self, session_id: str, user_input: str) -> tuple[array, array]:
+        user_ids = array("I", self._encode(f"\nUser: {user_input}\nAI:"))
+        turns, history_tokens = self.sessions.history(session_id)
+        HISTORY_TOKENS.observe(history_tokens)
 
-        parts.append(f"User: {user_input}")
-        parts.append("AI:")
+        budget = self.max_history_tokens - len(self.instruction_ids) - len(user_ids)
 
-        prompt = "\n".join(parts)
+        if budget <= 0:
+            # Input sendiri sudah melebihi batas → ambil ekornya saja
+            keep = max(self.max_history_tokens - len(self.instruction_ids), 1)
+            return self.instruction_ids + user_ids[-keep:], user_ids
 
-        # Trim token jika terlalu panjang
-        tokens = self.tokenizer.encode(
-            prompt,
-            add_special_tokens=False,
-        )
+        # Buang turn terlama sampai history muat di budget
+        start = 0
+        while history_tokens > budget:
+            history_tokens -= len(turns[start])
+            start += 1
+
+        prompt_ids = array("I", self.instruction_ids)
+        for turn in turns[start:]:
+            prompt_ids.extend(turn)
+        prompt_ids.extend(user_ids)
 
-        if len(tokens) > self.max_history_tokens:
-            tokens = tokens[-self.max_history_tokens :]
-            prompt = self.tokenizer.decode(
-                tokens,
-                skip_special_tokens=True,
+        return prompt_ids, user_ids
+
+    def _prefill_instruction(self):
+        """
+        Hitung KV cache untuk instruksi tetap (sekali per proses)
+        """
+        if not self.instruction_ids:
+            return None
+
+        try:
+            input_ids = torch.tensor(
+                [self.instruction_ids], dtype=torch.long, device=self.device
             )
+            with torch.no_grad():
+                outputs = self.model(input_ids=input_ids, use_cache=True)
+        except Exception as e:
+            log.warning(f"Gagal prefill instruksi, fallback prefill penuh: {e}")
+            return None
+
+        return outputs.past_key_values
+
+    def _get_instruction_cache(self):
+        if not self._instruction_ready:
+            with self._instruction_lock:
+                if not self._instruction_ready:
+                    self.instruction_cache = self._prefill_instruction()
+                    self._instruction_ready = True
+        return self.instruction_cache
+
+    def _reuse_cache(self, session_id: str, prompt_ids: array):
+        """
+        Ambil KV cache sesi jika prefix-nya cocok dengan prompt baru.
+        Cache dipotong ke prefix yang sama; minimal satu token tetap
+        di-prefill agar generate punya logits awal.
+
+        Jika cache sesi tidak ada / tidak lebih panjang dari instruksi,
+        salinan KV instruksi dipakai sebagai state awal.
+        session_id None → stateless, hanya KV instruksi.
+        """
+        limit = len(prompt_ids) - 1
+        entry = self.kv_cache.take(session_id) if session_id is not None else None
+
+        if entry is not None:
+            reuse = min(common_prefix_len(entry.ids, prompt_ids), limit)
+            if reuse > len(self.instruction_ids):
+                return crop_cache(entry.cache, reuse)
+
+        n_instr = len(self.instruction_ids)
+        if n_instr > limit or prompt_ids[:n_instr] != self.instruction_ids:
+            return None
+
+        instruction_cache = self._get_instruction_cache()
+        if instruction_cache is None:
+            return None
+
+        # generate mengubah cache in-place → jangan pakai objek aslinya
+        return copy.deepcopy(instruction_cache)
+
+    def _submit(
+        self,
+        session_id: str | None,
+        prompt_ids: array,
+        on_token=None,
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        timeout: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
+    ) -> Future:
+        """
+        Kirim request ke engine (dengan KV cache awal sesi / instruksi).
+        session_id None → stateless: KV hasil generate tidak disimpan.
+        """
+        deadline = time.perf_counter() + timeout if timeout else None
+
+        request = GenerationRequest(
+            prompt_ids,
+            past=self._reuse_cache(session_id, prompt_ids),
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            repetition_penalty=REPETITION_PENALTY,
+            on_token=on_token,
+            stop_strings=self.stop_sequences,
+            deadline=deadline,
+            seed=seed,
+            speculative=speculative,
+            keep_cache=session_id is not None,
+        )
+
+        try:
+            return self.engine.submit(request)
+        except Exception:
+            # Ditolak (overload) → KV sesi yang sudah diambil dikembalikan
+            past = request.past
+            if past is not None and session_id is not None:
+                n = cache_length(past)
+                if n > len(self.instruction_ids):
+                    self.kv_cache.put(session_id, prompt_ids[:n], past)
+            raise
+
+    def _store_cache(self, session_id: str, result: GenerationResult):
+        # Cache mencakup semua token yang sudah di-forward
+        # (token terakhir hasil sampling belum masuk cache)
+        if result.cache is not None:
+            self.kv_cache.put(session_id, result.cache_ids, result.cache)
+
+    def _stop_index(self, text: str) -> int:
+        """
+        Posisi stop sequence pertama di text, atau -1
+        """
+        hits = [text.find(stop) for stop in self.stop_sequences if stop in text]
+        return min(hits) if hits else -1
+
+    def _holdback(self, text: str) -> int:
+        """
+        Panjang text yang aman di-stream: potong di stop sequence, dan tahan
+        ekor yang masih mungkin menjadi awal stop sequence.
+        """
+        cut = self._stop_index(text)
+        if cut >= 0:
+            return cut
+
+        safe = len(text)
+        for stop in self.stop_sequences:
+            for k in range(min(len(stop) - 1, len(text)), 0, -1):
+                if text.endswith(stop[:k]):
+                    safe = min(safe, len(text) - k)
+                    break
+        return safe
+
+    def _stream_text(self, generated: list[int], printed: str) -> str | None:
+        """
+        Teks yang aman di-stream dari token sejauh ini, atau None jika
+        belum ada potongan baru dibanding printed
+        """
+        text = self.tokenizer.decode(generated, skip_special_tokens=True)
+
+        # Tunggu token berikutnya jika karakter multi-byte belum lengkap
+        if text.endswith("\ufffd"):
+            return None
 
-        return prompt
+        text = text[: self._holdback(text)]
+        return text if len(text) > len(printed) else None
+
+    def _split_reply(self, token_ids: list[int]) -> tuple[str, list[int]]:
+        """
+        Pisahkan jawaban dari token hasil generate.
+
+        Return (jawaban, token_jawaban). Token jawaban sebisa mungkin
+        adalah token asli model (agar KV cache turn berikutnya cocok).
+        """
+        ids = list(token_ids)
+        if ids and ids[-1] == self.tokenizer.eos_token_id:
+            ids.pop()
+
+        text = self.tokenizer.decode(ids, skip_special_tokens=True)
+
+        cut = self._stop_index(text)
+        if cut < 0:
+            return text.strip(), ids
+
+        reply = text[:cut].rstrip()
+
+        # Mundur sampai token hanya mencakup teks jawaban
+        n = len(ids)
+        while n > 0 and len(self.tokenizer.decode(ids[:n], skip_special_tokens=True)) > len(reply):
+            n -= 1
+
+        reply_ids = ids[:n]
+        if self.tokenizer.decode(reply_ids, skip_special_tokens=True) != reply:
+            reply_ids = self._encode(reply)
+
+        return reply.strip(), reply_ids
+
+    def _remember(self, session_id: str, user_ids: array, reply_ids):
+        # Simpan ke history sesi (token jawaban tidak perlu di-tokenize ulang)
+        user_ids.extend(reply_ids)
+        self.sessions.append_turn(
+            session_id,
+            user_ids,
+            max_tokens=self.max_history_tokens,
+        )
+
+    def _finish(
+        self,
+        session_id: str,
+        user_ids: array,
+        result: GenerationResult,
+        cache_key: bytes | None = None,
+    ) -> str:
+        """
+        Ambil jawaban AI dari token baru lalu simpan turn ke history sesi
+        (dan ke response cache jika request deterministik)
+        """
+        self._store_cache(session_id, result)
+
+        with STAGE_SECONDS.time(stage="detokenize"):
+            ai_response, reply_ids = self._split_reply(result.token_ids)
+
+        if cache_key is not None:
+            self.response_cache.put(cache_key, ai_response, reply_ids)
+
+        self._remember(session_id, user_ids, reply_ids)
+        return ai_response
+
+    # ===============================
+    # RESPONSE CACHE
+    # ===============================
+    @staticmethod
+    def is_deterministic(temperature: float, seed: int | None) -> bool:
+        return temperature <= 0 or seed is not None
+
+    def _cache_key(
+        self,
+        prompt_ids: array,
+        max_new_tokens: int,
+        temperature: float,
+        top_p: float,
+        seed: int | None,
+    ) -> bytes | None:
+        """
+        Key response cache, atau None jika request tidak deterministik
+        """
+        if not self.response_cache.enabled or not self.is_deterministic(temperature, seed):
+            return None
+
+        if temperature <= 0:
+            # Greedy: top_p & seed tidak berpengaruh
+            params = (max_new_tokens, 0.0, REPETITION_PENALTY, self.stop_sequences)
+        else:
+            params = (max_new_tokens, temperature, top_p, seed, REPETITION_PENALTY, self.stop_sequences)
+
+        return make_key(self.model_key, prompt_ids, params)
+
+    def _cached_reply(self, session_id: str, user_ids: array, cache_key: bytes | None) -> str | None:
+        """
+        Jawaban dari response cache (turn tetap masuk history sesi), atau None
+        """
+        if cache_key is None:
+            return None
+
+        entry = self.response_cache.get(cache_key)
+        if entry is None:
+            RESPONSE_CACHE_TOTAL.inc(result="miss")
+            return None
+
+        RESPONSE_CACHE_TOTAL.inc(result="hit")
+        self._remember(session_id, user_ids, entry.reply_ids)
+        return entry.text
+
+    def _prepare(
+        self,
+        session_id: str,
+        user_input: str,
+        max_new_tokens: int,
+        temperature: float,
+        top_p: float,
+        seed: int | None,
+    ) -> tuple[array, array, bytes | None]:
+        """
+        Bangun prompt + key response cache.
+
+        Request deterministik memakai input ternormalisasi (spasi berlebih
+        dirapikan) agar variasi penulisan kecil tetap cache hit.
+        """
+        if self.is_deterministic(temperature, seed):
+            user_input = " ".join(user_input.split())
+
+        prompt_ids, user_ids = self._build_prompt(session_id, user_input)
+        cache_key = self._cache_key(prompt_ids, max_new_tokens, temperature, top_p, seed)
+        return prompt_ids, user_ids, cache_key
 
     # ===============================
     # PUBLIC API
@@ -74,53 +439,450 @@ class ChatBot:
     def reply(
         self,
         user_input: str,
+        session_id: str = "default",
         max_new_tokens: int = 80,
         temperature: float = 0.7,
         top_p: float = 0.9,
+        timeout: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
     ) -> str:
+        """
+        timeout (detik) → lewat batas, generate dibatalkan dan
+        DeadlineExceededError dilempar. Saat overload, OverloadedError
+        dilempar sebelum request masuk antrian.
+
+        Deterministik jika temperature <= 0 (greedy) atau seed di-set;
+        jawaban request deterministik diambil dari / disimpan ke
+        response cache.
+
+        speculative → pakai model draft (None = default engine); hanya
+        berpengaruh pada latency, distribusi jawaban tetap sama. Diabaikan
+        untuk request ber-seed (jawaban harus reproducible).
+        """
         if not user_input.strip():
             return "Silakan masukkan pertanyaan."
 
-        prompt = self._build_prompt(user_input)
-
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            truncation=True,
-            add_special_tokens=False,
-        ).to(self.device)
-
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                do_sample=True,
-                temperature=temperature,
-                top_p=top_p,
-                repetition_penalty=1.1,
-                pad_token_id=self.tokenizer.eos_token_id,
+        prompt_ids, user_ids, cache_key = self._prepare(
+            session_id, user_input, max_new_tokens, temperature, top_p, seed
+        )
+
+        cached = self._cached_reply(session_id, user_ids, cache_key)
+        if cached is not None:
+            return cached
+
+        future = self._submit(
+            session_id,
+            prompt_ids,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout,
+            seed=seed,
+            speculative=speculative,
+        )
+
+        try:
+            result = future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(
+                "Deadline request terlewati",
+                retry_after=max(self.engine.estimated_wait(), 1.0),
             )
+        except BaseException:
+            future.cancel()
+            raise
+
+        return self._finish(session_id, user_ids, result, cache_key)
+
+    def stream_reply(
+        self,
+        user_input: str,
+        session_id: str = "default",
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        timeout: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        """
+        Versi streaming dari reply().
+
+        Request langsung dikirim ke engine (error admission / overload
+        dilempar di sini, sebelum iterasi). Iterator menghasilkan
+        ("token", teks) setiap ada potongan teks baru, diakhiri
+        ("done", jawaban_final) setelah history sesi disimpan.
+
+        Jika iterator ditutup sebelum selesai (client putus),
+        generate dibatalkan. Cache hit → satu event "token" berisi
+        jawaban penuh lalu "done".
+        """
+        if not user_input.strip():
+            return self._reply_only("Silakan masukkan pertanyaan.")
 
-        decoded = self.tokenizer.decode(
-            outputs[0],
-            skip_special_tokens=True,
+        prompt_ids, user_ids, cache_key = self._prepare(
+            session_id, user_input, max_new_tokens, temperature, top_p, seed
         )
 
-        ai_response = decoded.rsplit("AI:", 1)[-1].strip()
+        cached = self._cached_reply(session_id, user_ids, cache_key)
+        if cached is not None:
+            return self._reply_only(cached, stream=True)
 
-        # Simpan ke history
-        self.history.append(
-            {
-                "user": user_input,
-                "ai": ai_response,
-            }
+        tokens: queue.Queue = queue.Queue()
+        future = self._submit(
+            session_id,
+            prompt_ids,
+            on_token=tokens.put,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout,
+            seed=seed,
+            speculative=speculative,
         )
+        future.add_done_callback(lambda _: tokens.put(None))
 
-        return ai_response
+        return self._stream_tokens(session_id, user_ids, future, tokens, cache_key)
+
+    @staticmethod
+    def _reply_only(reply: str, stream: bool = False) -> Iterator[tuple[str, str]]:
+        if stream and reply:
+            yield "token", reply
+        yield "done", reply
+
+    def _stream_tokens(
+        self,
+        session_id: str,
+        user_ids: array,
+        future: Future,
+        tokens: queue.Queue,
+        cache_key: bytes | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        generated: list[int] = []
+        printed = ""
+
+        try:
+            while (token := tokens.get()) is not None:
+                generated.append(token)
+                text = self._stream_text(generated, printed)
+                if text is not None:
+                    yield "token", text[len(printed):]
+                    printed = text
+        finally:
+            if not future.done():
+                # Consumer berhenti (GeneratorExit / error) → batalkan generate
+                future.cancel()
+
+        yield "done", self._finish(session_id, user_ids, future.result(), cache_key)
+
+    # ===============================
+    # ASYNC (ASGI)
+    # ===============================
+    async def areply(
+        self,
+        user_input: str,
+        session_id: str = "default",
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        timeout: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
+    ) -> str:
+        """
+        Versi async dari reply(): generate tetap di thread engine,
+        coroutine hanya menunggu Future-nya (tidak memakai thread)
+        """
+        if not user_input.strip():
+            return "Silakan masukkan pertanyaan."
+
+        prompt_ids, user_ids, cache_key = self._prepare(
+            session_id, user_input, max_new_tokens, temperature, top_p, seed
+        )
+
+        cached = self._cached_reply(session_id, user_ids, cache_key)
+        if cached is not None:
+            return cached
+
+        future = self._submit(
+            session_id,
+            prompt_ids,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout,
+            seed=seed,
+            speculative=speculative,
+        )
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(
+                "Deadline request terlewati",
+                retry_after=max(self.engine.estimated_wait(), 1.0),
+            )
+        except BaseException:
+            # Termasuk CancelledError saat client putus
+            future.cancel()
+            raise
+
+        return self._finish(session_id, user_ids, result, cache_key)
+
+    def astream_reply(
+        self,
+        user_input: str,
+        session_id: str = "default",
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        timeout: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
+    ) -> AsyncIterator[tuple[str, str]]:
+        """
+        Versi async dari stream_reply(); harus dipanggil dari event loop.
+        Error admission dilempar di sini, token dikirim dari thread engine
+        ke loop lewat call_soon_threadsafe.
+        """
+        if not user_input.strip():
+            return self._areply_only("Silakan masukkan pertanyaan.")
+
+        prompt_ids, user_ids, cache_key = self._prepare(
+            session_id, user_input, max_new_tokens, temperature, top_p, seed
+        )
+
+        cached = self._cached_reply(session_id, user_ids, cache_key)
+        if cached is not None:
+            return self._areply_only(cached, stream=True)
+
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+
+        def put(token):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+        future = self._submit(
+            session_id,
+            prompt_ids,
+            on_token=put,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout,
+            seed=seed,
+            speculative=speculative,
+        )
+        future.add_done_callback(lambda _: put(None))
+
+        return self._astream_tokens(session_id, user_ids, future, tokens, cache_key)
+
+    @staticmethod
+    async def _areply_only(reply: str, stream: bool = False) -> AsyncIterator[tuple[str, str]]:
+        if stream and reply:
+            yield "token", reply
+        yield "done", reply
+
+    async def _astream_tokens(
+        self,
+        session_id: str,
+        user_ids: array,
+        future: Future,
+        tokens: asyncio.Queue,
+        cache_key: bytes | None = None,
+    ) -> AsyncIterator[tuple[str, str]]:
+        generated: list[int] = []
+        printed = ""
+
+        try:
+            while (token := await tokens.get()) is not None:
+                generated.append(token)
+                text = self._stream_text(generated, printed)
+                if text is not None:
+                    yield "token", text[len(printed):]
+                    printed = text
+        finally:
+            if not future.done():
+                future.cancel()
+
+        yield "done", self._finish(session_id, user_ids, future.result(), cache_key)
+
+    # ===============================
+    # BATCH (STATELESS)
+    # ===============================
+    def _stateless_prompt(self, user_input: str) -> array:
+        user_ids = array("I", self._encode(f"\nUser: {user_input}\nAI:"))
+        keep = max(self.max_history_tokens - len(self.instruction_ids), 1)
+        return self.instruction_ids + user_ids[-keep:]
+
+    def reply_batch(
+        self,
+        texts: Iterable[str],
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        seed: int | None = None,
+        speculative: bool | None = None,
+        window: int | None = None,
+    ) -> Iterator[tuple[int, str | Exception, int]]:
+        """
+        Jawab banyak prompt sekaligus tanpa history (stateless).
+
+        Prompt diurutkan dari yang terpendek lalu dikirim ke engine dengan
+        maksimal `window` request berjalan (default = max batch engine),
+        sehingga sequence dalam satu batch panjangnya mirip dan request
+        interaktif tetap kebagian antrian.
+
+        Iterator menghasilkan (index_input, jawaban | Exception, jumlah_token_jawaban)
+        sesuai urutan selesai. Jika iterator ditutup, sisa generate dibatalkan.
+        """
+        window = max(1, window or self.engine.max_batch_size)
+        deterministic = self.is_deterministic(temperature, seed)
+
+        pending = []
+        for index, text in enumerate(texts):
+            if not text.strip():
+                yield index, "Silakan masukkan pertanyaan.", 0
+                continue
+            if deterministic:
+                text = " ".join(text.split())
+
+            with STAGE_SECONDS.time(stage="prompt_build"):
+                prompt_ids = self._stateless_prompt(text)
+            cache_key = self._cache_key(prompt_ids, max_new_tokens, temperature, top_p, seed)
+
+            if cache_key is not None:
+                entry = self.response_cache.get(cache_key)
+                RESPONSE_CACHE_TOTAL.inc(result="hit" if entry else "miss")
+                if entry is not None:
+                    yield index, entry.text, len(entry.reply_ids)
+                    continue
+
+            pending.append((index, prompt_ids, cache_key))
+
+        pending.sort(key=lambda item: len(item[1]))
+        pending = deque(pending)
+
+        done: queue.Queue = queue.Queue()
+        inflight: dict[Future, tuple[int, bytes | None]] = {}
+
+        try:
+            while pending or inflight:
+                while pending and len(inflight) < window:
+                    index, prompt_ids, cache_key = pending[0]
+                    try:
+                        future = self._submit(
+                            None,
+                            prompt_ids,
+                            max_new_tokens=max_new_tokens,
+                            temperature=temperature,
+                            top_p=top_p,
+                            seed=seed,
+                            speculative=speculative,
+                        )
+                    except QueueFullError as e:
+                        # Antrian penuh oleh request lain → tunggu slot
+                        if not inflight:
+                            time.sleep(min(e.retry_after, 1.0))
+                            continue
+                        break
+
+                    pending.popleft()
+                    inflight[future] = (index, cache_key)
+                    future.add_done_callback(done.put)
+
+                future = done.get()
+                index, cache_key = inflight.pop(future)
+
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield index, e, 0
+                    continue
+
+                with STAGE_SECONDS.time(stage="detokenize"):
+                    reply, reply_ids = self._split_reply(result.token_ids)
+                if cache_key is not None:
+                    self.response_cache.put(cache_key, reply, reply_ids)
+
+                # Sama dengan cache hit: token jawaban (tanpa EOS / stop)
+                yield index, reply, len(reply_ids)
+        finally:
+            for future in inflight:
+                future.cancel()
+
+    def acquire(self) -> bool:
+        """
+        Tandai bot sedang dipakai satu request (pasangkan dengan release).
+        False jika bot sudah ditutup (hot swap / unload / eviksi)
+        → ambil bot aktif yang baru.
+        """
+        with self._users_lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            shutdown = self._retired and self._users == 0
+        if shutdown:
+            self._shutdown()
+
+    @property
+    def in_use(self) -> int:
+        """
+        Jumlah request yang sedang memegang bot
+        """
+        return self._users
+
+    def close(self):
+        """
+        Tutup bot: acquire berikutnya ditolak; engine dihentikan setelah
+        request terakhir yang memegang bot melepasnya (request yang sudah
+        masuk antrian tetap diselesaikan)
+        """
+        with self._users_lock:
+            if self._retired:
+                return
+            self._retired = True
+            shutdown = self._users == 0
+        if shutdown:
+            self._shutdown()
+
+    def close_if_unused(self) -> bool:
+        """
+        Tutup bot hanya jika tidak ada request yang memegangnya (atomic
+        terhadap acquire). Return False jika bot sedang dipakai.
+        """
+        with self._users_lock:
+            if self._users or self._retired:
+                return False
+            self._retired = True
+        self._shutdown()
+        return True
+
+    def _shutdown(self):
+        self.engine.shutdown(wait=False)
+        self.response_cache.clear()
+        # SessionStore bisa dipakai terus oleh bot pengganti (hot swap / unload)
+        self.sessions.remove_evict_callback(self.kv_cache.drop)
+        self.kv_cache.clear()
 
-    def reset(self):
+    def reset(self, session_id: str | None = None):
         """
-        Reset percakapan
+        Reset percakapan satu sesi (atau semua sesi jika session_id None)
         """
-        self.history.clear()
-        log.info("History chatbot direset")
\ No newline at end of file
+        if session_id is None:
+            self.sessions.clear()
+            self.kv_cache.clear()
+            log.info("History semua sesi direset")
+        else:
+            self.sessions.reset(session_id)
+            self.kv_cache.drop(session_id)
+            log.info("History sesi direset", extra=SAMPLED)
\ No newline at end of file
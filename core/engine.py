@@ -0,0 +1,893 @@
+"""
+engine.py
+Inference engine dengan continuous batching (production-ready)
+
+Fitur:
+- Satu thread inference khusus per model
+- Request dari semua handler masuk antrian, hasil dikembalikan via Future
+- Batch dinamis: request bergabung / keluar di batas token
+- Left padding + attention mask + position_ids per sequence
+- Prefill memakai KV cache awal (sesi / instruksi) jika ada
+- KV cache per sequence dikembalikan untuk dipakai ulang turn berikutnya
+- Berhenti segera saat EOS / stop sequence muncul
+- Antrian terbatas + deadline per request → tolak cepat saat overload
+- Request bisa dibatalkan (future.cancel()) walau sedang di-generate
+- Seed per request (generator sendiri) → sampling reproducible
+- Speculative decoding opsional: model draft kecil mengusulkan beberapa
+  token, model utama memverifikasi sekaligus dalam satu forward
+  (distribusi output tetap sama dengan decode biasa); request ber-seed
+  tidak memakai speculative → jawaban sama berapa pun beban server
+- Metrics: antrian, prefill, decode per token, throughput
+"""
+
+import atexit
+import inspect
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import CancelledError, Future
+
+import torch
+from core.logger import get_logger
+from core.kv_cache import cache_length, crop_cache, from_layers, to_layers
+from core.metrics import (
+    BATCH_SIZE,
+    CANCELLED_TOTAL,
+    OUTPUT_TOKENS,
+    PREFILL_TOKENS,
+    PROMPT_TOKENS,
+    REJECTED_TOTAL,
+    SPECULATIVE_ACCEPTED,
+    SPECULATIVE_DRAFT_TOKENS,
+    STAGE_SECONDS,
+    TOKENS_PER_SECOND,
+)
+
+log = get_logger("ENGINE")
+
+# ===============================
+# KONFIG
+# ===============================
+ENGINE_MAX_BATCH = int(os.environ.get("ENGINE_MAX_BATCH", "8"))
+# Request menunggu maksimum (di luar batch aktif), 0 = tanpa batas
+ENGINE_MAX_QUEUE = int(os.environ.get("ENGINE_MAX_QUEUE", "64"))
+# Jumlah token yang diusulkan model draft per langkah speculative
+SPECULATIVE_TOKENS = int(os.environ.get("SPECULATIVE_TOKENS", "4"))
+# Default speculative untuk request yang tidak menentukan (jika ada draft)
+SPECULATIVE_DEFAULT = os.environ.get("SPECULATIVE_DEFAULT", "1") == "1"
+# Acceptance rate (EWMA) minimum; di bawahnya speculative dijeda sejumlah
+# step decode lalu dicoba lagi (draft yang jarang cocok hanya menambah beban)
+SPECULATIVE_MIN_ACCEPTANCE = float(os.environ.get("SPECULATIVE_MIN_ACCEPTANCE", "0.3"))
+SPECULATIVE_PAUSE_STEPS = int(os.environ.get("SPECULATIVE_PAUSE_STEPS", "64"))
+
+# Semua engine hidup, dihentikan rapi saat interpreter keluar
+_ENGINES: "weakref.WeakSet[InferenceEngine]" = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown_all():
+    for engine in list(_ENGINES):
+        engine.shutdown(timeout=5)
+
+
+# ===============================
+# ERROR
+# ===============================
+class OverloadedError(RuntimeError):
+    """
+    Request ditolak sebelum masuk antrian. retry_after = saran detik tunggu.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(OverloadedError):
+    pass
+
+
+class DeadlineExceededError(RuntimeError):
+    """
+    Deadline request habis saat menunggu / generate. retry_after = saran
+    detik tunggu (perkiraan antrian engine yang memproses request).
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ===============================
+# REQUEST / RESULT
+# ===============================
+class GenerationFuture(Future):
+    """
+    Future yang tetap bisa dibatalkan saat sedang berjalan:
+    cancel() menandai request, engine membuangnya di step berikutnya.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cancel_requested = False
+
+    def cancel(self) -> bool:
+        self.cancel_requested = True
+        return super().cancel()
+
+
+class GenerationRequest:
+    def __init__(
+        self,
+        prompt_ids,
+        past=None,
+        max_new_tokens: int = 80,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        repetition_penalty: float = 1.1,
+        on_token=None,
+        keep_cache: bool = True,
+        stop_strings: tuple[str, ...] = (),
+        deadline: float | None = None,
+        seed: int | None = None,
+        speculative: bool | None = None,
+    ):
+        self.prompt_ids = list(prompt_ids)
+        self.past = past
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.repetition_penalty = repetition_penalty
+        self.on_token = on_token
+        self.keep_cache = keep_cache
+        self.stop_strings = tuple(s for s in stop_strings if s)
+        # Batas waktu absolut (time.perf_counter), None = tanpa batas
+        self.deadline = deadline
+        # Seed sampling; None = RNG global (tidak reproducible)
+        self.seed = seed
+        # Pakai model draft jika ada; None = default engine
+        self.speculative = speculative
+
+        # Cukup decode ekor sepanjang stop sequence terpanjang
+        # (kasus terburuk satu karakter per token)
+        self.stop_window = max((len(s) for s in self.stop_strings), default=0) + 1
+
+        self.future: GenerationFuture = GenerationFuture()
+
+        # State internal engine
+        self.generated: list[int] = []
+        self.length = 0          # jumlah token real di KV cache
+        self.next_token = None   # token terakhir, belum di-forward
+        self.seen = None         # token id untuk repetition penalty
+        self.generator = None    # torch.Generator jika seed di-set
+        self.draft_past = None   # KV model draft (speculative)
+        self.draft_len = 0       # jumlah token di KV draft
+        self.submitted_at = 0.0  # perf_counter saat masuk antrian
+        self.started_at = 0.0    # perf_counter saat prefill dimulai
+
+
+class GenerationResult:
+    __slots__ = ("token_ids", "cache", "cache_ids")
+
+    def __init__(self, token_ids: list[int], cache=None, cache_ids: list[int] | None = None):
+        self.token_ids = token_ids
+        self.cache = cache
+        self.cache_ids = cache_ids
+
+
+# ===============================
+# ENGINE
+# ===============================
+class InferenceEngine:
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str,
+        max_batch_size: int = ENGINE_MAX_BATCH,
+        max_queue: int = ENGINE_MAX_QUEUE,
+        draft_model=None,
+        speculative_tokens: int = SPECULATIVE_TOKENS,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.eos_token_id = tokenizer.eos_token_id
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue = max(0, max_queue)
+
+        # Rata-rata (EWMA) durasi satu request dari prefill sampai selesai
+        self._service_seconds = 0.0
+
+        # Speculative decoding: draft harus memakai vocab yang sama
+        self.draft_model = None
+        self.speculative_tokens = max(1, speculative_tokens)
+        self._acceptance = 1.0
+        self._speculative_pause = 0
+        if draft_model is not None:
+            main_vocab = model.get_output_embeddings().weight.shape[0]
+            draft_vocab = draft_model.get_output_embeddings().weight.shape[0]
+            if main_vocab == draft_vocab:
+                self.draft_model = draft_model
+                log.info(f"Speculative decoding aktif ({self.speculative_tokens} token draft)")
+            else:
+                log.warning(
+                    f"Vocab model draft ({draft_vocab}) beda dengan model utama "
+                    f"({main_vocab}), speculative decoding dimatikan"
+                )
+
+        # Prefill cukup butuh logits posisi terakhir (hemat lm_head)
+        params = inspect.signature(model.forward).parameters
+        self._prefill_kwargs = {}
+        for name in ("logits_to_keep", "num_logits_to_keep"):
+            if name in params:
+                self._prefill_kwargs[name] = 1
+                break
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._draining = False
+
+        # Batch aktif: KV per layer [B, H, T, D] (left padded) + mask [B, T]
+        self._active: list[GenerationRequest] = []
+        self._layers: list[tuple] | None = None
+        self._mask: torch.Tensor | None = None
+
+        _ENGINES.add(self)
+
+    # ===============================
+    # PUBLIC API
+    # ===============================
+    def submit(self, request: GenerationRequest) -> Future:
+        """
+        Masukkan request ke antrian.
+
+        QueueFullError   → antrian penuh
+        OverloadedError  → perkiraan waktu tunggu melewati deadline request
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference engine sudah ditutup")
+
+            now = time.perf_counter()
+            wait = self.estimated_wait()
+
+            if self.max_queue and self._queue.qsize() >= self.max_queue:
+                REJECTED_TOTAL.inc(reason="queue_full")
+                raise QueueFullError(
+                    f"Antrian inference penuh ({self.max_queue})",
+                    retry_after=max(wait, 1.0),
+                )
+
+            if request.deadline is not None and now + wait > request.deadline:
+                REJECTED_TOTAL.inc(reason="deadline")
+                raise OverloadedError(
+                    f"Perkiraan tunggu {wait:.1f}s melewati deadline request",
+                    retry_after=max(wait, 1.0),
+                )
+
+            self._ensure_started()
+            request.submitted_at = now
+            self._queue.put(request)
+        return request.future
+
+    def estimated_wait(self) -> float:
+        """
+        Perkiraan detik sampai request baru mulai di-prefill.
+        Slot batch kosong → langsung bergabung di step berikutnya.
+        """
+        free = self.max_batch_size - len(self._active)
+        waiting = self._queue.qsize() - free
+        if waiting < 0:
+            return 0.0
+        return (waiting // self.max_batch_size + 1) * self._service_seconds
+
+    def generate(self, request: GenerationRequest) -> GenerationResult:
+        return self.submit(request).result()
+
+    def shutdown(self, wait: bool = True, timeout: float | None = None):
+        """
+        Tutup engine: request yang sudah masuk tetap diselesaikan,
+        request baru ditolak.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._queue.put(None)
+
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    # ===============================
+    # LOOP
+    # ===============================
+    def _ensure_started(self):
+        # Thread dibuat lazy → aman dipakai setelah fork (gunicorn)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._loop,
+                name="inference-engine",
+                daemon=True,
+            )
+            self._thread.start()
+            log.info(f"Inference engine berjalan (max batch {self.max_batch_size})")
+
+    def _next_requests(self) -> list[GenerationRequest]:
+        pending = []
+
+        # Idle → blok sampai ada request
+        if not self._active:
+            req = self._queue.get()
+            if req is None:
+                self._draining = True
+                return pending
+            pending.append(req)
+
+        while not self._draining and len(self._active) + len(pending) < self.max_batch_size:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is None:
+                # Sentinel shutdown: semua request sebelumnya sudah diambil
+                self._draining = True
+                break
+            pending.append(req)
+
+        return pending
+
+    def _loop(self):
+        while not (self._draining and not self._active):
+            try:
+                for req in self._next_requests():
+                    self._admit(req)
+
+                if self._active:
+                    self._step()
+            except Exception as e:
+                # Jangan biarkan thread mati → handler menunggu selamanya
+                log.exception("Inference engine error, batch dibatalkan")
+                self._fail_batch(e)
+
+        log.info("Inference engine berhenti")
+
+    # ===============================
+    # SAMPLING
+    # ===============================
+    @staticmethod
+    def _penalize(logits: torch.Tensor, req: GenerationRequest, seen: torch.Tensor) -> torch.Tensor:
+        logits = logits.float()
+
+        if req.repetition_penalty != 1.0:
+            score = logits.gather(0, seen)
+            score = torch.where(
+                score < 0,
+                score * req.repetition_penalty,
+                score / req.repetition_penalty,
+            )
+            logits.scatter_(0, seen, score)
+
+        return logits
+
+    def _probs(self, logits: torch.Tensor, req: GenerationRequest, seen: torch.Tensor) -> torch.Tensor:
+        """
+        Distribusi sampling penuh (vocab) setelah penalty, temperature & top-p;
+        sama dengan yang dipakai _sample
+        """
+        logits = self._penalize(logits, req, seen) / req.temperature
+
+        sorted_logits, sorted_idx = torch.sort(logits, descending=True)
+        if req.top_p < 1.0:
+            probs = torch.softmax(sorted_logits, dim=-1)
+            cumulative = torch.cumsum(probs, dim=-1)
+            sorted_logits[(cumulative - probs) > req.top_p] = float("-inf")
+
+        return torch.zeros_like(logits).scatter_(0, sorted_idx, torch.softmax(sorted_logits, dim=-1))
+
+    def _sample(self, logits: torch.Tensor, req: GenerationRequest) -> int:
+        logits = self._penalize(logits, req, req.seen)
+
+        if req.temperature <= 0:
+            return int(torch.argmax(logits))
+
+        logits = logits / req.temperature
+
+        sorted_logits, sorted_idx = torch.sort(logits, descending=True)
+        if req.top_p < 1.0:
+            probs = torch.softmax(sorted_logits, dim=-1)
+            cumulative = torch.cumsum(probs, dim=-1)
+            # Token pertama selalu dipertahankan
+            sorted_logits[(cumulative - probs) > req.top_p] = float("-inf")
+
+        probs = torch.softmax(sorted_logits, dim=-1)
+        choice = torch.multinomial(probs, 1, generator=req.generator)
+        return int(sorted_idx[choice])
+
+    def _emit(self, req: GenerationRequest, token: int) -> bool:
+        """
+        Catat token baru. Return True jika sequence selesai.
+        """
+        req.generated.append(token)
+        req.seen = torch.cat([req.seen, req.seen.new_tensor([token])])
+
+        if req.on_token is not None:
+            try:
+                req.on_token(token)
+            except Exception:
+                log.exception("Callback on_token gagal")
+
+        if token == self.eos_token_id or len(req.generated) >= req.max_new_tokens:
+            return True
+
+        if req.stop_strings:
+            tail = self.tokenizer.decode(
+                req.generated[-req.stop_window :],
+                skip_special_tokens=True,
+            )
+            return any(stop in tail for stop in req.stop_strings)
+
+        return False
+
+    # ===============================
+    # PREFILL & JOIN
+    # ===============================
+    def _admit(self, req: GenerationRequest):
+        if not req.future.set_running_or_notify_cancel():
+            CANCELLED_TOTAL.inc(reason="client")
+            return
+
+        if self._expired(req):
+            return
+
+        req.started_at = time.perf_counter()
+        STAGE_SECONDS.observe(req.started_at - req.submitted_at, stage="queue_wait")
+
+        try:
+            past = req.past
+            req.past = None
+            past_len = cache_length(past) if past is not None else 0
+            total = len(req.prompt_ids)
+
+            PROMPT_TOKENS.observe(total)
+            PREFILL_TOKENS.observe(total - past_len)
+
+            input_ids = torch.tensor(
+                [req.prompt_ids[past_len:]], dtype=torch.long, device=self.device
+            )
+            position_ids = torch.arange(
+                past_len, total, dtype=torch.long, device=self.device
+            ).unsqueeze(0)
+            attention_mask = torch.ones(
+                (1, total), dtype=torch.long, device=self.device
+            )
+
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    past_key_values=past,
+                    use_cache=True,
+                    **self._prefill_kwargs,
+                )
+
+            req.length = total
+            if req.seed is not None:
+                req.generator = torch.Generator(device=self.device)
+                req.generator.manual_seed(req.seed)
+            req.seen = torch.tensor(
+                sorted(set(req.prompt_ids)), dtype=torch.long, device=self.device
+            )
+            token = self._sample(outputs.logits[0, -1], req)
+            layers = to_layers(outputs.past_key_values)
+            STAGE_SECONDS.observe(time.perf_counter() - req.started_at, stage="prefill")
+        except Exception as e:
+            log.exception("Prefill gagal")
+            req.future.set_exception(e)
+            return
+
+        if self._emit(req, token):
+            self._complete(req, layers)
+            return
+
+        req.next_token = token
+        self._join(req, layers)
+
+    @staticmethod
+    def _pad_left(t: torch.Tensor, n: int) -> torch.Tensor:
+        if n <= 0:
+            return t
+        shape = list(t.shape)
+        shape[-2] = n
+        return torch.cat([t.new_zeros(shape), t], dim=-2)
+
+    def _join(self, req: GenerationRequest, layers: list[tuple]):
+        if not self._active:
+            self._active = [req]
+            self._layers = layers
+            self._mask = torch.ones((1, req.length), dtype=torch.long, device=self.device)
+            return
+
+        batch_len = self._mask.shape[1]
+        width = max(batch_len, req.length)
+        pad_batch = width - batch_len
+        pad_req = width - req.length
+
+        self._layers = [
+            (
+                torch.cat([self._pad_left(bk, pad_batch), self._pad_left(rk, pad_req)], dim=0),
+                torch.cat([self._pad_left(bv, pad_batch), self._pad_left(rv, pad_req)], dim=0),
+            )
+            for (bk, bv), (rk, rv) in zip(self._layers, layers)
+        ]
+
+        row = torch.zeros((1, width), dtype=torch.long, device=self.device)
+        row[:, pad_req:] = 1
+        mask = self._mask
+        if pad_batch:
+            mask = torch.cat([mask.new_zeros((mask.shape[0], pad_batch)), mask], dim=1)
+        self._mask = torch.cat([mask, row], dim=0)
+
+        self._active.append(req)
+
+    # ===============================
+    # DECODE
+    # ===============================
+    def _expired(self, req: GenerationRequest) -> bool:
+        """
+        True (dan future diisi error) jika request dibatalkan / lewat deadline
+        """
+        if req.future.cancel_requested:
+            CANCELLED_TOTAL.inc(reason="client")
+            req.future.set_exception(CancelledError())
+        elif req.deadline is not None and time.perf_counter() > req.deadline:
+            CANCELLED_TOTAL.inc(reason="deadline")
+            req.future.set_exception(DeadlineExceededError(
+                "Deadline request terlewati",
+                retry_after=max(self.estimated_wait(), 1.0),
+            ))
+        else:
+            return False
+
+        req.seen = None
+        req.generator = None
+        req.draft_past = None
+        return True
+
+    def _step(self):
+        # Buang sequence yang dibatalkan / lewat deadline sebelum forward
+        dropped = [i for i, r in enumerate(self._active) if self._expired(r)]
+        if dropped:
+            self._drop_rows(dropped)
+            if not self._active:
+                return
+
+        # Speculative hanya saat satu sequence aktif (decode latency-bound);
+        # begitu ada request lain bergabung, kembali ke decode batch biasa
+        if len(self._active) == 1 and self._use_speculative(self._active[0]):
+            self._speculative_step(self._active[0])
+            return
+
+        active = self._active
+        start = time.perf_counter()
+
+        input_ids = torch.tensor(
+            [[r.next_token] for r in active], dtype=torch.long, device=self.device
+        )
+        position_ids = torch.tensor(
+            [[r.length] for r in active], dtype=torch.long, device=self.device
+        )
+        mask = torch.cat([self._mask, self._mask.new_ones((len(active), 1))], dim=1)
+
+        try:
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=input_ids,
+                    attention_mask=mask,
+                    position_ids=position_ids,
+                    past_key_values=from_layers(self._layers),
+                    use_cache=True,
+                )
+        except Exception as e:
+            log.exception("Decode step gagal, batch dibatalkan")
+            self._fail_batch(e)
+            return
+
+        self._layers = to_layers(outputs.past_key_values)
+        self._mask = mask
+        logits = outputs.logits[:, -1, :]
+
+        finished = []
+        for i, req in enumerate(active):
+            req.length += 1
+            token = self._sample(logits[i], req)
+            if self._emit(req, token):
+                finished.append(i)
+            else:
+                req.next_token = token
+
+        # Satu step = satu token untuk setiap sequence di batch
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="decode_token")
+        BATCH_SIZE.observe(len(active))
+
+        if finished:
+            self._retire(finished)
+
+    # ===============================
+    # SPECULATIVE DECODING
+    # ===============================
+    def _use_speculative(self, req: GenerationRequest) -> bool:
+        if self.draft_model is None:
+            return False
+        enabled = SPECULATIVE_DEFAULT if req.speculative is None else req.speculative
+        # Sisa 1 token → decode biasa lebih murah
+        if not enabled or req.max_new_tokens - len(req.generated) <= 1:
+            return False
+        # Seed: urutan pemakaian RNG beda dengan decode biasa, dan speculative
+        # hanya jalan saat batch berisi satu sequence → jawaban akan
+        # bergantung pada beban. Greedy tetap sama di kedua jalur.
+        if req.seed is not None and req.temperature > 0:
+            return False
+
+        if self._speculative_pause > 0:
+            self._speculative_pause -= 1
+            return False
+        return True
+
+    def _draft(self, req: GenerationRequest, k: int) -> tuple[list[int], list]:
+        """
+        Model draft mengusulkan k token setelah req.next_token.
+        KV draft dilanjutkan dari langkah sebelumnya (hanya token yang
+        belum pernah di-forward ke draft yang diproses).
+
+        Return (token_draft, distribusi_q per token | None jika greedy)
+        """
+        context = req.prompt_ids + req.generated
+        feed = context[req.draft_len:]
+        greedy = req.temperature <= 0
+
+        seen = req.seen
+        tokens, dists = [], []
+        past = req.draft_past
+        position = req.draft_len
+
+        with torch.no_grad():
+            for i in range(k):
+                input_ids = torch.tensor([feed], dtype=torch.long, device=self.device)
+                outputs = self.draft_model(
+                    input_ids=input_ids,
+                    position_ids=torch.arange(
+                        position, position + len(feed), dtype=torch.long, device=self.device
+                    ).unsqueeze(0),
+                    attention_mask=torch.ones(
+                        (1, position + len(feed)), dtype=torch.long, device=self.device
+                    ),
+                    past_key_values=past,
+                    use_cache=True,
+                )
+                past = outputs.past_key_values
+                position += len(feed)
+                logits = outputs.logits[0, -1]
+
+                if greedy:
+                    token = int(torch.argmax(self._penalize(logits, req, seen)))
+                    dists.append(None)
+                else:
+                    q = self._probs(logits, req, seen)
+                    token = int(torch.multinomial(q, 1, generator=req.generator))
+                    dists.append(q)
+
+                tokens.append(token)
+                seen = torch.cat([seen, seen.new_tensor([token])])
+                feed = [token]
+
+        # Token draft terakhir belum di-forward ke draft
+        req.draft_past = past
+        req.draft_len = position
+        return tokens, dists
+
+    def _speculative_step(self, req: GenerationRequest):
+        """
+        Satu langkah speculative untuk satu sequence:
+        draft k token → verifikasi [next_token, d1..dk] dalam satu forward
+        model utama → terima prefix dengan aturan speculative sampling
+        (greedy: token harus sama dengan argmax model utama), lalu satu
+        token koreksi / bonus dari model utama.
+        """
+        start = time.perf_counter()
+        k = min(self.speculative_tokens, req.max_new_tokens - len(req.generated) - 1)
+
+        try:
+            drafts, dists = self._draft(req, k)
+
+            input_ids = torch.tensor(
+                [[req.next_token] + drafts], dtype=torch.long, device=self.device
+            )
+            position_ids = torch.arange(
+                req.length, req.length + k + 1, dtype=torch.long, device=self.device
+            ).unsqueeze(0)
+            mask = self._mask.new_ones((1, req.length + k + 1))
+
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=input_ids,
+                    attention_mask=mask,
+                    position_ids=position_ids,
+                    past_key_values=from_layers(self._layers),
+                    use_cache=True,
+                )
+        except Exception as e:
+            log.exception("Speculative step gagal, batch dibatalkan")
+            self._fail_batch(e)
+            return
+
+        logits = outputs.logits[0]
+        greedy = req.temperature <= 0
+
+        accepted = 0
+        finished = False
+        token = None
+
+        for i, draft in enumerate(drafts):
+            if greedy:
+                target = int(torch.argmax(self._penalize(logits[i], req, req.seen)))
+                ok = target == draft
+                if not ok:
+                    token = target
+            else:
+                p = self._probs(logits[i], req, req.seen)
+                q = dists[i]
+                ratio = float(p[draft] / q[draft]) if q[draft] > 0 else 0.0
+                u = float(torch.rand((), generator=req.generator, device=self.device))
+                ok = u < min(1.0, ratio)
+                if not ok:
+                    # Sampling ulang dari sisa distribusi max(0, p - q)
+                    residual = torch.clamp(p - q, min=0)
+                    total = residual.sum()
+                    residual = residual / total if total > 0 else p
+                    token = int(torch.multinomial(residual, 1, generator=req.generator))
+
+            if not ok:
+                break
+
+            accepted += 1
+            if self._emit(req, draft):
+                finished = True
+                break
+
+        if not finished:
+            if token is None:
+                # Semua draft diterima → token bonus dari posisi terakhir
+                token = self._sample(logits[k], req)
+            finished = self._emit(req, token)
+
+        SPECULATIVE_DRAFT_TOKENS.inc(accepted, result="accepted")
+        SPECULATIVE_DRAFT_TOKENS.inc(k - accepted, result="rejected")
+        SPECULATIVE_ACCEPTED.observe(accepted)
+
+        self._acceptance = 0.9 * self._acceptance + 0.1 * (accepted / k)
+        if self._acceptance < SPECULATIVE_MIN_ACCEPTANCE:
+            log.info(
+                f"Acceptance draft rendah ({self._acceptance:.2f}), "
+                f"speculative dijeda {SPECULATIVE_PAUSE_STEPS} step"
+            )
+            self._speculative_pause = SPECULATIVE_PAUSE_STEPS
+            # Coba ulang setelah jeda dimulai tepat di ambang
+            self._acceptance = SPECULATIVE_MIN_ACCEPTANCE
+
+        # KV utama: next_token + draft yang diterima (token terakhir yang
+        # di-emit belum di-forward, sama seperti decode biasa)
+        forwarded = accepted if token is None else accepted + 1
+        new_length = req.length + forwarded
+
+        self._layers = [
+            (k_[:, :, :new_length, :], v_[:, :, :new_length, :])
+            for k_, v_ in to_layers(outputs.past_key_values)
+        ]
+        self._mask = mask[:, :new_length]
+        req.length = new_length
+
+        # KV draft hanya valid sampai prefix yang sama dengan sequence
+        req.draft_len = min(req.draft_len, new_length)
+        req.draft_past = crop_cache(req.draft_past, req.draft_len)
+        if req.draft_past is None:
+            req.draft_len = 0
+
+        # decode_token tetap per token: durasi langkah dibagi token yang dihasilkan
+        emitted = accepted + (token is not None)
+        STAGE_SECONDS.observe((time.perf_counter() - start) / emitted, stage="decode_token")
+        BATCH_SIZE.observe(1)
+
+        if finished:
+            self._retire([0])
+        else:
+            req.next_token = token
+
+    def _row_layers(self, index: int, length: int) -> list[tuple]:
+        width = self._mask.shape[1]
+        return [
+            (
+                k[index : index + 1, :, width - length :, :].clone(),
+                v[index : index + 1, :, width - length :, :].clone(),
+            )
+            for k, v in self._layers
+        ]
+
+    def _retire(self, finished: list[int]):
+        for i in finished:
+            req = self._active[i]
+            layers = self._row_layers(i, req.length) if req.keep_cache else None
+            self._complete(req, layers)
+
+        self._drop_rows(finished)
+
+    def _drop_rows(self, rows: list[int]):
+        done = set(rows)
+        keep = [i for i in range(len(self._active)) if i not in done]
+
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, dtype=torch.long, device=self.device)
+        self._active = [self._active[i] for i in keep]
+
+        # Buang kolom padding yang tidak dipakai sequence tersisa
+        start = self._mask.shape[1] - max(r.length for r in self._active)
+
+        self._layers = [
+            (
+                k.index_select(0, index)[:, :, start:, :],
+                v.index_select(0, index)[:, :, start:, :],
+            )
+            for k, v in self._layers
+        ]
+        self._mask = self._mask.index_select(0, index)[:, start:]
+
+    def _complete(self, req: GenerationRequest, layers: list[tuple] | None):
+        cache = None
+        cache_ids = None
+        if req.keep_cache and layers is not None:
+            cache = from_layers(layers)
+            cache_ids = req.prompt_ids + req.generated[:-1]
+
+        n_tokens = len(req.generated)
+        elapsed = time.perf_counter() - req.started_at
+        OUTPUT_TOKENS.observe(n_tokens)
+        if elapsed > 0:
+            TOKENS_PER_SECOND.observe(n_tokens / elapsed)
+
+        if self._service_seconds:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+        else:
+            self._service_seconds = elapsed
+
+        req.seen = None
+        req.generator = None
+        req.draft_past = None
+        req.future.set_result(GenerationResult(list(req.generated), cache, cache_ids))
+
+    def _fail_batch(self, error: Exception):
+        for req in self._active:
+            if not req.future.done():
+                req.future.set_exception(error)
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._active = []
+        self._layers = None
+        self._mask = None
@@ -0,0 +1,469 @@
+"""
+fetcher.py
+HTTP downloader paralel & resumable (production-ready)
+
+Fitur:
+- Download paralel per chunk via HTTP Range
+- Resume setelah gagal / terputus (state di <file>.part.json)
+- SHA256 dihitung bertahap selama download (tanpa baca ulang file di akhir)
+- Tulis dengan buffer besar (pwrite per blok 1 MB)
+- Fallback satu koneksi jika server tidak mendukung Range
+- File remote seekable (Range) → baca sebagian ZIP tanpa download penuh
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+from core.logger import get_logger
+
+log = get_logger("FETCHER")
+
+# ===============================
+# KONFIG
+# ===============================
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", str(16 * 1024 * 1024)))
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "5"))
+
+_BUFFER = 1024 * 1024
+_TIMEOUT = (10, 60)
+
+_local = threading.local()
+
+
+class HashMismatchError(RuntimeError):
+    pass
+
+
+# ===============================
+# UTIL
+# ===============================
+def _session() -> requests.Session:
+    # requests.Session tidak dijamin thread-safe → satu per thread
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def _probe(url: str) -> tuple[int | None, bool]:
+    """
+    Return (ukuran file, mendukung Range)
+    """
+    with _session().get(
+        url,
+        headers={"Range": "bytes=0-0"},
+        stream=True,
+        timeout=_TIMEOUT,
+    ) as r:
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            content_range = r.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[-1]
+            return (int(total) if total.isdigit() else None), True
+
+        length = r.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), False
+
+
+def _state_path(part: Path) -> Path:
+    return part.with_name(part.name + ".json")
+
+
+def _load_state(part: Path, url: str, size: int, chunk_size: int) -> set[int]:
+    state_file = _state_path(part)
+    if not part.exists() or not state_file.exists():
+        return set()
+
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+    except ValueError:
+        return set()
+
+    if (
+        state.get("url") != url
+        or state.get("size") != size
+        or state.get("chunk_size") != chunk_size
+        or part.stat().st_size != size
+    ):
+        return set()
+
+    return set(state.get("done", []))
+
+
+def _save_state(part: Path, url: str, size: int, chunk_size: int, done: set[int]):
+    state_file = _state_path(part)
+    tmp = state_file.with_name(state_file.name + ".tmp")
+    tmp.write_text(
+        json.dumps({
+            "url": url,
+            "size": size,
+            "chunk_size": chunk_size,
+            "done": sorted(done),
+        }),
+        encoding="utf-8",
+    )
+    os.replace(tmp, state_file)
+
+
+def _cleanup(part: Path):
+    part.unlink(missing_ok=True)
+    _state_path(part).unlink(missing_ok=True)
+
+
+def _verify(digest: str, expected: str | None, part: Path):
+    if expected and digest != expected.lower():
+        _cleanup(part)
+        raise HashMismatchError(
+            f"Hash tidak cocok (expected {expected[:12]}, dapat {digest[:12]})"
+        )
+
+
+# ===============================
+# PARALEL (RANGE)
+# ===============================
+def _fetch_range(url: str, fd: int, start: int, end: int):
+    """
+    Download byte [start, end] ke fd. Retry melanjutkan dari offset terakhir.
+    """
+    offset = start
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            with _session().get(
+                url,
+                headers={"Range": f"bytes={offset}-{end}"},
+                stream=True,
+                timeout=_TIMEOUT,
+            ) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise RuntimeError(f"Server tidak mengembalikan 206 ({r.status_code})")
+
+                for data in r.iter_content(chunk_size=_BUFFER):
+                    if data:
+                        os.pwrite(fd, data, offset)
+                        offset += len(data)
+
+            if offset == end + 1:
+                return
+            raise RuntimeError(f"Chunk terpotong di byte {offset}/{end + 1}")
+
+        except (requests.RequestException, RuntimeError) as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            wait = min(2 ** attempt, 30)
+            log.warning(f"Chunk {start}-{end} gagal ({e}), retry {attempt} dalam {wait}s")
+            time.sleep(wait)
+
+
+def _advance_hash(hasher, fd: int, hashed: int, done: set[int], n_chunks: int, chunk_size: int, size: int) -> int:
+    """
+    Hash chunk yang sudah lengkap secara berurutan (selagi chunk lain
+    masih di-download). Return jumlah chunk yang sudah di-hash.
+    """
+    while hashed < n_chunks and hashed in done:
+        offset = hashed * chunk_size
+        end = min(offset + chunk_size, size)
+        while offset < end:
+            data = os.pread(fd, min(_BUFFER, end - offset), offset)
+            hasher.update(data)
+            offset += len(data)
+        hashed += 1
+    return hashed
+
+
+def _fetch_parallel(url: str, part: Path, size: int, workers: int, chunk_size: int) -> str:
+    n_chunks = (size + chunk_size - 1) // chunk_size
+    done = _load_state(part, url, size, chunk_size)
+
+    if done:
+        log.info(f"Melanjutkan download: {len(done)}/{n_chunks} chunk sudah ada")
+    else:
+        with open(part, "wb") as f:
+            f.truncate(size)
+        _save_state(part, url, size, chunk_size, done)
+
+    hasher = hashlib.sha256()
+    fd = os.open(part, os.O_RDWR)
+
+    try:
+        hashed = _advance_hash(hasher, fd, 0, done, n_chunks, chunk_size, size)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    _fetch_range,
+                    url,
+                    fd,
+                    i * chunk_size,
+                    min((i + 1) * chunk_size, size) - 1,
+                ): i
+                for i in range(n_chunks)
+                if i not in done
+            }
+
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    done.add(futures[future])
+                    _save_state(part, url, size, chunk_size, done)
+                    hashed = _advance_hash(hasher, fd, hashed, done, n_chunks, chunk_size, size)
+            except BaseException:
+                # State tersimpan → download berikutnya melanjutkan
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    return hasher.hexdigest()
+
+
+# ===============================
+# SATU KONEKSI
+# ===============================
+def _resume_single(part: Path, url: str, size: int | None) -> int:
+    """
+    Byte yang bisa dilanjutkan dari .part satu koneksi. Part dibuang jika
+    state tidak ada / milik download lain (url, ukuran) / lebih besar
+    dari file remote.
+    """
+    state_file = _state_path(part)
+    state = None
+    if state_file.exists():
+        try:
+            state = json.loads(state_file.read_text(encoding="utf-8"))
+        except ValueError:
+            pass
+
+    if (
+        size is None
+        or not part.exists()
+        or not isinstance(state, dict)
+        or not state.get("single")
+        or state.get("url") != url
+        or state.get("size") != size
+        or part.stat().st_size > size
+    ):
+        # Termasuk sisa download paralel (file sudah dialokasikan penuh)
+        _cleanup(part)
+        return 0
+
+    return part.stat().st_size
+
+
+def _save_single_state(part: Path, url: str, size: int):
+    state_file = _state_path(part)
+    tmp = state_file.with_name(state_file.name + ".tmp")
+    tmp.write_text(json.dumps({"url": url, "size": size, "single": True}), encoding="utf-8")
+    os.replace(tmp, state_file)
+
+
+def _fetch_single(url: str, part: Path, resumable: bool, size: int | None = None) -> str:
+    hasher = hashlib.sha256()
+    start = _resume_single(part, url, size) if resumable else 0
+
+    if not resumable:
+        _cleanup(part)
+
+    if start:
+        # Hash bagian yang sudah ada lalu lanjutkan dari sana
+        with open(part, "rb") as f:
+            for data in iter(lambda: f.read(_BUFFER), b""):
+                hasher.update(data)
+        log.info(f"Melanjutkan download dari byte {start}")
+
+    headers = {"Range": f"bytes={start}-"} if start else {}
+
+    with _session().get(url, headers=headers, stream=True, timeout=_TIMEOUT) as r:
+        if r.status_code == 416:
+            if start and start == size:
+                # Sudah lengkap
+                return hasher.hexdigest()
+            # Part tidak cocok dengan file remote → ulang dari awal
+            _cleanup(part)
+            return _fetch_single(url, part, resumable=False, size=size)
+        r.raise_for_status()
+
+        mode = "ab"
+        if r.status_code != 206:
+            # Tanpa Range / server mengabaikan Range → tulis dari awal
+            # (sisa .part tidak boleh ikut, hash hanya menutup stream baru)
+            hasher = hashlib.sha256()
+            mode = "wb"
+
+        if resumable and size is not None:
+            _save_single_state(part, url, size)
+
+        with open(part, mode, buffering=_BUFFER) as f:
+            for data in r.iter_content(chunk_size=_BUFFER):
+                if data:
+                    f.write(data)
+                    hasher.update(data)
+
+    return hasher.hexdigest()
+
+
+# ===============================
+# FILE REMOTE SEEKABLE
+# ===============================
+class RangeReader(io.RawIOBase):
+    """
+    File read-only di atas HTTP Range.
+
+    Satu response streaming dipakai selama pembacaan berurutan;
+    koneksi baru hanya dibuka saat seek ke posisi lain.
+    """
+
+    def __init__(self, url: str, size: int):
+        self.url = url
+        self.size = size
+        self.requests = 0
+
+        self._pos = 0
+        self._resp = None
+        self._stream_pos = -1
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"whence tidak valid: {whence}")
+
+        if pos < 0:
+            raise ValueError("Posisi negatif")
+
+        self._pos = pos
+        return pos
+
+    def _close_stream(self):
+        if self._resp is not None:
+            self._resp.close()
+            self._resp = None
+        self._stream_pos = -1
+
+    def _open_stream(self):
+        self._close_stream()
+        r = _session().get(
+            self.url,
+            headers={"Range": f"bytes={self._pos}-"},
+            stream=True,
+            timeout=_TIMEOUT,
+        )
+        if r.status_code != 206:
+            r.close()
+            raise RuntimeError(f"Server tidak mengembalikan 206 ({r.status_code})")
+
+        self._resp = r
+        self._stream_pos = self._pos
+        self.requests += 1
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self.size - self._pos)
+        if n <= 0:
+            return 0
+
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                if self._resp is None or self._stream_pos != self._pos:
+                    self._open_stream()
+
+                data = self._resp.raw.read(n)
+                if not data:
+                    raise RuntimeError(f"Stream terpotong di byte {self._pos}")
+                break
+
+            except (requests.RequestException, RuntimeError, OSError) as e:
+                self._close_stream()
+                if attempt == DOWNLOAD_RETRIES:
+                    raise
+                wait = min(2 ** attempt, 30)
+                log.warning(f"Baca remote gagal ({e}), retry {attempt} dalam {wait}s")
+                time.sleep(wait)
+
+        size = len(data)
+        b[:size] = data
+        self._pos += size
+        self._stream_pos = self._pos
+        return size
+
+    def close(self):
+        self._close_stream()
+        super().close()
+
+
+def open_remote(url: str, buffer_size: int = _BUFFER) -> io.BufferedReader | None:
+    """
+    Buka url sebagai file seekable (mis. untuk zipfile.ZipFile).
+    Return None jika server tidak mendukung Range.
+    """
+    size, ranges = _probe(url)
+    if not ranges or size is None:
+        return None
+    return io.BufferedReader(RangeReader(url, size), buffer_size=buffer_size)
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+def fetch(
+    url: str,
+    dest: Path,
+    expected_sha256: str | None = None,
+    workers: int = DOWNLOAD_WORKERS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> str:
+    """
+    Download url ke dest. Return SHA256 (hex) isi file.
+
+    expected_sha256 → jika tidak cocok, file sementara dihapus dan
+    HashMismatchError dilempar (dest tidak disentuh).
+    """
+    dest = Path(dest)
+    part = dest.with_name(dest.name + ".part")
+
+    size, ranges = _probe(url)
+    start = time.perf_counter()
+
+    if ranges and size is not None and size > chunk_size and workers > 1:
+        digest = _fetch_parallel(url, part, size, workers, chunk_size)
+    else:
+        digest = _fetch_single(url, part, resumable=ranges, size=size)
+
+    _verify(digest, expected_sha256, part)
+
+    os.replace(part, dest)
+    _state_path(part).unlink(missing_ok=True)
+
+    elapsed = time.perf_counter() - start
+    if size:
+        log.info(
+            f"Download {dest.name}: {size / 1e6:.1f} MB dalam {elapsed:.1f}s "
+            f"({size / 1e6 / max(elapsed, 1e-9):.1f} MB/s)"
+        )
+
+    return digest
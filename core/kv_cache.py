@@ -0,0 +1,194 @@
+"""
+kv_cache.py
+Cache past_key_values per sesi (production-ready)
+
+Fitur:
+- KV attention disimpan per session id setelah generate
+- Turn berikutnya hanya prefill token baru (prefix yang sama dipakai ulang)
+- Budget memory (bytes) + eviksi LRU
+- Thread-safe, entry dipinjam eksklusif (take → put)
+"""
+
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+import torch
+from transformers import DynamicCache
+from core.logger import get_logger
+
+log = get_logger("KV_CACHE")
+
+# ===============================
+# KONFIG
+# ===============================
+KV_CACHE_MAX_BYTES = int(os.environ.get("KV_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+# ===============================
+# UTIL
+# ===============================
+def _layers(cache):
+    """
+    Iterasi (key, value) per layer untuk DynamicCache maupun format legacy tuple
+    """
+    if hasattr(cache, "layers"):
+        for layer in cache.layers:
+            yield layer.keys, layer.values
+    elif hasattr(cache, "key_cache"):
+        yield from zip(cache.key_cache, cache.value_cache)
+    else:
+        for layer in cache:
+            yield layer[0], layer[1]
+
+
+def to_layers(cache) -> list[tuple]:
+    """
+    Ubah cache menjadi list (key, value) per layer, shape [batch, head, seq, dim]
+    """
+    return [(k, v) for k, v in _layers(cache)]
+
+
+def from_layers(layers):
+    """
+    Bungkus list (key, value) per layer menjadi cache yang diterima model
+    """
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple((k, v) for k, v in layers))
+
+    cache = DynamicCache()
+    for idx, (k, v) in enumerate(layers):
+        cache.update(k, v, idx)
+    return cache
+
+
+def cache_nbytes(cache) -> int:
+    total = 0
+    for k, v in _layers(cache):
+        for t in (k, v):
+            if isinstance(t, torch.Tensor):
+                total += t.numel() * t.element_size()
+    return total
+
+
+def cache_length(cache) -> int:
+    if hasattr(cache, "get_seq_length"):
+        return int(cache.get_seq_length())
+    for k, _ in _layers(cache):
+        return int(k.shape[-2])
+    return 0
+
+
+def crop_cache(cache, length: int):
+    """
+    Potong cache menjadi `length` token pertama.
+    Return cache baru, atau None jika tidak ada yang bisa dipakai.
+    """
+    if length <= 0:
+        return None
+
+    if length >= cache_length(cache):
+        return cache
+
+    return from_layers(
+        (k[..., :length, :], v[..., :length, :])
+        for k, v in _layers(cache)
+    )
+
+
+def common_prefix_len(a, b) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class KVEntry:
+    __slots__ = ("ids", "cache", "nbytes")
+
+    def __init__(self, ids: array, cache, nbytes: int):
+        self.ids = ids
+        self.cache = cache
+        self.nbytes = nbytes
+
+
+# ===============================
+# STORE
+# ===============================
+class KVCacheStore:
+    def __init__(self, max_bytes: int = KV_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[str, KVEntry] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, key: str) -> KVEntry | None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+        return entry
+
+    def take(self, key: str) -> KVEntry | None:
+        """
+        Ambil entry secara eksklusif (dihapus dari store).
+        Request paralel di sesi yang sama akan prefill penuh.
+        """
+        with self._lock:
+            entry = self._drop(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, ids, cache):
+        if cache is None or self.max_bytes <= 0:
+            return
+
+        nbytes = cache_nbytes(cache)
+        if nbytes > self.max_bytes:
+            return
+
+        entry = KVEntry(
+            ids if isinstance(ids, array) else array("I", ids),
+            cache,
+            nbytes,
+        )
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._nbytes += nbytes
+
+            evicted = 0
+            while self._nbytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                evicted += 1
+
+        if evicted:
+            log.info(f"{evicted} KV cache di-evict (LRU), total {self._nbytes} bytes")
+
+    def drop(self, key: str):
+        with self._lock:
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
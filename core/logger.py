@@ -1,10 +1,34 @@
 """
 logger.py
 Unified logger untuk ai_factory & ai_runtime
+
+Fitur:
+- Non-blocking: logger hanya memasukkan record ke antrian; format & I/O
+  (console / file) dikerjakan satu thread background (QueueListener)
+- Antrian terbatas: jika penuh, record dibuang (dihitung) alih-alih
+  memblok thread request
+- Output teks atau JSON per baris (LOG_FORMAT=json) dengan field
+  tambahan (request_id, endpoint, status, latency, ...)
+- Request id per request (contextvars) otomatis ikut di setiap log
+- File logs/app.log dirotasi berdasarkan ukuran
+- Sampling untuk log per request bervolume tinggi (extra=SAMPLED);
+  WARNING ke atas tidak pernah di-sampling
+
+Catatan:
+- Setelah fork (gunicorn) listener dibuat ulang di proses anak
+- Sisa antrian di-flush saat proses keluar
 """
 
+import atexit
+import contextvars
+import json
 import logging
 import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 # ===============================
@@ -12,6 +36,16 @@ from pathlib import Path
 # ===============================
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 LOG_TO_FILE = os.environ.get("LOG_TO_FILE", "0") == "1"
+# text | json
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# 0 = handler dijalankan langsung di thread pemanggil (perilaku lama)
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "1") == "1"
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Rotasi logs/app.log
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+# Porsi log ber-tanda SAMPLED yang ditulis (1.0 = semua)
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 LOG_DIR = BASE_DIR / "logs"
@@ -19,10 +53,205 @@ LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / "app.log"
 
+# extra untuk log per request bervolume tinggi → ikut LOG_SAMPLE_RATE
+SAMPLED = {"sampled": True}
+
+_TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Atribut bawaan LogRecord (selain ini = field extra)
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sampled"}
+
+_request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+
+# ===============================
+# REQUEST CONTEXT
+# ===============================
+def set_request_id(request_id: str | None) -> contextvars.Token:
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: contextvars.Token):
+    _request_id.reset(token)
+
+
+def get_request_id() -> str | None:
+    return _request_id.get()
+
+
+# ===============================
+# FILTER & FORMATTER
+# ===============================
+class _ContextFilter(logging.Filter):
+    """
+    Tempel request id (dibaca di thread pemanggil) & buang record
+    ber-tanda SAMPLED sesuai LOG_SAMPLE_RATE
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            getattr(record, "sampled", False)
+            and record.levelno < logging.WARNING
+            and random.random() >= LOG_SAMPLE_RATE
+        ):
+            return False
+
+        if getattr(record, "request_id", None) is None:
+            record.request_id = _request_id.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(_TEXT_FORMAT, datefmt=_DATE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [req={request_id}]" if request_id else line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Satu objek JSON per baris: ts, level, logger, message, pid,
+    field extra, exc (traceback)
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                payload[key] = value
+        if getattr(record, "sampled", False):
+            payload["sample_rate"] = LOG_SAMPLE_RATE
+
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+# ===============================
+# QUEUE
+# ===============================
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.SimpleQueue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._traceback = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Pesan & traceback dibekukan di thread pemanggil (args / exception
+        # bisa berubah); format akhir dikerjakan listener. Record tidak
+        # disalin: handler ini satu-satunya handler logger.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._traceback.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # SimpleQueue (C, tanpa Condition) → batas dicek lewat qsize()
+        if self.queue.qsize() >= LOG_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+_setup_lock = threading.Lock()
+_handler: logging.Handler | None = None
+_outputs: list[logging.Handler] = []
+_listener: QueueListener | None = None
+
+
+def _build_outputs() -> list[logging.Handler]:
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    outputs = [console]
+
+    if LOG_TO_FILE:
+        file_handler = RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(formatter)
+        outputs.append(file_handler)
+
+    return outputs
+
+
+def _start_listener():
+    global _listener
+
+    log_queue = queue.SimpleQueue()
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_outputs, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _after_fork():
+    # Thread listener tidak ikut ter-fork → antrian & listener baru
+    if _listener is not None:
+        _start_listener()
+
+
+def _setup() -> list[logging.Handler]:
+    """
+    Handler yang dipasang ke setiap logger (dibuat sekali per proses)
+    """
+    global _handler
+
+    with _setup_lock:
+        if not _outputs:
+            _outputs.extend(_build_outputs())
+
+            if LOG_ASYNC:
+                _handler = _NonBlockingQueueHandler(queue.SimpleQueue())
+                _start_listener()
+                atexit.register(_stop_listener)
+                os.register_at_fork(after_in_child=_after_fork)
+
+        # Tanpa antrian: output dipasang langsung ke logger
+        return [_handler] if _handler is not None else list(_outputs)
+
+
+def dropped_logs() -> int:
+    """
+    Jumlah record yang dibuang karena antrian log penuh
+    """
+    return getattr(_handler, "dropped", 0)
+
 
 # ===============================
 # LOGGER FACTORY
 # ===============================
+_CONTEXT_FILTER = _ContextFilter()
+
+
 def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
 
@@ -32,21 +261,9 @@ def get_logger(name: str) -> logging.Logger:
     level = getattr(logging, LOG_LEVEL, logging.INFO)
     logger.setLevel(level)
 
-    formatter = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-
-    # Console handler
-    console = logging.StreamHandler()
-    console.setFormatter(formatter)
-    logger.addHandler(console)
-
-    # Optional file handler
-    if LOG_TO_FILE:
-        file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+    for handler in _setup():
+        logger.addHandler(handler)
 
+    logger.addFilter(_CONTEXT_FILTER)
     logger.propagate = False
-    return logger
\ No newline at end of file
+    return logger
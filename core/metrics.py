@@ -0,0 +1,314 @@
+"""
+metrics.py
+Metrics runtime (format teks Prometheus)
+
+Fitur:
+- Counter, Gauge & Histogram ringan tanpa dependency tambahan
+- Label per metric (mis. stage="prefill")
+- Thread-safe (dipanggil dari handler & thread inference)
+- render() → teks exposition Prometheus untuk endpoint /metrics
+
+Catatan:
+- Nilai disimpan per proses; dengan beberapa worker gunicorn setiap
+  scrape hanya melihat worker yang menjawab (lihat ai_worker_pid)
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from core.logger import dropped_logs
+
+# ===============================
+# BUCKET DEFAULT
+# ===============================
+# Detik: 0.5 ms .. 60 s
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+TOKEN_BUCKETS = (1, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LOAD_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_REGISTRY: list["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# ===============================
+# METRIC
+# ===============================
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+        with _registry_lock:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Label {self.name} harus {self.labelnames}, dapat {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Gauge nilai langsung (set) atau dibaca saat scrape (set_function)
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function):
+        """
+        function() → float (tanpa label) atau dict {label_values_tuple: float}
+        """
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception:
+                result = None
+            if isinstance(result, dict):
+                values.update(result)
+            elif result is not None:
+                values[()] = float(result)
+
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key → [count per bucket..., sum, count]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_REGISTRY)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# ===============================
+# METRIC RUNTIME
+# ===============================
+STAGE_SECONDS = Histogram(
+    "ai_stage_seconds",
+    "Durasi per tahap inference (queue_wait, prompt_build, tokenize, prefill, decode_token, detokenize)",
+    ("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "ai_request_seconds",
+    "Latency request HTTP end-to-end",
+    ("endpoint",),
+)
+REQUESTS_TOTAL = Counter(
+    "ai_requests_total",
+    "Jumlah request HTTP",
+    ("endpoint", "status"),
+)
+PROMPT_TOKENS = Histogram(
+    "ai_prompt_tokens",
+    "Jumlah token prompt per generate",
+    buckets=TOKEN_BUCKETS,
+)
+PREFILL_TOKENS = Histogram(
+    "ai_prefill_tokens",
+    "Jumlah token yang benar-benar di-prefill (setelah KV cache dipakai ulang)",
+    buckets=TOKEN_BUCKETS,
+)
+OUTPUT_TOKENS = Histogram(
+    "ai_output_tokens",
+    "Jumlah token hasil generate per request",
+    buckets=TOKEN_BUCKETS,
+)
+HISTORY_TOKENS = Histogram(
+    "ai_history_tokens",
+    "Jumlah token history sesi saat prompt dibangun (sebelum dipotong)",
+    buckets=TOKEN_BUCKETS,
+)
+TOKENS_PER_SECOND = Histogram(
+    "ai_tokens_per_second",
+    "Throughput generate per request (token / detik sejak prefill)",
+    buckets=RATE_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "ai_batch_size",
+    "Jumlah sequence per decode step",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+REJECTED_TOTAL = Counter(
+    "ai_rejected_total",
+    "Request ditolak saat admission (queue_full, deadline)",
+    ("reason",),
+)
+CANCELLED_TOTAL = Counter(
+    "ai_cancelled_total",
+    "Generate dibatalkan di tengah jalan (client, deadline)",
+    ("reason",),
+)
+SPECULATIVE_DRAFT_TOKENS = Counter(
+    "ai_speculative_draft_tokens_total",
+    "Token usulan model draft (accepted, rejected); acceptance rate = accepted / total",
+    ("result",),
+)
+SPECULATIVE_ACCEPTED = Histogram(
+    "ai_speculative_accepted_tokens",
+    "Jumlah token draft yang diterima per langkah speculative",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16),
+)
+RESPONSE_CACHE_TOTAL = Counter(
+    "ai_response_cache_total",
+    "Lookup response cache untuk request deterministik (hit, miss)",
+    ("result",),
+)
+MODEL_EVICTIONS_TOTAL = Counter(
+    "ai_model_evictions_total",
+    "Varian model di-unload dari registry (lru, idle, pressure, manual)",
+    ("reason",),
+)
+WATCHDOG_ACTIONS_TOTAL = Counter(
+    "ai_watchdog_actions_total",
+    "Tindakan watchdog memory (idle_unload, kv_clear, response_cache_clear, "
+    "session_evict, variant_evict, model_unload)",
+    ("action",),
+)
+WORKER_PID = Gauge(
+    "ai_worker_pid",
+    "PID proses yang menjawab scrape",
+)
+WORKER_PID.set_function(os.getpid)
+
+LOG_DROPPED = Gauge(
+    "ai_log_dropped_records",
+    "Record log dibuang karena antrian log penuh (kumulatif)",
+)
+LOG_DROPPED.set_function(dropped_logs)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "ai_model_load_seconds",
+    "Durasi load model (load) & hot reload end-to-end (reload)",
+    ("kind",),
+    buckets=LOAD_BUCKETS,
+)
@@ -4,17 +4,28 @@ Downloader model runtime (sinkron dengan ai_factory)
 
 Fitur:
 - Ambil model dari GitHub Release
-- Verifikasi hash (SHA256)
+- Download paralel & resumable, verifikasi hash (SHA256) selama download
+- Delta update: manifest berisi hash per file → hanya file yang berubah
+  yang diambil (dibaca langsung dari ZIP remote via HTTP Range)
+- File disimpan content-addressed di model/cache/blobs, folder versi
+  dibangun dari hardlink (file yang sama tidak disalin ulang)
 - Atomic update (aman jika gagal)
+- Layout berversi: model/versions/<id>, model/current & model/rollback
+  berupa symlink yang di-swap atomic
 - Logging konsisten
 """
 
 import json
 import hashlib
+import os
+import re
 import requests
+import time
 import zipfile
 import shutil
 from pathlib import Path
+from core import blob_store
+from core.fetcher import HashMismatchError, fetch, open_remote
 from core.logger import get_logger
 
 log = get_logger("MODEL_DOWNLOADER")
@@ -25,15 +36,25 @@ log = get_logger("MODEL_DOWNLOADER")
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 REPO = "MiftahulKhoiri/ai_factory"   # ⬅️ pastikan benar
-API_BASE = f"https://api.github.com/repos/{REPO}"
+# Bisa diarahkan ke server lokal (mirror / pengganti GitHub API untuk test)
+API_BASE = os.environ.get("AI_FACTORY_API", f"https://api.github.com/repos/{REPO}")
 
 MODEL_ROOT = BASE_DIR / "model"
 MODEL_CURRENT = MODEL_ROOT / "current"
+MODEL_ROLLBACK = MODEL_ROOT / "rollback"
+MODEL_VERSIONS = MODEL_ROOT / "versions"
 MODEL_TMP = MODEL_ROOT / "_tmp"
 MANIFEST_LOCAL = MODEL_ROOT / "manifest.json"
 
+# Manifest per versi (disimpan di dalam folder versi)
+VERSION_MANIFEST = ".manifest.json"
+
+# Jika porsi (bytes) file berubah di atas rasio ini → download ZIP penuh
+# (paralel) alih-alih membaca per file dari ZIP remote
+DELTA_MAX_RATIO = float(os.environ.get("MODEL_DELTA_MAX_RATIO", "0.5"))
+
 MODEL_ROOT.mkdir(exist_ok=True)
-MODEL_CURRENT.mkdir(parents=True, exist_ok=True)
+MODEL_VERSIONS.mkdir(exist_ok=True)
 
 
 # ===============================
@@ -47,19 +68,233 @@ def sha256(path: Path) -> str:
     return h.hexdigest()
 
 
-def download(url: str, dest: Path):
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(dest, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+def download(url: str, dest: Path, expected_sha256: str | None = None) -> str:
+    """
+    Download (paralel & resumable) lalu return SHA256 file
+    """
+    return fetch(url, dest, expected_sha256=expected_sha256)
+
+
+def _version_id(manifest: dict) -> str:
+    version = str(manifest.get("version") or "model")
+    version = re.sub(r"[^A-Za-z0-9._-]", "_", version)
+    return f"{version}-{manifest['hash'][:12]}"
+
+
+def _swap_symlink(link: Path, target: Path):
+    """
+    Arahkan symlink ke target secara atomic (symlink baru + os.replace)
+    """
+    tmp = link.with_name(f".{link.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    tmp.symlink_to(os.path.relpath(target, link.parent))
+    os.replace(tmp, link)
+
+
+def _migrate_legacy(link: Path):
+    """
+    Layout lama: model/current & model/rollback berupa folder biasa.
+    Pindahkan isinya ke model/versions/ agar bisa diganti symlink.
+    Return folder versi hasil migrasi (atau None jika kosong).
+    """
+    if link.is_symlink() or not link.exists():
+        return None
+
+    if not any(link.iterdir()):
+        link.rmdir()
+        return None
+
+    dest = MODEL_VERSIONS / f"legacy-{link.name}-{int(time.time())}"
+    link.rename(dest)
+    log.info(f"Folder {link.name} lama dipindah ke {dest.name}")
+    return dest
+
+
+def _prune_versions(keep: set[Path]):
+    for path in MODEL_VERSIONS.iterdir():
+        if path.is_dir() and path.resolve() not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            log.info(f"Versi model lama dihapus: {path.name}")
+
+
+def activate_version(version_dir: Path):
+    """
+    Jadikan version_dir sebagai model/current (atomic).
+    Versi sebelumnya disimpan sebagai model/rollback, versi lain dihapus
+    (beserta blob & hasil konversi safetensors yang tidak dipakai lagi).
+    """
+    previous = None
+    if MODEL_CURRENT.is_symlink():
+        previous = MODEL_CURRENT.resolve()
+    else:
+        previous = _migrate_legacy(MODEL_CURRENT)
+
+    _migrate_legacy(MODEL_ROLLBACK)
+
+    version_dir = version_dir.resolve()
+    _swap_symlink(MODEL_CURRENT, version_dir)
+
+    keep = {version_dir}
+    if previous is not None and previous != version_dir and previous.exists():
+        _swap_symlink(MODEL_ROLLBACK, previous)
+        keep.add(previous)
+    elif MODEL_ROLLBACK.is_symlink() and MODEL_ROLLBACK.exists():
+        keep.add(MODEL_ROLLBACK.resolve())
+
+    # Manifest aktif mengikuti versi current
+    manifest = version_dir / VERSION_MANIFEST
+    if manifest.exists():
+        shutil.copyfile(manifest, MANIFEST_LOCAL)
+
+    _prune_versions(keep)
+
+    referenced = set()
+    for path in keep:
+        for meta in (_version_files(path) or {}).values():
+            referenced.add(meta["sha256"])
+    blob_store.prune(referenced)
+
+    # Import berat (torch) hanya saat aktivasi
+    from core.model_loader import prune_safetensors_cache
+
+    prune_safetensors_cache(sorted(keep))
+
+    log.info(f"Model aktif: {version_dir.name}")
+
+
+# ===============================
+# DELTA UPDATE (PER FILE)
+# ===============================
+def _read_version_manifest(version_dir: Path) -> dict:
+    path = version_dir / VERSION_MANIFEST
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def _version_files(version_dir: Path) -> dict | None:
+    return _read_version_manifest(version_dir).get("files")
+
+
+def _index_version(version_dir: Path):
+    """
+    Daftarkan file folder versi ke blob store (hardlink, tanpa copy).
+    Versi lama tanpa hash per file di-hash sekali lalu manifest-nya dilengkapi.
+    """
+    manifest = _read_version_manifest(version_dir)
+    files = manifest.get("files")
+
+    if files and all(blob_store.has(m["sha256"]) for m in files.values()):
+        return
+
+    log.info(f"Index file model {version_dir.name} ke blob store")
+
+    files = {}
+    for path in sorted(version_dir.rglob("*")):
+        if not path.is_file() or path.name == VERSION_MANIFEST:
+            continue
+        name = path.relative_to(version_dir).as_posix()
+        files[name] = {
+            "sha256": blob_store.put_file(path),
+            "size": path.stat().st_size,
+        }
+
+    manifest["files"] = files
+    (version_dir / VERSION_MANIFEST).write_text(
+        json.dumps(manifest, indent=2),
+        encoding="utf-8",
+    )
+
+
+def _extract_members(zf: zipfile.ZipFile, wanted: dict | None) -> dict:
+    """
+    Ekstrak member ZIP (streaming) langsung ke blob store.
+    wanted = {nama: {"sha256": ...}} atau None untuk semua file.
+    Return {nama: {"sha256", "size"}} untuk file yang diekstrak.
+    """
+    if wanted is None:
+        names = [i.filename for i in zf.infolist() if not i.is_dir()]
+    else:
+        names = list(wanted)
+
+    files = {}
+    for name in names:
+        blob_store.safe_relpath(name)
+        expected = wanted[name]["sha256"] if wanted else None
+
+        try:
+            src = zf.open(name)
+        except KeyError:
+            raise RuntimeError(f"{name} tidak ada di ZIP model")
+
+        with src:
+            digest, size = blob_store.put_stream(src, expected)
+
+        files[name] = {"sha256": digest, "size": size}
+
+    return files
+
+
+def _fetch_delta(url: str, missing: dict) -> bool:
+    """
+    Ambil hanya file yang berubah langsung dari ZIP remote (HTTP Range).
+    Return False jika server tidak mendukung Range.
+    """
+    remote = open_remote(url)
+    if remote is None:
+        log.warning("Server tidak mendukung Range, fallback download ZIP penuh")
+        return False
+
+    with remote, zipfile.ZipFile(remote) as zf:
+        _extract_members(zf, missing)
+
+    log.info(f"Delta update selesai ({remote.raw.requests} request Range)")
+    return True
+
+
+def _fetch_full(url: str, zip_path: Path, zip_hash: str, wanted: dict | None) -> dict:
+    """
+    Download ZIP penuh (paralel, hash diverifikasi) lalu ekstrak ke blob store
+    """
+    try:
+        download(url, zip_path, expected_sha256=zip_hash)
+    except HashMismatchError as e:
+        raise RuntimeError(f"Hash ZIP tidak cocok, update dibatalkan: {e}") from e
+
+    log.info("Hash valid, ekstrak model")
+
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            return _extract_members(zf, wanted)
+    finally:
+        zip_path.unlink(missing_ok=True)
 
 
 # ===============================
 # MAIN ENGINE
 # ===============================
-def download_latest_model():
+def download_latest_model() -> bool:
+    """
+    Download & aktifkan model terbaru (dipakai saat bootstrap).
+    Return True jika model diperbarui.
+    """
+    version_dir = fetch_latest_model()
+    if version_dir is None:
+        return False
+
+    activate_version(version_dir)
+    return True
+
+
+def fetch_latest_model() -> Path | None:
+    """
+    Download & ekstrak model terbaru ke model/versions/<id> TANPA
+    mengganti model aktif. Return folder versi baru, atau None jika
+    model lokal sudah terbaru.
+    """
     log.info("Mengecek model terbaru di GitHub Release")
 
     # 1️⃣ Ambil release terbaru
@@ -90,49 +325,73 @@ def download_latest_model():
         if local_manifest.get("hash") == remote_hash:
             log.info("Model sudah versi terbaru, tidak perlu update")
             manifest_tmp.unlink(missing_ok=True)
-            return False
+            return None
 
     log.info("Model baru terdeteksi, download dimulai")
 
     if zip_name not in assets:
         raise RuntimeError(f"{zip_name} tidak ditemukan di release")
 
+    zip_url = assets[zip_name]["browser_download_url"]
     zip_path = MODEL_ROOT / zip_name
-    download(assets[zip_name]["browser_download_url"], zip_path)
+    files = manifest_remote.get("files")
 
-    # 4️⃣ Verifikasi hash ZIP
-    zip_hash = sha256(zip_path)
-    if zip_hash != remote_hash:
-        zip_path.unlink(missing_ok=True)
-        raise RuntimeError("Hash ZIP tidak cocok, update dibatalkan")
+    # 4️⃣ Ambil file ke blob store
+    if files:
+        # Manifest per file → hanya ambil yang belum ada di blob store
+        if MODEL_CURRENT.exists():
+            _index_version(MODEL_CURRENT.resolve())
 
-    log.info("Hash valid, ekstrak model")
+        missing = {
+            name: meta for name, meta in files.items()
+            if not blob_store.has(meta["sha256"])
+        }
+        total = sum(m.get("size", 0) for m in files.values()) or len(files)
+        changed = sum(m.get("size", 0) for m in missing.values()) or len(missing)
+        ratio = changed / total if missing else 0.0
+
+        log.info(
+            f"Delta: {len(missing)}/{len(files)} file berubah "
+            f"({ratio * 100:.0f}% ukuran model)"
+        )
 
-    # 5️⃣ Extract ke folder sementara (ATOMIC)
+        if missing and (ratio > DELTA_MAX_RATIO or not _fetch_delta(zip_url, missing)):
+            _fetch_full(zip_url, zip_path, remote_hash, missing)
+    else:
+        # Manifest lama (tanpa hash per file) → ZIP penuh, hash per file
+        # dihitung saat ekstrak & disimpan di manifest versi
+        files = _fetch_full(zip_url, zip_path, remote_hash, None)
+        manifest_remote = {**manifest_remote, "files": files}
+
+    # 5️⃣ Bangun folder versi dari blob (hardlink) di folder sementara
     if MODEL_TMP.exists():
         shutil.rmtree(MODEL_TMP)
     MODEL_TMP.mkdir(parents=True)
 
-    with zipfile.ZipFile(zip_path, "r") as z:
-        z.extractall(MODEL_TMP)
-
-    # 6️⃣ Swap model (atomic replace)
-    if MODEL_CURRENT.exists():
-        shutil.rmtree(MODEL_CURRENT)
-    MODEL_TMP.rename(MODEL_CURRENT)
+    blob_store.materialize(files, MODEL_TMP)
 
-    # 7️⃣ Simpan manifest
-    MANIFEST_LOCAL.write_text(
+    (MODEL_TMP / VERSION_MANIFEST).write_text(
         json.dumps(manifest_remote, indent=2),
         encoding="utf-8",
     )
 
-    # 8️⃣ Cleanup
-    zip_path.unlink(missing_ok=True)
+    # 6️⃣ Pindah ke folder versi (belum aktif)
+    version_dir = MODEL_VERSIONS / _version_id(manifest_remote)
+    if version_dir.exists():
+        if MODEL_CURRENT.is_symlink() and MODEL_CURRENT.resolve() == version_dir.resolve():
+            # Versi sama sedang aktif (manifest lokal hilang) → pakai apa adanya
+            shutil.rmtree(MODEL_TMP)
+        else:
+            shutil.rmtree(version_dir)
+            MODEL_TMP.rename(version_dir)
+    else:
+        MODEL_TMP.rename(version_dir)
+
+    # 7️⃣ Cleanup
     manifest_tmp.unlink(missing_ok=True)
 
-    log.info("Model berhasil diperbarui")
+    log.info("Model baru siap di folder versi")
     log.info(f"Version : {manifest_remote.get('version')}")
     log.info(f"Hash    : {remote_hash}")
 
-    return True
\ No newline at end of file
+    return version_dir
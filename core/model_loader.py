@@ -7,12 +7,30 @@ Fitur:
 - Logging jelas
 - CPU-safe
 - Siap reload model
+- Mode presisi: fp32 / bf16 / int8 (dynamic quantization Linear)
+  dengan cek kualitas vs kecepatan saat load
+- Bobot safetensors di-load via mmap (zero-copy, page cache dipakai
+  bersama antar proses); pytorch_model.bin dikonversi sekali ke
+  model/cache/safetensors/ (dibersihkan saat aktivasi versi baru)
+- Model draft opsional (subfolder draft/ di versi model) untuk
+  speculative decoding
 """
 
+import fcntl
+import gc
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import time
+from contextlib import contextmanager
 from pathlib import Path
 import torch
+from safetensors.torch import save_file
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from core.logger import get_logger
+from core.metrics import MODEL_LOAD_SECONDS
 
 log = get_logger("MODEL_LOADER")
 
@@ -21,20 +39,707 @@ log = get_logger("MODEL_LOADER")
 # ===============================
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODEL_PATH = BASE_DIR / "model" / "current"
+MODEL_CACHE = BASE_DIR / "model" / "cache"
+SAFETENSORS_CACHE = MODEL_CACHE / "safetensors"
+# Keputusan cek presisi per (bobot, mode, device, ambang), dipakai
+# bersama semua worker & restart
+PRECISION_CACHE = MODEL_CACHE / "precision"
+MANIFEST_LOCAL = BASE_DIR / "model" / "manifest.json"
+VERSION_MANIFEST = ".manifest.json"
+
+# Folder sumber hasil konversi (untuk pembersihan cache)
+SOURCE_FILE = ".source"
+
+BIN_WEIGHTS = "pytorch_model.bin"
+BIN_INDEX = "pytorch_model.bin.index.json"
+SAFE_INDEX = "model.safetensors.index.json"
+
+# ===============================
+# KONFIG DRAFT (SPECULATIVE)
+# ===============================
+# auto = pakai <model>/<draft> jika ada, off = tanpa draft, atau path folder
+MODEL_DRAFT = os.environ.get("MODEL_DRAFT", "auto")
+DRAFT_DIR = "draft"
+
+# ===============================
+# KONFIG PRESISI
+# ===============================
+PRECISIONS = ("fp32", "bf16", "int8")
+
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32").lower()
+MODEL_PRECISION_CHECK = os.environ.get("MODEL_PRECISION_CHECK", "1") == "1"
+MODEL_PRECISION_MIN_AGREEMENT = float(
+    os.environ.get("MODEL_PRECISION_MIN_AGREEMENT", "0.9")
+)
+# Speedup minimum vs fp32 (median forward prompt uji); 0 = tidak dicek.
+# Default 0: bf16 / int8 umumnya dipakai demi hemat memory per worker
+MODEL_PRECISION_MIN_SPEEDUP = float(
+    os.environ.get("MODEL_PRECISION_MIN_SPEEDUP", "0")
+)
+# Jumlah forward terukur per model saat cek (diambil median)
+MODEL_PRECISION_PROBE_RUNS = int(os.environ.get("MODEL_PRECISION_PROBE_RUNS", "5"))
+
+# Prompt uji kualitas (format sama dengan prompt chatbot)
+_PROBE_TEXT = (
+    "Instruksi: Jawablah dengan bahasa Indonesia yang jelas, singkat, dan benar.\n"
+    "User: Apa itu kecerdasan buatan dan bagaimana cara kerjanya?\n"
+    "AI:"
+)
 
 # Cache global (runtime)
 _TOKENIZER = None
 _MODEL = None
 _DEVICE = None
+_PRECISION: dict = {}
+_LOAD_INFO: dict = {}
+_MODEL_KEY = ""
+_DRAFT = None
+
+
+# ===============================
+# SAFETENSORS
+# ===============================
+def _bin_shards(path: Path) -> list[str]:
+    index = path / BIN_INDEX
+    if index.exists():
+        weight_map = json.loads(index.read_text(encoding="utf-8"))["weight_map"]
+        return sorted(set(weight_map.values()))
+    if (path / BIN_WEIGHTS).exists():
+        return [BIN_WEIGHTS]
+    return []
+
+
+def _safe_name(shard: str) -> str:
+    return shard.replace("pytorch_model", "model").replace(".bin", ".safetensors")
+
+
+def _cache_key(path: Path, shards: list[str]) -> str:
+    h = hashlib.sha256()
+    for shard in shards:
+        st = (path / shard).stat()
+        h.update(f"{shard}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def _unshare(state: dict) -> dict:
+    """
+    safetensors menolak tensor yang berbagi storage (mis. tied embedding)
+    → salin duplikatnya, pastikan contiguous
+    """
+    seen = set()
+    out = {}
+    for name, tensor in state.items():
+        ptr = tensor.untyped_storage().data_ptr()
+        if ptr in seen:
+            tensor = tensor.clone()
+        seen.add(ptr)
+        out[name] = tensor.contiguous()
+    return out
+
+
+def convert_to_safetensors(path: Path) -> Path:
+    """
+    Konversi pytorch_model.bin (single / sharded) ke safetensors sekali,
+    disimpan di model/cache/safetensors/<key>. Return folder hasil konversi.
+    """
+    shards = _bin_shards(path)
+    if not shards:
+        raise RuntimeError(f"Tidak ada {BIN_WEIGHTS} di {path}")
+
+    dest = SAFETENSORS_CACHE / _cache_key(path, shards)
+    if (dest / ".complete").exists():
+        return dest
+
+    log.info(f"Konversi {len(shards)} file .bin ke safetensors (sekali)")
+    start = time.perf_counter()
+
+    tmp = dest.with_name(dest.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    # File non-bobot (config, tokenizer) ikut disalin
+    for f in path.iterdir():
+        if f.is_file() and f.name not in shards and f.name != BIN_INDEX:
+            shutil.copy2(f, tmp / f.name)
+
+    for shard in shards:
+        state = torch.load(
+            path / shard,
+            map_location="cpu",
+            mmap=True,
+            weights_only=True,
+        )
+        save_file(_unshare(state), tmp / _safe_name(shard), metadata={"format": "pt"})
+        del state
+
+    if (path / BIN_INDEX).exists():
+        index = json.loads((path / BIN_INDEX).read_text(encoding="utf-8"))
+        index["weight_map"] = {
+            k: _safe_name(v) for k, v in index["weight_map"].items()
+        }
+        (tmp / SAFE_INDEX).write_text(json.dumps(index, indent=2), encoding="utf-8")
+
+    (tmp / SOURCE_FILE).write_text(str(path.resolve()), encoding="utf-8")
+    (tmp / ".complete").touch()
+    if dest.exists():
+        shutil.rmtree(dest)
+    tmp.rename(dest)
+
+    log.info(f"Konversi selesai dalam {time.perf_counter() - start:.2f}s → {dest}")
+    return dest
+
+
+def _converted_key(path: Path) -> str | None:
+    shards = _bin_shards(path)
+    return _cache_key(path, shards) if shards else None
+
+
+def prune_safetensors_cache(keep: list[Path]) -> list[str]:
+    """
+    Hapus hasil konversi di model/cache/safetensors/ yang tidak dipakai
+    folder model di keep (current / rollback, beserta draft-nya) maupun
+    sumber lain yang masih ada & tidak berubah (mis. model/variants).
+    Return nama entry yang dihapus.
+    """
+    if not SAFETENSORS_CACHE.is_dir():
+        return []
+
+    referenced = set()
+    for path in keep:
+        for folder in (path, draft_dir(path)):
+            if folder is not None and folder.is_dir():
+                referenced.add(_converted_key(folder))
+
+    removed = []
+    for entry in SAFETENSORS_CACHE.iterdir():
+        # .tmp = konversi yang mungkin sedang berjalan
+        if not entry.is_dir() or entry.name in referenced or entry.name.endswith(".tmp"):
+            continue
+
+        source = entry / SOURCE_FILE
+        if source.exists():
+            origin = Path(source.read_text(encoding="utf-8").strip())
+            if origin.is_dir() and _converted_key(origin) == entry.name:
+                continue
+
+        shutil.rmtree(entry, ignore_errors=True)
+        removed.append(entry.name)
+
+    if removed:
+        log.info(f"Cache safetensors lama dihapus: {', '.join(removed)}")
+    return removed
+
+
+def resolve_model_dir(path: Path = MODEL_PATH) -> Path:
+    """
+    Folder yang dipakai untuk load: model/current jika sudah safetensors,
+    selain itu hasil konversi di model/cache/
+    """
+    if any(path.glob("*.safetensors")):
+        return path
+    if _bin_shards(path):
+        return convert_to_safetensors(path)
+    return path
+
+
+def get_load_info() -> dict:
+    """
+    Info load terakhir: format bobot, folder sumber, durasi (untuk /info)
+    """
+    return dict(_LOAD_INFO)
+
+
+def _manifest(path: Path) -> dict:
+    """
+    Manifest release milik folder model (manifest versi, atau manifest
+    aktif untuk model/current). {} jika tidak ada.
+    """
+    resolved = path.resolve()
+    candidates = [resolved / VERSION_MANIFEST]
+    if resolved == MODEL_PATH.resolve():
+        candidates.append(MANIFEST_LOCAL)
+
+    for manifest in candidates:
+        try:
+            return json.loads(manifest.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+    return {}
+
+
+def model_key(path: Path) -> str:
+    """
+    Identitas isi model (untuk key response cache): hash dari manifest
+    versi, manifest aktif (model/manifest.json), atau fallback path +
+    mtime config.json jika model tidak berasal dari release.
+    """
+    resolved = path.resolve()
+    digest = _manifest(resolved).get("hash")
+    if digest:
+        return str(digest)
+
+    h = hashlib.sha256(str(resolved).encode("utf-8"))
+    config = resolved / "config.json"
+    if config.exists():
+        h.update(str(config.stat().st_mtime_ns).encode("ascii"))
+    return h.hexdigest()
+
+
+def get_model_key() -> str:
+    return _MODEL_KEY
+
+
+# ===============================
+# MODEL DRAFT
+# ===============================
+def draft_dir(path: Path) -> Path | None:
+    """
+    Folder model draft untuk model di path, atau None.
+    Nama subfolder bisa ditentukan manifest release ("draft": "<folder>").
+    """
+    setting = MODEL_DRAFT.strip()
+    if setting.lower() in ("", "0", "off", "none"):
+        return None
+
+    if setting.lower() == "auto":
+        candidate = path / str(_manifest(path).get("draft") or DRAFT_DIR)
+    else:
+        candidate = Path(setting)
+
+    return candidate if (candidate / "config.json").exists() else None
+
+
+def load_draft_from(path: Path, device: str):
+    """
+    Load model draft (fp32, tanpa cek presisi). Gagal load → None,
+    runtime tetap jalan tanpa speculative decoding.
+    """
+    folder = draft_dir(path)
+    if folder is None:
+        return None
+
+    try:
+        draft = _load_fp32(resolve_model_dir(folder))
+        draft.to(device)
+        draft.eval()
+    except Exception as e:
+        log.warning(f"Model draft gagal di-load, speculative decoding nonaktif: {e}")
+        return None
+
+    n_params = sum(p.numel() for p in draft.parameters())
+    log.info(f"Model draft dimuat: {folder.name} ({n_params / 1e6:.1f}M parameter)")
+    return draft
+
+
+def get_draft_model():
+    return _DRAFT
+
+
+# ===============================
+# PRESISI
+# ===============================
+def _load_fp32(model_dir: Path):
+    # Untuk safetensors di CPU, parameter tetap menunjuk ke file mmap
+    return AutoModelForCausalLM.from_pretrained(
+        model_dir,
+        torch_dtype=torch.float32,
+    )
+
+
+def _bf16_supported(device: str) -> bool:
+    if device.startswith("cuda"):
+        return torch.cuda.is_bf16_supported()
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def _probe(model, input_ids: torch.Tensor) -> tuple[torch.Tensor, float]:
+    """
+    Forward prompt uji; return (logits fp32, median detik forward warm
+    dari MODEL_PRECISION_PROBE_RUNS kali)
+    """
+    timings = []
+    with torch.no_grad():
+        logits = model(input_ids=input_ids).logits
+        for _ in range(max(1, MODEL_PRECISION_PROBE_RUNS)):
+            start = time.perf_counter()
+            model(input_ids=input_ids)
+            timings.append(time.perf_counter() - start)
+    return logits.float(), statistics.median(timings)
+
+
+def _quantize_int8(model):
+    quantized = torch.ao.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8,
+        inplace=False,
+    )
+    n_layers = sum(
+        isinstance(m, torch.ao.nn.quantized.dynamic.Linear)
+        for m in quantized.modules()
+    )
+    return quantized, n_layers
+
+
+def _probe_ids(tokenizer) -> torch.Tensor:
+    return torch.tensor(
+        [tokenizer.encode(_PROBE_TEXT, add_special_tokens=False)],
+        dtype=torch.long,
+        device=_DEVICE,
+    )
+
+
+def _judge(precision: str, report: dict, reference: tuple, candidate: tuple) -> str | None:
+    """
+    Bandingkan hasil _probe fp32 (reference) & mode presisi (candidate),
+    isi report. Return alasan kembali ke fp32, None jika lolos.
+    """
+    ref_logits, ref_time = reference
+    logits, elapsed = candidate
+
+    agreement = float((logits.argmax(-1) == ref_logits.argmax(-1)).float().mean())
+    report["top1_agreement"] = round(agreement, 4)
+    report["speedup"] = round(ref_time / max(elapsed, 1e-9), 3)
+
+    log.info(
+        f"Cek presisi {precision}: top-1 agreement {agreement:.3f}, "
+        f"speedup {report['speedup']}x"
+    )
+
+    if agreement < MODEL_PRECISION_MIN_AGREEMENT:
+        log.warning(
+            f"Kualitas {precision} di bawah ambang "
+            f"{MODEL_PRECISION_MIN_AGREEMENT}, pakai fp32"
+        )
+        return "kualitas di bawah ambang"
+
+    if report["speedup"] < MODEL_PRECISION_MIN_SPEEDUP:
+        log.warning(
+            f"Speedup {precision} {report['speedup']}x di bawah ambang "
+            f"{MODEL_PRECISION_MIN_SPEEDUP}x, pakai fp32"
+        )
+        return "speedup di bawah ambang"
+
+    return None
+
+
+def _decision_path(model_dir: Path, precision: str) -> Path:
+    h = hashlib.sha256()
+    h.update(
+        f"{model_dir.resolve()}|{precision}|{_DEVICE}|"
+        f"{MODEL_PRECISION_MIN_AGREEMENT}|{MODEL_PRECISION_MIN_SPEEDUP}".encode()
+    )
+    for f in sorted(model_dir.iterdir()):
+        if f.is_file() and f.suffix in (".safetensors", ".bin"):
+            st = f.stat()
+            h.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return PRECISION_CACHE / f"{h.hexdigest()[:16]}.json"
+
+
+@contextmanager
+def _decision_lock(path: Path):
+    # Satu proses yang mengecek, proses lain menunggu lalu memakai hasilnya
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_decision(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_decision(path: Path, report: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(report), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _convert(model, precision: str, report: dict):
+    """
+    Model hasil konversi presisi, None jika tidak ada yang bisa dikonversi
+    """
+    if precision == "bf16":
+        return model.to(torch.bfloat16)
+
+    candidate, n_layers = _quantize_int8(model)
+    report["quantized_layers"] = n_layers
+    if n_layers == 0:
+        log.warning("Tidak ada nn.Linear untuk di-quantize, pakai fp32")
+        report["reason"] = "tidak ada layer Linear"
+        return None
+    return candidate
+
+
+def _apply_decision(model, precision: str, report: dict, decision: dict):
+    """
+    Terapkan keputusan cek presisi yang sudah ada (tanpa forward pass)
+    """
+    report.update(decision)
+    log.info(f"Presisi {precision}: pakai keputusan cek sebelumnya → {decision['active']}")
+    if decision["active"] == "fp32":
+        return model, report
+
+    candidate = _convert(model, precision, report)
+    if candidate is None:
+        report["active"] = "fp32"
+        return model, report
+    return candidate, report
+
+
+def _apply_precision(tokenizer, model, precision: str, model_dir: Path, check: bool = True):
+    """
+    Terapkan mode presisi ke model fp32 yang sudah di-load.
+    Return (model, report). Jika mode tidak didukung / kualitas turun
+    di bawah ambang / tidak lebih cepat dari fp32 (MODEL_PRECISION_MIN_SPEEDUP),
+    model fp32 yang dipakai.
+
+    Hasil cek disimpan di model/cache/precision/ → semua worker (dan
+    restart) memakai keputusan yang sama tanpa mengecek ulang.
+    check=False → cek (forward pass) ditunda ke verify_precision(),
+    kecuali keputusan sudah tersimpan.
+    """
+    report = {"requested": precision, "active": "fp32"}
+
+    if precision not in PRECISIONS:
+        log.warning(f"MODEL_PRECISION tidak dikenal: {precision}, pakai fp32")
+        report["reason"] = "mode tidak dikenal"
+        return model, report
+
+    if precision == "fp32":
+        return model, report
+
+    if precision == "bf16" and not _bf16_supported(_DEVICE):
+        log.warning(f"bf16 tidak didukung di {_DEVICE}, pakai fp32")
+        report["reason"] = "bf16 tidak didukung hardware"
+        return model, report
+
+    if precision == "int8" and _DEVICE != "cpu":
+        log.warning("int8 dynamic quantization hanya untuk CPU, pakai fp32")
+        report["reason"] = "int8 hanya untuk CPU"
+        return model, report
+
+    if not MODEL_PRECISION_CHECK:
+        candidate = _convert(model, precision, report)
+        if candidate is None:
+            return model, report
+        report["active"] = precision
+        return candidate, report
+
+    path = _decision_path(model_dir, precision)
+    decision = _read_decision(path)
+    if decision is not None:
+        return _apply_decision(model, precision, report, decision)
+
+    if not check:
+        candidate = _convert(model, precision, report)
+        if candidate is None:
+            return model, report
+        report.update(active=precision, check="pending")
+        return candidate, report
+
+    with _decision_lock(path):
+        decision = _read_decision(path)
+        if decision is not None:
+            return _apply_decision(model, precision, report, decision)
+
+        probe_ids = _probe_ids(tokenizer)
+        reference = _probe(model, probe_ids)
+
+        candidate = _convert(model, precision, report)
+        if candidate is None:
+            return model, report
+
+        report["active"] = precision
+        reason = _judge(precision, report, reference, _probe(candidate, probe_ids))
+        if reason is not None:
+            report.update(active="fp32", reason=reason)
+        _write_decision(path, report)
+
+    if reason is not None:
+        if candidate is model:
+            # bf16 dikonversi in-place → load ulang bobot fp32
+            del candidate, model
+            model = _load_fp32(model_dir).to(_DEVICE)
+            model.eval()
+        return model, report
+
+    return candidate, report
+
+
+def verify_precision():
+    """
+    Jalankan cek presisi yang ditunda (load_model(check_precision=False),
+    mis. preload di master gunicorn yang tidak boleh forward sebelum fork).
+    Dipanggil di worker setelah fork; worker pertama mengecek & menyimpan
+    keputusan, worker lain memakai keputusan yang sama.
+
+    Return (tokenizer, model, info) fp32 jika mode presisi gagal cek →
+    model aktif sudah diganti, ChatBot perlu dibuat ulang. None jika lolos
+    atau tidak ada cek yang ditunda.
+    """
+    global _PRECISION
+
+    if _MODEL is None or _PRECISION.get("check") != "pending":
+        return None
+
+    precision = _PRECISION["requested"]
+    report = {k: v for k, v in _PRECISION.items() if k != "check"}
+    model_dir = Path(_LOAD_INFO["source"])
+    path = _decision_path(model_dir, precision)
+
+    reference = None
+    with _decision_lock(path):
+        decision = _read_decision(path)
+        if decision is not None:
+            report.update(decision)
+            log.info(f"Presisi {precision}: pakai keputusan cek sebelumnya → {decision['active']}")
+        else:
+            # Referensi fp32 dari file bobot (mmap) sekaligus model pengganti
+            reference = _load_fp32(model_dir).to(_DEVICE)
+            reference.eval()
+
+            probe_ids = _probe_ids(_TOKENIZER)
+            reason = _judge(precision, report, _probe(reference, probe_ids), _probe(_MODEL, probe_ids))
+            if reason is not None:
+                report.update(active="fp32", reason=reason)
+            _write_decision(path, report)
+
+    if report["active"] != "fp32":
+        _PRECISION = report
+        return None
+
+    if reference is None:
+        reference = _load_fp32(model_dir).to(_DEVICE)
+        reference.eval()
+
+    info = {
+        "precision": report,
+        "weights": {**_LOAD_INFO, "mmap": _DEVICE == "cpu"},
+        "model_key": _MODEL_KEY,
+        "draft": _DRAFT,
+    }
+    set_active_model(_TOKENIZER, reference, info)
+    return _TOKENIZER, reference, info
 
 
-def load_model(force_reload: bool = False, device: str | None = None):
+def get_precision_info() -> dict:
+    """
+    Info mode presisi model yang sedang aktif (untuk /info)
+    """
+    return dict(_PRECISION)
+
+
+def load_model_from(
+    path: Path,
+    device: str | None = None,
+    precision: str | None = None,
+    check_precision: bool = True,
+):
+    """
+    Load tokenizer & model dari folder tertentu TANPA mengganti model aktif
+    (dipakai untuk hot swap saat /reload).
+
+    Return (tokenizer, model, info) → info berisi precision, weights,
+    model_key & draft (model draft atau None)
+
+    check_precision=False → tanpa forward pass saat load (cek kualitas
+    presisi ditunda, lihat verify_precision)
+    """
+    global _DEVICE
+
+    # Tentukan device
+    if device:
+        _DEVICE = device
+    elif not _DEVICE:
+        _DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if not path.exists():
+        raise RuntimeError(f"Folder model tidak ditemukan: {path}")
+
+    # Guard isi folder
+    if not any(path.iterdir()):
+        raise RuntimeError(f"Folder model kosong: {path}")
+
+    start = time.perf_counter()
+    model_dir = resolve_model_dir(path)
+
+    # Load tokenizer & model
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = _load_fp32(model_dir)
+
+    model.to(_DEVICE)
+    model.eval()
+
+    model, report = _apply_precision(
+        tokenizer,
+        model,
+        (precision or MODEL_PRECISION).lower(),
+        model_dir,
+        check=check_precision,
+    )
+
+    draft = load_draft_from(path, _DEVICE)
+
+    load_info = {
+        "format": "safetensors" if any(model_dir.glob("*.safetensors")) else "other",
+        "source": str(model_dir),
+        # bf16/int8 membuat salinan bobot → tidak lagi berbagi page cache
+        "mmap": _DEVICE == "cpu" and report["active"] == "fp32",
+        "seconds": round(time.perf_counter() - start, 3),
+        "draft": draft is not None,
+    }
+
+    MODEL_LOAD_SECONDS.observe(load_info["seconds"], kind="load")
+    log.info(f"Waktu load model: {load_info['seconds']}s ({load_info['format']})")
+    log.info(f"Model berhasil dimuat di device: {_DEVICE} ({report['active']})")
+
+    return tokenizer, model, {
+        "precision": report,
+        "weights": load_info,
+        "model_key": model_key(path),
+        "draft": draft,
+    }
+
+
+def set_active_model(tokenizer, model, info: dict):
+    """
+    Jadikan model hasil load_model_from sebagai model aktif (global)
+    """
+    global _TOKENIZER, _MODEL, _PRECISION, _LOAD_INFO, _MODEL_KEY, _DRAFT
+
+    _TOKENIZER = tokenizer
+    _MODEL = model
+    _PRECISION = info["precision"]
+    _LOAD_INFO = info["weights"]
+    _MODEL_KEY = info.get("model_key", "")
+    _DRAFT = info.get("draft")
+
+
+def load_model(
+    force_reload: bool = False,
+    device: str | None = None,
+    precision: str | None = None,
+    check_precision: bool = True,
+):
     """
     Load tokenizer & model dari model/current
 
     force_reload=True → paksa reload model (misal setelah update)
+    precision → fp32 / bf16 / int8 (default env MODEL_PRECISION)
+    check_precision=False → cek kualitas presisi ditunda ke verify_precision()
     """
-    global _TOKENIZER, _MODEL, _DEVICE
+    global _DEVICE
 
     # Tentukan device
     if device:
@@ -51,39 +756,37 @@ def load_model(force_reload: bool = False, device: str | None = None):
     if not MODEL_PATH.exists():
         raise RuntimeError("Folder model/current tidak ditemukan")
 
-    # Guard isi folder
-    if not any(MODEL_PATH.iterdir()):
-        raise RuntimeError("Folder model/current kosong")
-
-    # Load tokenizer & model
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    model = AutoModelForCausalLM.from_pretrained(
+    tokenizer, model, info = load_model_from(
         MODEL_PATH,
-        torch_dtype=torch.float32,
+        precision=precision,
+        check_precision=check_precision,
     )
+    set_active_model(tokenizer, model, info)
 
-    model.to(_DEVICE)
-    model.eval()
-
-    _TOKENIZER = tokenizer
-    _MODEL = model
+    return _TOKENIZER, _MODEL, _DEVICE
 
-    log.info(f"Model berhasil dimuat di device: {_DEVICE}")
 
-    return _TOKENIZER, _MODEL, _DEVICE
+def free_memory():
+    """
+    Kembalikan memory model yang sudah tidak direferensikan
+    """
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
 
 def unload_model():
     """
     Lepaskan model dari memory (opsional, advanced)
     """
-    global _TOKENIZER, _MODEL
+    global _TOKENIZER, _MODEL, _DRAFT
 
     if _MODEL is not None:
         del _MODEL
         del _TOKENIZER
         _MODEL = None
         _TOKENIZER = None
-        torch.cuda.empty_cache()
+        _DRAFT = None
+        free_memory()
 
         log.info("Model berhasil di-unload dari memory")
\ No newline at end of file
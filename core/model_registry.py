@@ -0,0 +1,368 @@
+"""
+model_registry.py
+Registry multi-model (varian ukuran / bahasa / kandidat A/B)
+
+Fitur:
+- Varian dari folder model/variants/<nama>/ atau env AI_MODELS
+  ("nama=/path/model,nama2=/path/lain")
+- Load on demand saat pertama diminta, single-flight: banyak request
+  untuk model dingin hanya memicu satu load, sisanya menunggu hasilnya
+- Budget memory: sebelum load, varian yang paling lama tidak dipakai
+  (LRU) di-unload sampai perkiraan ukuran muat
+- Batas jumlah model aktif
+- Thread-safe
+
+Catatan:
+- Model default (model/current) dikelola server/runtime.py (hot reload)
+  dan tidak pernah di-evict; ukurannya ikut dihitung dalam budget
+- Varian yang sedang dipakai request (checkout / antrian engine) tidak
+  pernah di-evict; jika semua sibuk, budget sementara dilampaui
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+from core.chatbot import ChatBot
+from core.logger import get_logger
+from core.metrics import MODEL_EVICTIONS_TOTAL
+from core.model_loader import free_memory, load_model_from
+
+log = get_logger("MODEL_REGISTRY")
+
+# ===============================
+# KONFIG
+# ===============================
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_VARIANTS = BASE_DIR / "model" / "variants"
+
+# Total memory bobot semua model aktif (bytes), 0 = tanpa batas
+MODEL_MEMORY_BUDGET = int(os.environ.get("MODEL_MEMORY_BUDGET", "0"))
+# Jumlah varian aktif maksimum (di luar model default), 0 = tanpa batas
+MODEL_MAX_LOADED = int(os.environ.get("MODEL_MAX_LOADED", "0"))
+
+DEFAULT_MODEL = "default"
+
+_WEIGHT_SUFFIXES = (".safetensors", ".bin")
+
+
+class UnknownModelError(RuntimeError):
+    pass
+
+
+# ===============================
+# UTIL
+# ===============================
+def model_nbytes(model) -> int:
+    """
+    Ukuran parameter + buffer model di memory
+    """
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def estimate_nbytes(path: Path) -> int:
+    """
+    Perkiraan memory sebelum load: ukuran file bobot di disk
+    """
+    return sum(
+        f.stat().st_size
+        for f in path.iterdir()
+        if f.is_file() and f.name.endswith(_WEIGHT_SUFFIXES)
+    )
+
+
+def discover_variants() -> dict[str, Path]:
+    """
+    Varian dari model/variants/<nama>/ (berisi config.json) + env AI_MODELS
+    """
+    variants = {}
+
+    if MODEL_VARIANTS.is_dir():
+        for path in sorted(MODEL_VARIANTS.iterdir()):
+            if (path / "config.json").exists():
+                variants[path.name] = path
+
+    for item in os.environ.get("AI_MODELS", "").split(","):
+        if "=" not in item:
+            continue
+        name, path = (part.strip() for part in item.split("=", 1))
+        if name and path:
+            variants[name] = Path(path)
+
+    variants.pop(DEFAULT_MODEL, None)
+    return variants
+
+
+def is_busy(bot: ChatBot) -> bool:
+    """
+    Ada request yang memegang bot (acquire) / diproses / menunggu di engine
+    """
+    return bot.in_use > 0 or bot.engine.active > 0 or bot.engine.queued > 0
+
+
+# ===============================
+# REGISTRY
+# ===============================
+class _Entry:
+    __slots__ = ("name", "path", "bot", "nbytes", "loading", "last_used", "loads")
+
+    def __init__(self, name: str, path: Path):
+        self.name = name
+        self.path = path
+        self.bot: ChatBot | None = None
+        self.nbytes = 0
+        self.loading: Future | None = None
+        self.last_used = 0.0
+        self.loads = 0
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        variants: dict[str, Path] | None = None,
+        budget: int = MODEL_MEMORY_BUDGET,
+        max_loaded: int = MODEL_MAX_LOADED,
+        reserved=None,
+    ):
+        """
+        reserved() → bytes yang sudah terpakai di luar registry
+        (model default), ikut dihitung dalam budget
+        """
+        self.budget = budget
+        self.max_loaded = max_loaded
+        self._reserved = reserved or (lambda: 0)
+
+        # Urut LRU: paling lama tidak dipakai di depan
+        self._entries: OrderedDict[str, _Entry] = OrderedDict(
+            (name, _Entry(name, Path(path)))
+            for name, path in (discover_variants() if variants is None else variants).items()
+        )
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    # ===============================
+    # INTERNAL
+    # ===============================
+    def _loaded(self) -> list[_Entry]:
+        return [e for e in self._entries.values() if e.bot is not None]
+
+    def _used_bytes(self) -> int:
+        return self._reserved() + sum(e.nbytes for e in self._loaded())
+
+    def _evict(self, entry: _Entry, reason: str = "lru"):
+        bot, entry.bot = entry.bot, None
+        freed, entry.nbytes = entry.nbytes, 0
+        self._evictions += 1
+        MODEL_EVICTIONS_TOTAL.inc(reason=reason)
+
+        # Engine menyelesaikan request yang sudah masuk lalu berhenti;
+        # memory dilepas setelah request terakhir melepas referensi bot
+        bot.close()
+        log.info(f"Model '{entry.name}' di-unload ({reason}), {freed / 1e6:.0f} MB dilepas")
+
+    def _make_room(self, incoming: _Entry, nbytes: int) -> bool:
+        """
+        Evict varian LRU (selain incoming) yang tidak sibuk sampai incoming
+        muat di budget & batas jumlah model. nbytes = memory incoming yang
+        belum terhitung. Dipanggil dengan lock; return True jika ada yang
+        di-evict.
+        """
+        def over_budget():
+            return self.budget and self._used_bytes() + nbytes > self.budget
+
+        def over_count():
+            pending = incoming.bot is None
+            return self.max_loaded and len(self._loaded()) + pending > self.max_loaded
+
+        evicted = False
+        for entry in list(self._entries.values()):
+            if not (over_budget() or over_count()):
+                break
+            if entry is incoming or entry.bot is None or is_busy(entry.bot):
+                continue
+            self._evict(entry)
+            evicted = True
+
+        if incoming.bot is not None and (over_budget() or over_count()):
+            log.warning(
+                f"Model '{incoming.name}' ({incoming.nbytes / 1e6:.0f} MB) "
+                f"melebihi sisa budget memory / batas model (model lain sibuk), "
+                f"tetap dipakai"
+            )
+        return evicted
+
+    def _load(self, entry: _Entry, future: Future):
+        try:
+            with self._lock:
+                evicted = self._make_room(entry, estimate_nbytes(entry.path))
+            if evicted:
+                free_memory()
+
+            log.info(f"Memuat model '{entry.name}' dari {entry.path}")
+            tokenizer, model, info = load_model_from(entry.path)
+            bot = ChatBot(
+                tokenizer,
+                model,
+                device=str(model.device),
+                model_key=info["model_key"],
+                draft_model=info["draft"],
+            )
+            nbytes = model_nbytes(model)
+            if info["draft"] is not None:
+                nbytes += model_nbytes(info["draft"])
+
+        except BaseException as e:
+            with self._lock:
+                entry.loading = None
+            future.set_exception(e)
+            log.exception(f"Gagal memuat model '{entry.name}'")
+            return
+
+        with self._lock:
+            entry.bot = bot
+            entry.nbytes = nbytes
+            entry.loads += 1
+            entry.last_used = time.monotonic()
+            entry.loading = None
+            self._entries.move_to_end(entry.name)
+            # Ukuran sebenarnya bisa beda dari perkiraan file bobot
+            evicted = self._make_room(entry, 0)
+
+        future.set_result(bot)
+        if evicted:
+            free_memory()
+
+    # ===============================
+    # PUBLIC API
+    # ===============================
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._entries
+
+    def loaded(self, name: str) -> ChatBot | None:
+        """
+        ChatBot varian jika sudah di-load (tanpa memicu load)
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry.bot if entry is not None else None
+
+    def get(self, name: str, timeout: float | None = None, checkout: bool = False) -> ChatBot:
+        """
+        ChatBot untuk varian `name`, di-load jika belum aktif.
+        Request bersamaan untuk model yang sama menunggu satu load yang sama.
+
+        checkout=True → bot sudah di-acquire (pasangkan dengan release);
+        diambil di bawah lock registry sehingga tidak bisa di-evict di antara.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None:
+                    raise UnknownModelError(f"Model tidak dikenal: {name}")
+
+                if entry.bot is not None:
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(name)
+                    if checkout:
+                        entry.bot.acquire()
+                    return entry.bot
+
+                owner = entry.loading is None
+                if owner:
+                    entry.loading = Future()
+                future = entry.loading
+
+            if owner:
+                self._load(entry, future)
+
+            bot = future.result(timeout)
+            if not checkout or bot.acquire():
+                return bot
+            # Sudah di-evict lagi sebelum sempat dipakai → ulang
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.bot is None:
+                return False
+            self._evict(entry, reason="manual")
+        free_memory()
+        return True
+
+    def evict_idle(self, max_idle: float) -> list[str]:
+        """
+        Unload varian yang tidak dipakai selama max_idle detik
+        dan tidak sedang memproses request
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                entry for entry in self._loaded()
+                if now - entry.last_used >= max_idle and not is_busy(entry.bot)
+            ]
+            for entry in idle:
+                self._evict(entry, reason="idle")
+        if idle:
+            free_memory()
+        return [entry.name for entry in idle]
+
+    def evict_lru(self, reason: str) -> str | None:
+        """
+        Unload satu varian (paling lama tidak dipakai) yang sedang
+        tidak memproses request. Return nama varian, None jika tidak ada.
+        """
+        with self._lock:
+            for entry in self._loaded():
+                if not is_busy(entry.bot):
+                    self._evict(entry, reason=reason)
+                    break
+            else:
+                return None
+        free_memory()
+        return entry.name
+
+    def loaded_count(self) -> int:
+        with self._lock:
+            return len(self._loaded())
+
+    def used_bytes(self) -> int:
+        with self._lock:
+            return self._used_bytes()
+
+    def close(self):
+        with self._lock:
+            for entry in self._loaded():
+                self._evict(entry, reason="manual")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "max_loaded": self.max_loaded,
+                "used_bytes": self._used_bytes(),
+                "evictions": self._evictions,
+                "models": {
+                    entry.name: {
+                        "path": str(entry.path),
+                        "loaded": entry.bot is not None,
+                        "loading": entry.loading is not None,
+                        "bytes": entry.nbytes,
+                        "loads": entry.loads,
+                        "idle_seconds": round(now - entry.last_used, 1) if entry.bot else None,
+                    }
+                    for entry in self._entries.values()
+                },
+            }
+
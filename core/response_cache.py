@@ -0,0 +1,170 @@
+"""
+response_cache.py
+Cache jawaban exact-match untuk generate deterministik
+
+Fitur:
+- Key = hash model + token id prompt (ternormalisasi) + parameter generate
+- Hanya request deterministik (greedy / seed tetap) yang di-cache
+  → jawaban untuk prompt yang sama pasti identik
+- Eviksi LRU + TTL
+- Batas keras jumlah entry & memory
+- Thread-safe
+
+Catatan:
+- Cache dimiliki satu ChatBot; hot reload membuat ChatBot (dan cache)
+  baru sehingga jawaban model lama tidak pernah dipakai ulang
+"""
+
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from core.logger import get_logger
+
+log = get_logger("RESPONSE_CACHE")
+
+# ===============================
+# KONFIG
+# ===============================
+# 0 = cache nonaktif
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+
+# Perkiraan overhead objek per entry (key, tuple, OrderedDict node)
+_ENTRY_OVERHEAD = 256
+
+
+def make_key(model_key: str, prompt_ids: array, params: tuple) -> bytes:
+    """
+    Digest ringkas untuk (model, prompt, parameter generate)
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(model_key.encode("utf-8"))
+    h.update(b"\0")
+    h.update(repr(params).encode("utf-8"))
+    h.update(b"\0")
+    h.update(array("I", prompt_ids).tobytes())
+    return h.digest()
+
+
+class CachedReply:
+    __slots__ = ("text", "reply_ids", "nbytes", "created")
+
+    def __init__(self, text: str, reply_ids: array):
+        self.text = text
+        self.reply_ids = reply_ids
+        self.nbytes = (
+            _ENTRY_OVERHEAD
+            + len(text.encode("utf-8"))
+            + len(reply_ids) * reply_ids.itemsize
+        )
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries: OrderedDict[bytes, CachedReply] = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    # ===============================
+    # INTERNAL
+    # ===============================
+    def _drop(self, key: bytes):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+
+    def _expire(self, now: float):
+        # Urutan LRU ≈ urutan umur; entry kedaluwarsa yang sempat dipakai
+        # ulang (pindah ke belakang) dibuang saat diakses di get()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created < self.ttl:
+                break
+            self._drop(key)
+
+    def _enforce_limits(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or self._nbytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._entries)))
+
+    # ===============================
+    # PUBLIC API
+    # ===============================
+    def get(self, key: bytes) -> CachedReply | None:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            entry = self._entries.get(key)
+            if entry is None or now - entry.created >= self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, key: bytes, text: str, reply_ids):
+        if not self.enabled:
+            return
+
+        entry = CachedReply(text, array("I", reply_ids))
+        if entry.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._nbytes += entry.nbytes
+            self._enforce_limits()
+
+    def clear(self):
+        with self._lock:
+            n = len(self._entries)
+            self._entries.clear()
+            self._nbytes = 0
+        if n:
+            log.info(f"Response cache dikosongkan ({n} entry)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
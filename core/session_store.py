@@ -0,0 +1,233 @@
+"""
+session_store.py
+Penyimpanan history percakapan per sesi (production-ready)
+
+Fitur:
+- History terpisah per session id (tidak ada lagi history global)
+- Token id per turn disimpan ringkas (array uint32)
+- Eviksi LRU + TTL
+- Batas keras jumlah sesi & memory
+- Callback eviksi (TTL / LRU / shrink) → state turunan per sesi
+  (mis. KV cache) ikut dibuang
+- Thread-safe
+"""
+
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from core.logger import get_logger
+
+log = get_logger("SESSION_STORE")
+
+# ===============================
+# KONFIG
+# ===============================
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "1800"))
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", "1000"))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Perkiraan overhead objek per sesi & per turn (dict, deque, array header)
+_SESSION_OVERHEAD = 512
+_TURN_OVERHEAD = 96
+
+
+def _turn_nbytes(ids: array) -> int:
+    return _TURN_OVERHEAD + len(ids) * ids.itemsize
+
+
+class Session:
+    """
+    History satu sesi: deque token id per turn + total token berjalan
+    """
+
+    __slots__ = ("turns", "n_tokens", "nbytes", "last_access")
+
+    def __init__(self):
+        self.turns: deque[array] = deque()
+        self.n_tokens = 0
+        self.nbytes = _SESSION_OVERHEAD
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX_COUNT,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        # Dipanggil dengan session id setiap sesi di-evict (di luar lock).
+        # Bisa lebih dari satu: store dipakai bersama saat hot swap.
+        self._evict_callbacks: list = []
+        self._evicted: list[str] = []
+
+    # ===============================
+    # INTERNAL
+    # ===============================
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._nbytes -= session.nbytes
+
+    def _evict(self, session_id: str):
+        self._drop(session_id)
+        if self._evict_callbacks:
+            self._evicted.append(session_id)
+
+    def _take_evicted(self) -> list[str]:
+        evicted, self._evicted = self._evicted, []
+        return evicted
+
+    def _notify(self, evicted: list[str]):
+        for session_id in evicted:
+            for callback in list(self._evict_callbacks):
+                callback(session_id)
+
+    def _expire(self, now: float):
+        # OrderedDict terurut dari yang paling lama tidak diakses
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl:
+                break
+            self._evict(session_id)
+
+    def _enforce_limits(self):
+        evicted = 0
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions
+            or self._nbytes > self.max_bytes
+        ):
+            session_id = next(iter(self._sessions))
+            self._evict(session_id)
+            evicted += 1
+
+        if evicted:
+            log.info(f"{evicted} sesi di-evict (LRU), total memory {self._nbytes} bytes")
+
+    def _touch(self, session_id: str, create: bool) -> Session | None:
+        now = time.monotonic()
+        self._expire(now)
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = Session()
+            self._sessions[session_id] = session
+            self._nbytes += session.nbytes
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_access = now
+        return session
+
+    # ===============================
+    # PUBLIC API
+    # ===============================
+    def add_evict_callback(self, callback):
+        """
+        callback(session_id) dipanggil setiap sesi di-evict (TTL / LRU /
+        shrink). reset / clear tidak memanggil callback.
+        """
+        with self._lock:
+            self._evict_callbacks.append(callback)
+
+    def remove_evict_callback(self, callback):
+        with self._lock:
+            if callback in self._evict_callbacks:
+                self._evict_callbacks.remove(callback)
+
+    def history(self, session_id: str) -> tuple[list[array], int]:
+        """
+        Snapshot token id per turn milik sesi (urut dari turn terlama)
+        beserta total token berjalan
+        """
+        with self._lock:
+            session = self._touch(session_id, create=False)
+            evicted = self._take_evicted()
+            result = ([], 0) if session is None else (list(session.turns), session.n_tokens)
+
+        self._notify(evicted)
+        return result
+
+    def append_turn(self, session_id: str, ids, max_tokens: int | None = None):
+        """
+        Tambah satu turn ke sesi.
+
+        max_tokens → turn terlama dibuang utuh hingga total token
+        sesi tidak melebihi batas ini.
+        """
+        turn = ids if isinstance(ids, array) else array("I", ids)
+
+        with self._lock:
+            session = self._touch(session_id, create=True)
+
+            session.turns.append(turn)
+            session.n_tokens += len(turn)
+            size = _turn_nbytes(turn)
+            session.nbytes += size
+            self._nbytes += size
+
+            if max_tokens is not None:
+                while len(session.turns) > 1 and session.n_tokens > max_tokens:
+                    old = session.turns.popleft()
+                    session.n_tokens -= len(old)
+                    size = _turn_nbytes(old)
+                    session.nbytes -= size
+                    self._nbytes -= size
+
+            self._enforce_limits()
+            evicted = self._take_evicted()
+
+        self._notify(evicted)
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._nbytes = 0
+
+    def shrink(self, keep: float) -> int:
+        """
+        Buang sesi yang paling lama tidak diakses hingga tersisa
+        `keep` (0..1) dari jumlah sesi sekarang. Return jumlah sesi dibuang.
+        """
+        with self._lock:
+            target = int(len(self._sessions) * keep)
+            count = 0
+            while len(self._sessions) > target:
+                self._evict(next(iter(self._sessions)))
+                count += 1
+            evicted = self._take_evicted()
+
+        self._notify(evicted)
+        return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            evicted = self._take_evicted()
+            stats = {
+                "sessions": len(self._sessions),
+                "bytes": self._nbytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+        self._notify(evicted)
+        return stats
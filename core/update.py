@@ -1,29 +1,95 @@
 """
 update.py
 Auto update source code dari GitHub
+
+Catatan:
+- Hasil cek commit remote bisa di-cache (TTL) agar restart tidak
+  menunggu git fetch setiap kali; cache hanya ditulis setelah kode
+  terbukti terbaru / pull berhasil
+- git fetch / pull yang gagal (mis. offline) di-cache dengan TTL lebih
+  pendek (retry_ttl) → restart berikutnya tidak menunggu timeout lagi
+- git fetch dibatasi timeout (gagal cepat tanpa network)
 """
 
+import json
 import subprocess
 import os
+import time
 
 from core.logger import get_logger
 
 log = get_logger("AI_SELF_UPDATE")
 
+GIT_TIMEOUT = int(os.environ.get("AI_RUNTIME_GIT_TIMEOUT", "15"))
+
 
 class SelfUpdater:
-    def __init__(self, repo_dir: str, branch: str = "main"):
+    def __init__(
+        self,
+        repo_dir: str,
+        branch: str = "main",
+        check_ttl: int = 0,
+        cache_file=None,
+        retry_ttl: int = 0,
+    ):
         self.repo_dir = repo_dir
         self.branch = branch
+        self.check_ttl = check_ttl
+        self.retry_ttl = retry_ttl
+        self.cache_file = cache_file
 
     def _run(self, cmd):
         return subprocess.check_output(
             cmd,
             cwd=self.repo_dir,
             stderr=subprocess.STDOUT,
-            text=True
+            text=True,
+            timeout=GIT_TIMEOUT,
         ).strip()
 
+    # ===============================
+    # CACHE CEK REMOTE
+    # ===============================
+    def _recently_checked(self) -> str | None:
+        """
+        Return "ok" / "failed" jika cek terakhir masih dalam TTL-nya
+        (check_ttl / retry_ttl), None jika perlu cek ulang
+        """
+        if not self.cache_file:
+            return None
+
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        result = "ok" if cache.get("ok", True) else "failed"
+        ttl = self.check_ttl if result == "ok" else self.retry_ttl
+        if ttl <= 0 or cache.get("branch") != self.branch:
+            return None
+
+        age = time.time() - cache.get("checked_at", 0)
+        return result if 0 <= age < ttl else None
+
+    def _mark_checked(self, remote: str | None, ok: bool = True):
+        if not self.cache_file:
+            return
+
+        try:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "branch": self.branch,
+                        "remote": remote,
+                        "ok": ok,
+                        "checked_at": time.time(),
+                    },
+                    f,
+                )
+        except OSError as e:
+            log.warning(f"Gagal menyimpan cache cek update: {e}")
+
     def _is_git_repo(self) -> bool:
         return os.path.isdir(os.path.join(self.repo_dir, ".git"))
 
@@ -56,6 +122,14 @@ class SelfUpdater:
                 log.warning("Folder bukan Git repository, skip auto update")
                 return False
 
+            recent = self._recently_checked()
+            if recent == "ok":
+                log.info(f"Cek update di-skip (sudah dicek < {self.check_ttl}s lalu)")
+                return False
+            if recent == "failed":
+                log.info(f"Cek update di-skip (gagal < {self.retry_ttl}s lalu)")
+                return False
+
             # ⛔ HANYA cegah update jika FILE KODE (tracked) berubah
             if self.has_tracked_changes():
                 log.warning(
@@ -64,22 +138,33 @@ class SelfUpdater:
                 return False
 
             local = self.get_local_commit()
-            remote = self.get_remote_commit()
+            try:
+                remote = self.get_remote_commit()
+            except (subprocess.SubprocessError, OSError):
+                self._mark_checked(None, ok=False)
+                raise
 
             log.info(f"Local commit  : {local[:8]}")
             log.info(f"Remote commit : {remote[:8]}")
 
             if local == remote:
+                self._mark_checked(remote)
                 log.info("Kode sudah terbaru (skip)")
                 return False
 
             log.warning("Update terdeteksi, menarik kode terbaru...")
-            subprocess.run(
-                ["git", "pull", "--rebase", "origin", self.branch],
-                cwd=self.repo_dir,
-                check=True
-            )
+            try:
+                subprocess.run(
+                    ["git", "pull", "--rebase", "origin", self.branch],
+                    cwd=self.repo_dir,
+                    check=True
+                )
+            except (subprocess.SubprocessError, OSError):
+                # Jangan cache sebagai "terbaru" → dicoba lagi setelah retry_ttl
+                self._mark_checked(remote, ok=False)
+                raise
 
+            self._mark_checked(remote)
             log.info("Update selesai, restart aplikasi diperlukan")
             return True
 
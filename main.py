@@ -21,6 +21,22 @@ import os
 BASE_DIR = Path(__file__).resolve().parent
 VENV_DIR = BASE_DIR / "venv"
 GUNICORN = VENV_DIR / "bin" / "gunicorn"
+GUNICORN_CONF = BASE_DIR / "server" / "gunicorn_conf.py"
+
+# ===============================
+# KONFIG
+# ===============================
+WORKERS = int(os.environ.get("AI_RUNTIME_WORKERS", "1"))
+# Thread handler per worker (gthread): request paralel masuk ke batch
+# inference yang sama, heartbeat worker tidak terblokir request panjang
+THREADS = int(os.environ.get("AI_RUNTIME_THREADS", "8"))
+# Load model sekali di master lalu fork worker (bobot dipakai bersama)
+PRELOAD = os.environ.get("AI_RUNTIME_PRELOAD", "1") == "1"
+# wsgi = Flask + gthread, asgi = server/asgi.py di event loop (uvicorn worker)
+SERVER_MODE = os.environ.get("AI_RUNTIME_SERVER", "wsgi").lower()
+
+if SERVER_MODE not in ("wsgi", "asgi"):
+    raise RuntimeError(f"AI_RUNTIME_SERVER tidak dikenal: {SERVER_MODE} (wsgi / asgi)")
 
 
 # ===============================
@@ -65,13 +81,24 @@ def run():
     # 2️⃣ Jalankan Gunicorn
     cmd = [
         str(GUNICORN),
-        "server.app:app",
+        "--config", str(GUNICORN_CONF),
         "--bind", "0.0.0.0:5000",
-        "--workers", "1",
+        "--workers", str(WORKERS),
         "--timeout", "120",
         "--log-level", "info",
     ]
 
+    if SERVER_MODE == "asgi":
+        # Koneksi ditangani event loop, generate di thread engine
+        cmd += ["--worker-class", "uvicorn_worker.UvicornWorker", "server.asgi:app"]
+    else:
+        cmd += ["--threads", str(THREADS), "server.app:app"]
+
+    log.info(f"Mode server: {SERVER_MODE}")
+
+    if PRELOAD:
+        cmd.append("--preload")
+
     proc = subprocess.Popen(
         cmd,
         cwd=str(BASE_DIR),
@@ -4,42 +4,134 @@ Flask app ai_runtime (production-ready)
 
 Catatan:
 - Tidak ada bootstrap di import time
-- Model di-load lazy & reloadable
+- Model di-load lazy & reloadable (state di server/runtime.py)
+- /health = proses hidup, /ready = model sudah load + warmup
+- /reload = hot swap di background, tanpa downtime
 - Aman untuk Gunicorn
+- History per sesi (header X-Session-Id / cookie ai_session)
+- Streaming token via Server-Sent Events (/chat/stream)
+- Metrics Prometheus di /metrics (latency per tahap & per endpoint)
+- Admission control: antrian penuh → 429, perkiraan tunggu melewati
+  deadline → 503 (keduanya dengan Retry-After); stream dibatalkan jika
+  client putus
+- Mode deterministik per request (greedy / seed) + response cache
+- /chat/batch → batch stateless untuk workload offline, hasil JSONL
+- Multi model: field "model" memilih varian (load on demand, eviksi LRU),
+  daftar & status di /models
 """
 
 import time
-from flask import Flask, request, jsonify
-from core.logger import get_logger
-from core.model_loader import load_model
-from core.model_downloader import download_latest_model
-from core.chatbot import ChatBot
+from contextlib import closing
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from core import metrics
+from core.batch import run_batch
+from core.logger import get_logger, set_request_id
+from server.common import (
+    API_ERRORS,
+    REQUEST_ID_HEADER,
+    REQUEST_TIMEOUT,
+    SESSION_COOKIE,
+    SESSION_HEADER,
+    batch_error,
+    batch_input,
+    batch_line,
+    chat_input,
+    chat_payload,
+    error_response,
+    health_payload,
+    index_payload,
+    inference_errors,
+    info_payload,
+    json_body,
+    pick_request_id,
+    pick_session_id,
+    record_request,
+    ready_response,
+    reload_response,
+    reset_payload,
+    stream_error,
+    stream_event,
+)
+from server.runtime import acquire_bot, models_status
 
 log = get_logger("AI_SERVER")
 
 app = Flask(__name__)
 
+
+def get_session_id() -> tuple[str, bool]:
+    """
+    Ambil session id dari header / cookie.
+
+    Return (session_id, is_new) → is_new=True jika id baru dibuat
+    dan perlu dikirim balik sebagai cookie.
+    """
+    return pick_session_id(
+        request.headers.get(SESSION_HEADER),
+        request.cookies.get(SESSION_COOKIE),
+    )
+
+
+def with_session(response, session_id: str, is_new: bool):
+    response.headers[SESSION_HEADER] = session_id
+    if is_new:
+        response.set_cookie(
+            SESSION_COOKIE,
+            session_id,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
 # ===============================
-# RUNTIME STATE (GLOBAL TERKONTROL)
+# METRICS REQUEST
 # ===============================
-_tokenizer = None
-_model = None
-_device = None
-_bot: ChatBot | None = None
+def _endpoint_label() -> str:
+    return request.url_rule.rule if request.url_rule else "unknown"
 
 
-def get_bot() -> ChatBot:
-    """
-    Lazy load chatbot (aman untuk Gunicorn)
-    """
-    global _tokenizer, _model, _device, _bot
+@app.before_request
+def _start_timer():
+    g.start = time.perf_counter()
+    # Request id ikut di semua log thread ini sampai request berikutnya
+    g.request_id = pick_request_id(request.headers.get(REQUEST_ID_HEADER))
+    set_request_id(g.request_id)
+
 
-    if _bot is None:
-        log.info("Memuat model & chatbot runtime")
-        _tokenizer, _model, _device = load_model()
-        _bot = ChatBot(_tokenizer, _model, device=_device)
+@app.after_request
+def _record_request(response):
+    if "request_id" in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    # Response streaming dicatat saat stream selesai (lihat chat_stream)
+    if not response.is_streamed and "start" in g:
+        record_request(
+            request.method,
+            _endpoint_label(),
+            time.perf_counter() - g.start,
+            str(response.status_code),
+        )
+    return response
 
-    return _bot
+
+# ===============================
+# ERROR
+# ===============================
+def handle_api_error(e: Exception):
+    # 400 / 404 model / 429 / 503 (+ Retry-After), lihat error_response
+    payload, status, headers = error_response(e)
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+for _error in API_ERRORS:
+    app.register_error_handler(_error, handle_api_error)
+
+
+def _json_body() -> dict | None:
+    return json_body(request.mimetype, request.get_data())
 
 
 # ===============================
@@ -48,83 +140,166 @@ def get_bot() -> ChatBot:
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
-        "status": "ok",
-        "service": "ai_runtime",
-    })
+    return jsonify(health_payload())
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe: 200 hanya setelah model di-load & warmup selesai
+    """
+    payload, status = ready_response()
+    return jsonify(payload), status
 
 
 @app.route("/chat", methods=["POST"])
 def chat():
-    start = time.time()
+    start = time.perf_counter()
+    text, options, model = chat_input(_json_body())
+    session_id, is_new = get_session_id()
 
-    if not request.is_json:
-        return jsonify({"error": "Request harus JSON"}), 400
+    with inference_errors():
+        bot = acquire_bot(model)
+        try:
+            reply = bot.reply(text, session_id=session_id, timeout=REQUEST_TIMEOUT, **options)
+        finally:
+            bot.release()
 
-    data = request.get_json(silent=True) or {}
-    text = data.get("text", "").strip()
+    return with_session(jsonify(chat_payload(reply, start)), session_id, is_new)
 
-    if not text:
-        return jsonify({"error": "Field 'text' kosong"}), 400
 
-    try:
-        bot = get_bot()
-        reply = bot.reply(text)
-    except Exception as e:
-        log.exception("Error inference")
-        return jsonify({"error": "Gagal memproses input"}), 500
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Sama seperti /chat, tapi token dikirim bertahap (SSE):
+    - event "token" → {"text": "..."}
+    - event "done"  → {"reply": "...", "latency": ...}
+    - event "error" → {"error": "..."}
+    """
+    start = time.perf_counter()
+    text, options, model = chat_input(_json_body())
+    session_id, is_new = get_session_id()
+    endpoint = _endpoint_label()
+
+    with inference_errors():
+        bot = acquire_bot(model)
+
+    # Admission (antrian / deadline) diputuskan sebelum response dimulai
+    with inference_errors(bot):
+        stream = bot.stream_reply(text, session_id=session_id, timeout=REQUEST_TIMEOUT, **options)
+
+    def events():
+        status = "200"
+        try:
+            # closing → client putus = stream ditutup = generate dibatalkan
+            with closing(stream):
+                for kind, value in stream:
+                    yield stream_event(kind, value, start)
+        except Exception as e:
+            status, event = stream_error(e)
+            yield event
+        finally:
+            record_request("POST", endpoint, time.perf_counter() - start, status)
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+    # Dipanggil juga jika stream tidak pernah dimulai
+    response.call_on_close(bot.release)
+    return with_session(response, session_id, is_new)
+
+
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """
+    Batch inference stateless (tanpa history sesi).
+
+    Body JSON  → {"prompts": ["...", {"id": ..., "text": "..."}], opsi...}
+    Body JSONL → satu prompt per baris, opsi lewat query string
+                 (?deterministic=1&seed=..&max_new_tokens=..&model=..)
+
+    Response JSONL (application/x-ndjson), satu baris per prompt sesuai
+    urutan selesai: {"index", "id"?, "reply", "tokens"} / {"index", "error"}
+    """
+    start = time.perf_counter()
+    items, options, model = batch_input(
+        request.mimetype,
+        request.get_data(as_text=True),
+        request.args,
+    )
+    endpoint = _endpoint_label()
+
+    with inference_errors():
+        bot = acquire_bot(model)
 
-    latency = round(time.time() - start, 3)
+    def lines():
+        status = "200"
+        results = run_batch(bot, items, **options)
+        try:
+            # closing → client putus = sisa batch dibatalkan
+            with closing(results):
+                for record in results:
+                    yield batch_line(record)
+        except Exception as e:
+            status, line = batch_error(e)
+            yield line
+        finally:
+            record_request("POST", endpoint, time.perf_counter() - start, status)
 
-    return jsonify({
-        "reply": reply,
-        "latency": latency,
-    })
+    response = Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(bot.release)
+    return response
 
 
 @app.route("/reset", methods=["POST"])
 def reset():
-    bot = get_bot()
-    bot.reset()
-    return jsonify({"status": "memory reset"})
+    session_id, is_new = get_session_id()
+    return with_session(jsonify(reset_payload(session_id)), session_id, is_new)
 
 
 @app.route("/info", methods=["GET"])
 def info():
-    bot = get_bot()
-    model = bot.model
+    return jsonify(info_payload())
 
-    return jsonify({
-        "model_class": model.__class__.__name__,
-        "device": str(next(model.parameters()).device),
-    })
 
+@app.route("/models", methods=["GET"])
+def models():
+    """
+    Daftar model yang bisa dipilih (field "model") & status registry
+    """
+    return jsonify(models_status())
 
-@app.route("/reload", methods=["POST"])
-def reload_model():
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
     """
-    Paksa cek & reload model terbaru dari ai_factory
+    Metrics format teks Prometheus
     """
-    global _bot
+    return Response(
+        metrics.render(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8",
+    )
 
-    updated = download_latest_model()
-    if updated:
-        load_model(force_reload=True)
-        _bot = None  # force recreate chatbot
-        return jsonify({"status": "model updated & reloaded"})
 
-    return jsonify({"status": "model already up-to-date"})
+@app.route("/reload", methods=["POST"])
+def reload_model():
+    """
+    Cek & reload model terbaru dari ai_factory di background.
+    Model lama tetap melayani request sampai model baru siap (hot swap).
+    """
+    payload, status = reload_response()
+    return jsonify(payload), status
 
 
 @app.route("/", methods=["GET"])
 def index():
-    return jsonify({
-        "message": "AI Runtime Server",
-        "endpoints": [
-            "/health",
-            "/chat",
-            "/reset",
-            "/info",
-            "/reload",
-        ],
-    })
\ No newline at end of file
+    return jsonify(index_payload())
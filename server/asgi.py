@@ -0,0 +1,493 @@
+"""
+server/asgi.py
+App ASGI ai_runtime (mode server async)
+
+Catatan:
+- HTTP ditangani di event loop; generate tetap di thread InferenceEngine
+  → request yang menunggu / streaming tidak memakai thread maupun worker,
+  satu proses sanggup menahan ribuan koneksi idle / streaming
+- Route & format response sama dengan server/app.py (Flask): logika
+  route di server/common.py, di sini hanya transport ASGI; state runtime
+  (model, reload, readiness) dipakai bersama
+- ASGI murni tanpa framework; dijalankan uvicorn (gunicorn UvicornWorker
+  lewat main.py, atau langsung `uvicorn server.asgi:app`)
+- Client putus → stream & generate dibatalkan
+- Lifespan startup → load + warmup model di background (/ready)
+- Load varian model (field "model") di thread pool; request lain untuk
+  model yang sama menunggu load yang sama tanpa memblok event loop
+"""
+
+import asyncio
+import json
+import os
+import time
+from http.cookies import CookieError, SimpleCookie
+from typing import AsyncIterator, Iterator
+from urllib.parse import parse_qsl
+
+from core import metrics
+from core.batch import run_batch
+from core.logger import get_logger, set_request_id
+from server.common import (
+    API_ERRORS,
+    REQUEST_ID_HEADER,
+    REQUEST_TIMEOUT,
+    SESSION_COOKIE,
+    SESSION_HEADER,
+    HTTPError,
+    batch_error,
+    batch_input,
+    batch_line,
+    chat_input,
+    chat_payload,
+    error_response,
+    health_payload,
+    index_payload,
+    inference_errors,
+    info_payload,
+    json_body,
+    pick_request_id,
+    pick_session_id,
+    record_request,
+    ready_response,
+    reload_response,
+    reset_payload,
+    stream_error,
+    stream_event,
+)
+from server import watchdog
+from server.runtime import acquire_bot, is_loaded, models_status, start_startup
+
+log = get_logger("AI_SERVER_ASGI")
+
+# ===============================
+# KONFIG
+# ===============================
+# Batas ukuran body request (bytes)
+ASGI_MAX_BODY = int(os.environ.get("ASGI_MAX_BODY", str(8 * 1024 * 1024)))
+# Load + warmup saat lifespan startup (sama dengan gunicorn post_fork)
+EAGER_LOAD = os.environ.get("AI_RUNTIME_EAGER_LOAD", "1") == "1"
+
+
+class ClientDisconnected(RuntimeError):
+    pass
+
+
+# ===============================
+# REQUEST / RESPONSE
+# ===============================
+class Request:
+    def __init__(self, scope: dict, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in scope.get("headers", [])
+        }
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.body = body
+
+    @property
+    def mimetype(self) -> str:
+        return self.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> dict | None:
+        """
+        Body JSON (objek), atau None jika bukan JSON valid
+        """
+        return json_body(self.mimetype, self.body)
+
+    def cookie(self, name: str) -> str | None:
+        cookies = SimpleCookie()
+        try:
+            cookies.load(self.headers.get("cookie", ""))
+        except CookieError:
+            return None
+        morsel = cookies.get(name)
+        return morsel.value if morsel else None
+
+    def session_id(self) -> tuple[str, bool]:
+        return pick_session_id(
+            self.headers.get(SESSION_HEADER.lower()),
+            self.cookie(SESSION_COOKIE),
+        )
+
+
+class Response:
+    streaming = False
+
+    def __init__(
+        self,
+        body: bytes = b"",
+        status: int = 200,
+        content_type: str = "application/json",
+        headers: dict | None = None,
+    ):
+        self.body = body
+        self.status = status
+        self.headers = {"content-type": content_type, **(headers or {})}
+        self.cookies: list[str] = []
+
+    def with_session(self, session_id: str, is_new: bool) -> "Response":
+        self.headers[SESSION_HEADER] = session_id
+        if is_new:
+            self.cookies.append(f"{SESSION_COOKIE}={session_id}; HttpOnly; Path=/; SameSite=Lax")
+        return self
+
+    def _raw_headers(self) -> list:
+        headers = [
+            (key.lower().encode("latin-1"), str(value).encode("latin-1"))
+            for key, value in self.headers.items()
+        ]
+        headers.extend((b"set-cookie", c.encode("latin-1")) for c in self.cookies)
+        if not self.streaming:
+            headers.append((b"content-length", str(len(self.body)).encode("latin-1")))
+        return headers
+
+    async def send(self, send, receive):
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": self._raw_headers(),
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class StreamingResponse(Response):
+    """
+    Body dari async iterator (str). Client putus → iterator dibatalkan
+    (CancelledError di dalamnya) lalu ditutup. on_close dipanggil setelah
+    response selesai, juga jika iterator tidak pernah dimulai.
+    """
+
+    streaming = True
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[str],
+        content_type: str,
+        headers: dict | None = None,
+        on_close=None,
+    ):
+        super().__init__(b"", 200, content_type, headers)
+        self.chunks = chunks
+        self.on_close = on_close
+
+    async def _stream(self, send):
+        async for chunk in self.chunks:
+            await send({
+                "type": "http.response.body",
+                "body": chunk.encode("utf-8"),
+                "more_body": True,
+            })
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def send(self, send, receive):
+        try:
+            await self._send(send, receive)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    async def _send(self, send, receive):
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": self._raw_headers(),
+        })
+
+        stream = asyncio.ensure_future(self._stream(send))
+        watcher = asyncio.ensure_future(self._wait_disconnect(receive))
+
+        try:
+            await asyncio.wait({stream, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (stream, watcher):
+                task.cancel()
+            await asyncio.gather(stream, watcher, return_exceptions=True)
+            await self.chunks.aclose()
+
+
+def json_response(payload, status: int = 200, headers: dict | None = None) -> Response:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return Response(body, status, "application/json", headers)
+
+
+# ===============================
+# UTIL
+# ===============================
+async def _acquire_bot(model: str | None = None):
+    # Load pertama (blocking, bisa lama) dijalankan di thread pool;
+    # bot dipegang sampai release()
+    if is_loaded(model):
+        return acquire_bot(model)
+    return await asyncio.get_running_loop().run_in_executor(None, acquire_bot, model)
+
+
+async def _iterate_in_thread(iterator: Iterator) -> AsyncIterator:
+    """
+    Iterasi generator blocking di thread pool tanpa memblok event loop.
+    Jika dibatalkan, generator ditutup setelah langkah yang berjalan selesai.
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+    step = None
+
+    try:
+        while True:
+            step = loop.run_in_executor(None, next, iterator, done)
+            item = await step
+            if item is done:
+                break
+            yield item
+    finally:
+        if step is not None and not step.done():
+            step.add_done_callback(lambda _: iterator.close())
+        else:
+            iterator.close()
+
+
+# ===============================
+# ROUTES
+# ===============================
+async def health(request: Request) -> Response:
+    return json_response(health_payload())
+
+
+async def ready(request: Request) -> Response:
+    return json_response(*ready_response())
+
+
+async def chat(request: Request) -> Response:
+    start = time.perf_counter()
+    text, options, model = chat_input(request.json())
+    session_id, is_new = request.session_id()
+
+    with inference_errors():
+        bot = await _acquire_bot(model)
+        try:
+            reply = await bot.areply(text, session_id=session_id, timeout=REQUEST_TIMEOUT, **options)
+        finally:
+            bot.release()
+
+    return json_response(chat_payload(reply, start)).with_session(session_id, is_new)
+
+
+async def chat_stream(request: Request) -> Response:
+    """
+    Sama seperti /chat, tapi token dikirim bertahap (SSE)
+    """
+    start = time.perf_counter()
+    text, options, model = chat_input(request.json())
+    session_id, is_new = request.session_id()
+
+    with inference_errors():
+        bot = await _acquire_bot(model)
+
+    # Admission (antrian / deadline) diputuskan sebelum response dimulai
+    with inference_errors(bot):
+        stream = bot.astream_reply(text, session_id=session_id, timeout=REQUEST_TIMEOUT, **options)
+
+    async def events():
+        status = "200"
+        try:
+            async for kind, value in stream:
+                yield stream_event(kind, value, start)
+        except asyncio.CancelledError:
+            status = "499"
+            raise
+        except Exception as e:
+            status, event = stream_error(e)
+            yield event
+        finally:
+            await stream.aclose()
+            _record(request.method, request.path, start, status)
+
+    return StreamingResponse(
+        events(),
+        "text/event-stream",
+        {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        on_close=bot.release,
+    ).with_session(session_id, is_new)
+
+
+async def chat_batch(request: Request) -> Response:
+    """
+    Batch inference stateless, hasil JSONL (lihat server/app.py)
+    """
+    start = time.perf_counter()
+    items, options, model = batch_input(request.mimetype, request.text(), request.args)
+
+    with inference_errors():
+        bot = await _acquire_bot(model)
+
+    async def lines():
+        status = "200"
+        results = _iterate_in_thread(run_batch(bot, items, **options))
+        try:
+            async for record in results:
+                yield batch_line(record)
+        except asyncio.CancelledError:
+            status = "499"
+            raise
+        except Exception as e:
+            status, line = batch_error(e)
+            yield line
+        finally:
+            await results.aclose()
+            _record(request.method, request.path, start, status)
+
+    return StreamingResponse(
+        lines(),
+        "application/x-ndjson",
+        {"X-Accel-Buffering": "no"},
+        on_close=bot.release,
+    )
+
+
+async def reset(request: Request) -> Response:
+    session_id, is_new = request.session_id()
+    return json_response(reset_payload(session_id)).with_session(session_id, is_new)
+
+
+async def info(request: Request) -> Response:
+    return json_response(info_payload())
+
+
+async def models(request: Request) -> Response:
+    return json_response(models_status())
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(
+        metrics.render().encode("utf-8"),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+async def reload_model(request: Request) -> Response:
+    return json_response(*reload_response())
+
+
+async def index(request: Request) -> Response:
+    return json_response(index_payload())
+
+
+ROUTES = {
+    "/health": ("GET", health),
+    "/ready": ("GET", ready),
+    "/chat": ("POST", chat),
+    "/chat/stream": ("POST", chat_stream),
+    "/chat/batch": ("POST", chat_batch),
+    "/reset": ("POST", reset),
+    "/info": ("GET", info),
+    "/models": ("GET", models),
+    "/metrics": ("GET", metrics_endpoint),
+    "/reload": ("POST", reload_model),
+    "/": ("GET", index),
+}
+
+
+# ===============================
+# ASGI
+# ===============================
+def _record(method: str, endpoint: str, start: float, status: str):
+    record_request(method, endpoint, time.perf_counter() - start, status)
+
+
+def _header(scope: dict, name: bytes) -> str | None:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > ASGI_MAX_BODY:
+            raise HTTPError(413, "Body request terlalu besar")
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _handle(scope: dict, receive) -> tuple[Response | None, str]:
+    """
+    Jalankan route. Response None → client putus sebelum body terbaca.
+    """
+    route = ROUTES.get(scope["path"])
+    if route is None:
+        return json_response({"error": "Endpoint tidak ditemukan"}, 404), "unknown"
+
+    method, handler = route
+    endpoint = scope["path"]
+    if scope["method"] != method:
+        return json_response({"error": "Method tidak diizinkan"}, 405), endpoint
+
+    try:
+        request = Request(scope, await _read_body(receive))
+        return await handler(request), endpoint
+    except ClientDisconnected:
+        return None, endpoint
+    except Exception as e:
+        if not isinstance(e, API_ERRORS):
+            log.exception(f"Error tak terduga di {endpoint}")
+        payload, status, headers = error_response(e)
+        return json_response(payload, status, headers), endpoint
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            watchdog.start()
+            if EAGER_LOAD:
+                start_startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    start = time.perf_counter()
+    method = scope["method"]
+
+    # Context per request (task) → request id ikut di semua log-nya
+    request_id = pick_request_id(_header(scope, b"x-request-id"))
+    set_request_id(request_id)
+
+    response, endpoint = await _handle(scope, receive)
+
+    if response is None:
+        _record(method, endpoint, start, "499")
+        return
+
+    response.headers[REQUEST_ID_HEADER] = request_id
+
+    # Response streaming dicatat saat stream selesai
+    if not response.streaming:
+        _record(method, endpoint, start, str(response.status))
+
+    await response.send(send, receive)
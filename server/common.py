@@ -0,0 +1,432 @@
+"""
+server/common.py
+Helper HTTP bersama untuk app Flask (WSGI) & app ASGI
+
+Catatan:
+- Tanpa dependency framework → dipakai kedua mode server
+- Logika route (validasi → payload → pemetaan error ke status HTTP) ada
+  di sini; app.py & asgi.py hanya transport (sync / async, streaming,
+  client putus) → perbaikan cukup di satu tempat
+- Validasi input & format response sama persis di kedua mode
+- Access log per request (sampled) & metrics request dicatat di satu tempat
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Mapping
+
+from core import metrics
+from core.batch import check_max_new_tokens, parse_items, read_jsonl
+from core.engine import DeadlineExceededError, OverloadedError, QueueFullError
+from core.logger import SAMPLED, get_logger
+from core.model_loader import get_load_info, get_precision_info
+from core.model_registry import UnknownModelError
+from server import runtime, watchdog
+
+log = get_logger("AI_SERVER")
+access_log = get_logger("ACCESS")
+
+# ===============================
+# KONFIG
+# ===============================
+# Batas waktu satu request inference (detik); di bawah timeout gunicorn
+REQUEST_TIMEOUT = float(os.environ.get("AI_REQUEST_TIMEOUT", "60"))
+
+# Default mode deterministik jika request tidak menyebut "deterministic"
+DETERMINISTIC_DEFAULT = os.environ.get("AI_DETERMINISTIC", "0") == "1"
+
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "ai_session"
+REQUEST_ID_HEADER = "X-Request-Id"
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_\-]{1,128}$")
+_MODEL_NAME_RE = re.compile(r"^[A-Za-z0-9_.\-]{1,64}$")
+
+JSONL_MIMETYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+ENDPOINTS = [
+    "/health",
+    "/ready",
+    "/chat",
+    "/chat/stream",
+    "/chat/batch",
+    "/reset",
+    "/info",
+    "/models",
+    "/metrics",
+    "/reload",
+]
+
+
+class HTTPError(RuntimeError):
+    """
+    Error request yang langsung dipetakan ke status HTTP
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# Error yang dijawab dengan status khusus (bukan 500 generik)
+API_ERRORS = (HTTPError, UnknownModelError, OverloadedError, DeadlineExceededError)
+
+
+# ===============================
+# SESSION
+# ===============================
+def pick_session_id(*candidates: str | None) -> tuple[str, bool]:
+    """
+    Session id valid pertama dari kandidat (header, cookie).
+
+    Return (session_id, is_new) → is_new=True jika id baru dibuat
+    dan perlu dikirim balik sebagai cookie.
+    """
+    for value in candidates:
+        if value and _SESSION_ID_RE.match(value):
+            return value, False
+
+    return uuid.uuid4().hex, True
+
+
+def pick_request_id(value: str | None) -> str:
+    """
+    Request id dari header X-Request-Id (dari proxy), atau id baru
+    """
+    if value and _SESSION_ID_RE.match(value):
+        return value
+    return uuid.uuid4().hex
+
+
+# ===============================
+# REQUEST
+# ===============================
+def generation_options(data: dict) -> dict:
+    """
+    Opsi generate dari body request:
+    - "deterministic": true → greedy (jawaban sama untuk prompt sama)
+    - "seed": int           → sampling dengan seed tetap (juga deterministik)
+    - "speculative": bool   → pakai / matikan model draft (default server)
+
+    ValueError jika tipe field salah.
+    """
+    deterministic = data.get("deterministic", DETERMINISTIC_DEFAULT)
+    seed = data.get("seed")
+    speculative = data.get("speculative")
+
+    if not isinstance(deterministic, bool):
+        raise ValueError("Field 'deterministic' harus boolean")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError("Field 'seed' harus bilangan bulat >= 0")
+    if speculative is not None and not isinstance(speculative, bool):
+        raise ValueError("Field 'speculative' harus boolean")
+
+    options = {}
+    if seed is not None:
+        options["seed"] = seed
+    elif deterministic:
+        options["temperature"] = 0.0
+    if speculative is not None:
+        options["speculative"] = speculative
+    return options
+
+
+def requested_model(data: Mapping) -> str | None:
+    """
+    Nama model dari field "model" (None → model default).
+    ValueError jika bukan nama model yang valid.
+    """
+    name = data.get("model")
+    if name is None:
+        return None
+    if not isinstance(name, str) or not _MODEL_NAME_RE.match(name):
+        raise ValueError("Field 'model' harus nama model")
+    return name
+
+
+def batch_request(
+    mimetype: str,
+    body: str,
+    args: Mapping[str, str],
+) -> tuple[list, dict, str | None]:
+    """
+    Parse body /chat/batch → (items, opsi generate, nama model).
+
+    JSON  → {"prompts": [...], "model"?, opsi...}
+    JSONL → satu prompt per baris, model & opsi lewat query string
+
+    ValueError jika input tidak valid.
+    """
+    if mimetype in JSONL_MIMETYPES:
+        items = read_jsonl(body.splitlines())
+        data = {}
+        if "deterministic" in args:
+            data["deterministic"] = args["deterministic"].lower() in ("1", "true")
+        for name in ("seed", "max_new_tokens"):
+            if name in args:
+                data[name] = int(args[name])
+        if "model" in args:
+            data["model"] = args["model"]
+    elif mimetype == "application/json":
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise ValueError("Body bukan JSON valid")
+        if not isinstance(data, dict) or not isinstance(data.get("prompts"), list):
+            raise ValueError("Field 'prompts' harus list")
+        items = parse_items(data["prompts"])
+    else:
+        raise ValueError("Request harus JSON atau JSONL")
+
+    if not items:
+        raise ValueError("Tidak ada prompt")
+
+    options = generation_options(data)
+    options["max_new_tokens"] = check_max_new_tokens(data.get("max_new_tokens", 80))
+    return items, options, requested_model(data)
+
+
+def json_body(mimetype: str, body: bytes) -> dict | None:
+    """
+    Body JSON (objek), {} jika JSON tapi bukan objek, None jika bukan
+    request JSON / JSON tidak valid
+    """
+    if mimetype != "application/json" and not (
+        mimetype.startswith("application/") and mimetype.endswith("+json")
+    ):
+        return None
+    try:
+        data = json.loads(body or b"null")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else {}
+
+
+def chat_input(data: dict | None) -> tuple[str, dict, str | None]:
+    """
+    Validasi body /chat & /chat/stream (hasil json_body).
+    Return (text, opsi generate, nama model); HTTPError 400 jika tidak valid.
+    """
+    if data is None:
+        raise HTTPError(400, "Request harus JSON")
+
+    text = data.get("text", "")
+    if not isinstance(text, str) or not text.strip():
+        raise HTTPError(400, "Field 'text' kosong")
+
+    try:
+        options = generation_options(data)
+        model = requested_model(data)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+    return text.strip(), options, model
+
+
+def batch_input(
+    mimetype: str,
+    body: str,
+    args: Mapping[str, str],
+) -> tuple[list, dict, str | None]:
+    """
+    batch_request() dengan HTTPError 400 untuk input tidak valid
+    """
+    try:
+        return batch_request(mimetype, body, args)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+
+@contextmanager
+def inference_errors(bot=None):
+    """
+    Error tak terduga saat acquire / generate → log + HTTPError 500.
+    Error API (model tidak dikenal, overload, deadline) diteruskan apa adanya.
+
+    bot → di-release jika gagal (checkout belum diserahkan ke response)
+    """
+    try:
+        yield
+    except BaseException as e:
+        if bot is not None:
+            bot.release()
+        if isinstance(e, API_ERRORS) or not isinstance(e, Exception):
+            raise
+        log.exception("Error inference")
+        raise HTTPError(500, "Gagal memproses input") from e
+
+
+# ===============================
+# ROUTE
+# ===============================
+def health_payload() -> dict:
+    return {
+        "status": "ok",
+        "service": "ai_runtime",
+        "model_loaded": runtime.is_loaded(),
+        "ready": runtime.is_ready(),
+    }
+
+
+def ready_response() -> tuple[dict, int]:
+    """
+    Readiness probe: 200 hanya setelah model di-load & warmup selesai
+    """
+    if runtime.is_ready():
+        return {"status": "ready"}, 200
+
+    # Tanpa gunicorn post_fork / lifespan (mis. dev server) → mulai di sini
+    runtime.start_startup()
+    return runtime.startup_status(), 503
+
+
+def chat_payload(reply: str, start: float) -> dict:
+    return {
+        "reply": reply,
+        "latency": round(time.perf_counter() - start, 3),
+    }
+
+
+def stream_event(kind: str, value: str, start: float) -> str:
+    """
+    Satu item stream_reply() → event SSE "token" / "done"
+    """
+    if kind == "token":
+        return sse("token", {"text": value})
+    return sse("done", chat_payload(value, start))
+
+
+def stream_error(e: Exception) -> tuple[str, str]:
+    """
+    Error di tengah stream (header sudah terkirim) → (status, event SSE "error")
+    """
+    if isinstance(e, DeadlineExceededError):
+        return "503", sse("error", {"error": "Waktu proses habis, coba lagi nanti"})
+    log.exception("Error inference (stream)")
+    return "500", sse("error", {"error": "Gagal memproses input"})
+
+
+def batch_line(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def batch_error(e: Exception) -> tuple[str, str]:
+    """
+    Error di tengah batch (header sudah terkirim) → (status, baris JSONL)
+    """
+    log.exception("Error inference (batch)")
+    return "500", batch_line({"error": "Gagal memproses batch"})
+
+
+def reset_payload(session_id: str) -> dict:
+    # History sesi terpisah per model → reset di semua model aktif &
+    # history yang di-park, tanpa memicu load model
+    runtime.reset_session(session_id)
+    return {"status": "memory reset"}
+
+
+def info_payload() -> dict:
+    # Tanpa memicu load / menghitung sebagai pemakaian (idle unload)
+    bot = runtime.current_bot()
+    model = bot.model if bot is not None else None
+
+    return {
+        "model_loaded": bot is not None,
+        "model_class": model.__class__.__name__ if model is not None else None,
+        "device": str(next(model.parameters()).device) if model is not None else None,
+        "precision": get_precision_info(),
+        "weights": get_load_info(),
+        "response_cache": bot.response_cache.stats() if bot is not None else None,
+        "reload": runtime.reload_status(),
+        "models": runtime.models_status(),
+        "memory": watchdog.memory_status(),
+    }
+
+
+def reload_response() -> tuple[dict, int]:
+    """
+    Cek & reload model terbaru di background (hot swap)
+    """
+    if not runtime.start_reload():
+        return {
+            "status": "reload sedang berjalan",
+            "reload": runtime.reload_status(),
+        }, 409
+
+    return {"status": "reload dimulai"}, 202
+
+
+def index_payload() -> dict:
+    return {
+        "message": "AI Runtime Server",
+        "endpoints": ENDPOINTS,
+    }
+
+
+# ===============================
+# RESPONSE
+# ===============================
+def error_response(e: Exception) -> tuple[dict, int, dict]:
+    """
+    Error route → (payload JSON, status, header tambahan)
+    """
+    if isinstance(e, HTTPError):
+        return {"error": str(e)}, e.status, {}
+    if isinstance(e, UnknownModelError):
+        return {"error": str(e), "models": runtime.model_names()}, 404, {}
+    if isinstance(e, QueueFullError):
+        return _retry("Server sibuk, antrian penuh", 429, e.retry_after)
+    if isinstance(e, OverloadedError):
+        return _retry("Server sibuk, coba lagi nanti", 503, e.retry_after)
+    if isinstance(e, DeadlineExceededError):
+        # Perkiraan tunggu dari engine yang memproses request (varian
+        # model bisa beda), tanpa memicu load model
+        return _retry("Waktu proses habis, coba lagi nanti", 503, e.retry_after)
+
+    # Error lain dicatat oleh transport (beserta endpoint-nya)
+    return {"error": "Internal server error"}, 500, {}
+
+
+def _retry(message: str, status: int, retry_after: float) -> tuple[dict, int, dict]:
+    return (
+        {"error": message, "retry_after": round(retry_after, 1)},
+        status,
+        {"Retry-After": retry_after_header(retry_after)},
+    )
+
+
+def record_request(method: str, endpoint: str, elapsed: float, status: str):
+    """
+    Metrics request + access log. Access log INFO ikut LOG_SAMPLE_RATE;
+    status 5xx dicatat WARNING (tidak pernah di-sampling).
+    """
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    metrics.REQUESTS_TOTAL.inc(endpoint=endpoint, status=status)
+
+    level = logging.WARNING if status.startswith("5") else logging.INFO
+    if access_log.isEnabledFor(level):
+        access_log.log(
+            level,
+            f"{method} {endpoint} {status} {elapsed * 1000:.1f}ms",
+            extra={
+                **SAMPLED,
+                "method": method,
+                "endpoint": endpoint,
+                "status": int(status),
+                "latency_ms": round(elapsed * 1000, 1),
+            },
+        )
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def sse(event: str, payload: dict) -> str:
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"event: {event}\ndata: {data}\n\n"
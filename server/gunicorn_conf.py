@@ -0,0 +1,90 @@
+"""
+server/gunicorn_conf.py
+Konfigurasi Gunicorn ai_runtime (fork-after-load)
+
+Tugas:
+- Load model SEKALI di master (preload), worker di-fork setelahnya
+  → bobot (mmap safetensors) dipakai bersama read-only via copy-on-write
+- gc.freeze() sebelum fork → GC worker tidak menyentuh (mengotori)
+  halaman objek milik master
+- Bagi thread intra-op torch per worker agar core tidak oversubscribe
+- Warmup model & cek kualitas presisi (forward pass) di tiap worker
+  (background) setelah fork → /ready; master tidak menjalankan forward
+- Watchdog memory (idle unload / memory pressure) per worker
+"""
+
+import gc
+import os
+
+# ===============================
+# KONFIG
+# ===============================
+# Thread intra-op per worker (0 = bagi rata jumlah core ke semua worker)
+TORCH_THREADS_PER_WORKER = int(os.environ.get("TORCH_THREADS_PER_WORKER", "0"))
+# Load (jika belum) + warmup model saat worker start, bukan saat request pertama
+EAGER_LOAD = os.environ.get("AI_RUNTIME_EAGER_LOAD", "1") == "1"
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers: int) -> int:
+    if TORCH_THREADS_PER_WORKER > 0:
+        return TORCH_THREADS_PER_WORKER
+    return max(1, _available_cores() // max(1, workers))
+
+
+# ===============================
+# HOOKS
+# ===============================
+def when_ready(server):
+    """
+    Dipanggil di master setelah app di-import, sebelum worker di-spawn
+    """
+    if not server.cfg.preload_app:
+        return
+
+    from server.runtime import preload
+
+    preload()
+
+    # Objek yang sudah ada dipindah ke generasi permanen
+    gc.freeze()
+    server.log.info("Model dimuat di master, gc.freeze() aktif sebelum fork")
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+
+    n_threads = threads_per_worker(server.cfg.workers)
+
+    torch.set_num_threads(n_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Hanya bisa di-set sebelum ada kerja paralel inter-op
+        pass
+
+    server.log.info(
+        f"Worker {worker.pid}: {n_threads} thread intra-op "
+        f"({server.cfg.workers} worker, {_available_cores()} core)"
+    )
+
+    from server import watchdog
+
+    watchdog.start()
+
+    if EAGER_LOAD:
+        # Warmup (forward pass pertama) sengaja di worker, bukan master:
+        # thread pool torch tidak aman dipakai sebelum fork
+        from server.runtime import start_startup
+
+        start_startup()
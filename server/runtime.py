@@ -0,0 +1,516 @@
+"""
+server/runtime.py
+State runtime server ai_runtime (model, chatbot, reload)
+
+Catatan:
+- Startup (load + warmup) bisa dijalankan eager di background;
+  /ready hijau setelah selesai
+- Model di-load lazy & reloadable
+- Reload berjalan di background: download → load → warmup → swap atomic
+- Request yang sedang berjalan selesai di model lama: request memegang
+  bot lewat acquire_bot() / release(), engine lama baru dihentikan
+  setelah pemegang terakhir selesai
+- History sesi ikut pindah ke model baru jika tokenizer tidak berubah
+- Varian model lain (per request, field "model") dikelola registry
+  (core/model_registry.py): load on demand + eviksi LRU
+- Model bisa di-unload saat idle / memory pressure (server/watchdog.py);
+  request berikutnya me-load ulang otomatis, history sesi dipertahankan
+"""
+
+import os
+import threading
+import time
+
+from core.logger import get_logger
+from core.model_loader import (
+    get_draft_model,
+    get_model_key,
+    load_model,
+    load_model_from,
+    set_active_model,
+    unload_model,
+    verify_precision,
+)
+from core.model_downloader import activate_version, fetch_latest_model
+from core.chatbot import ChatBot
+from core.metrics import MODEL_LOAD_SECONDS, Gauge
+from core.model_registry import DEFAULT_MODEL, ModelRegistry, is_busy, model_nbytes
+from core.session_store import SessionStore
+
+log = get_logger("AI_RUNTIME")
+
+# ===============================
+# RUNTIME STATE (GLOBAL TERKONTROL)
+# ===============================
+_lock = threading.Lock()
+_bot: ChatBot | None = None
+_bot_nbytes: tuple[ChatBot | None, int] = (None, 0)
+
+# Request terakhir yang memakai model default (monotonic)
+_last_used = time.monotonic()
+# History sesi model default yang di-unload, dipasang lagi saat load ulang
+# (tokenizer-nya disimpan untuk dicek saat reload)
+_parked_sessions: SessionStore | None = None
+_parked_tokenizer = None
+
+_reload_thread: threading.Thread | None = None
+_reload_state: dict = {"status": "idle"}
+
+WARMUP_SESSION = "__warmup__"
+
+_startup_thread: threading.Thread | None = None
+_startup_state: dict = {"status": "pending"}
+_ready = threading.Event()
+
+# ===============================
+# KONFIG WARMUP
+# ===============================
+# Panjang prompt (perkiraan token) yang di-warmup, dipisah koma
+WARMUP_PROMPT_LENGTHS = [
+    int(n) for n in os.environ.get("AI_RUNTIME_WARMUP_LENGTHS", "8,64,256").split(",")
+    if n.strip()
+]
+WARMUP_NEW_TOKENS = int(os.environ.get("AI_RUNTIME_WARMUP_NEW_TOKENS", "8"))
+
+
+# ===============================
+# METRICS (dibaca saat scrape)
+# ===============================
+def _bot_stat(read):
+    def function():
+        bot = _bot
+        return None if bot is None else read(bot)
+    return function
+
+
+Gauge("ai_engine_active", "Sequence aktif di batch inference").set_function(
+    _bot_stat(lambda bot: bot.engine.active)
+)
+Gauge("ai_engine_queued", "Request menunggu di antrian inference").set_function(
+    _bot_stat(lambda bot: bot.engine.queued)
+)
+Gauge("ai_sessions", "Jumlah sesi history aktif").set_function(
+    _bot_stat(lambda bot: bot.sessions.stats()["sessions"])
+)
+Gauge("ai_kv_cache_bytes", "Memory KV cache sesi (bytes)").set_function(
+    _bot_stat(lambda bot: bot.kv_cache.stats()["bytes"])
+)
+Gauge("ai_response_cache_entries", "Jumlah jawaban di response cache").set_function(
+    _bot_stat(lambda bot: bot.response_cache.stats()["entries"])
+)
+
+
+# ===============================
+# MULTI MODEL
+# ===============================
+def _default_nbytes() -> int:
+    """
+    Memory bobot model default (dihitung sekali per ChatBot)
+    """
+    global _bot_nbytes
+
+    bot = _bot
+    if bot is None:
+        _bot_nbytes = (None, 0)
+        return 0
+    if _bot_nbytes[0] is not bot:
+        nbytes = model_nbytes(bot.model)
+        if bot.engine.draft_model is not None:
+            nbytes += model_nbytes(bot.engine.draft_model)
+        _bot_nbytes = (bot, nbytes)
+    return _bot_nbytes[1]
+
+
+# Model default ikut dihitung dalam budget memory registry
+_registry = ModelRegistry(reserved=_default_nbytes)
+
+Gauge("ai_models_loaded", "Varian model aktif di registry (di luar default)").set_function(
+    _registry.loaded_count
+)
+Gauge("ai_model_memory_bytes", "Memory bobot semua model aktif (bytes)").set_function(
+    _registry.used_bytes
+)
+
+
+def model_names() -> list[str]:
+    return [DEFAULT_MODEL] + _registry.names()
+
+
+def models_status() -> dict:
+    return {
+        "default": DEFAULT_MODEL,
+        "names": model_names(),
+        "registry": _registry.stats(),
+    }
+
+
+def loaded_bots() -> list[ChatBot]:
+    """
+    Semua ChatBot yang sedang aktif (default + varian)
+    """
+    bots = [_registry.loaded(name) for name in _registry.names()]
+    return [bot for bot in [_bot] + bots if bot is not None]
+
+
+def get_bot(model: str | None = None) -> ChatBot:
+    """
+    Lazy load chatbot (aman untuk Gunicorn).
+
+    model → nama varian di registry (None / "default" = model/current);
+    UnknownModelError jika nama tidak terdaftar.
+    """
+    global _bot, _parked_sessions, _parked_tokenizer
+
+    if model is not None and model != DEFAULT_MODEL:
+        return _registry.get(model)
+
+    bot = _bot
+    if bot is not None:
+        return bot
+
+    with _lock:
+        if _bot is None:
+            log.info("Memuat model & chatbot runtime")
+            tokenizer, model, device = load_model()
+
+            # model/current bisa sudah diganti (worker lain) sejak di-unload
+            sessions = _parked_sessions
+            if sessions is not None and not _same_tokenizer(tokenizer, _parked_tokenizer):
+                log.info("Tokenizer model berbeda, history sesi yang di-park dibuang")
+                sessions = None
+
+            _bot = ChatBot(
+                tokenizer,
+                model,
+                device=device,
+                sessions=sessions,
+                model_key=get_model_key(),
+                draft_model=get_draft_model(),
+            )
+            _parked_sessions = _parked_tokenizer = None
+        return _bot
+
+
+def current_bot() -> ChatBot | None:
+    """
+    ChatBot model default jika sedang di-load (tanpa memicu load)
+    """
+    return _bot
+
+
+def parked_sessions() -> SessionStore | None:
+    """
+    History sesi model default yang di-unload (None jika model di-load)
+    """
+    return _parked_sessions
+
+
+def reset_session(session_id: str):
+    """
+    Reset history satu sesi di semua model aktif & history yang di-park,
+    tanpa memicu load model
+    """
+    for bot in loaded_bots():
+        bot.reset(session_id)
+
+    sessions = _parked_sessions
+    if sessions is not None:
+        sessions.reset(session_id)
+
+
+def acquire_bot(model: str | None = None) -> ChatBot:
+    """
+    Seperti get_bot, tapi bot ditandai sedang dipakai (bot.acquire) →
+    tidak ditutup oleh hot swap / unload / eviksi sampai bot.release().
+    Dipakai request yang men-submit generate ke engine.
+    """
+    global _last_used
+
+    if model is not None and model != DEFAULT_MODEL:
+        return _registry.get(model, checkout=True)
+
+    # Hanya request inference yang dihitung sebagai pemakaian (idle unload)
+    _last_used = time.monotonic()
+
+    while True:
+        bot = get_bot(model)
+        if bot.acquire():
+            return bot
+        # Bot baru saja ditutup (unload / swap) → tunggu state selesai
+        # diganti di bawah lock, lalu ambil bot yang baru
+        with _lock:
+            pass
+
+
+def preload():
+    """
+    Load model & chatbot di master gunicorn (sebelum fork).
+    Engine & KV instruksi dibuat lazy di masing-masing worker; cek
+    kualitas presisi (forward pass) juga ditunda ke worker
+    (_startup_worker → verify_precision).
+    """
+    load_model(check_precision=False)
+    get_bot()
+
+
+def set_bot(bot: ChatBot):
+    """
+    Pasang chatbot yang sudah dibuat di luar (benchmark / embedding)
+    dan tandai runtime siap
+    """
+    _swap_bot(bot)
+    _ready.set()
+
+
+def is_loaded(model: str | None = None) -> bool:
+    if model is not None and model != DEFAULT_MODEL:
+        return _registry.loaded(model) is not None
+    return _bot is not None
+
+
+def idle_seconds() -> float:
+    """
+    Detik sejak request terakhir ke model default
+    """
+    return time.monotonic() - _last_used
+
+
+def unload_default(max_idle: float = 0.0) -> bool:
+    """
+    Unload model default jika idle >= max_idle detik, tidak ada request
+    yang memegang bot (acquire_bot) / berjalan, dan tidak sedang
+    startup / reload. Request berikutnya
+    me-load ulang (bobot mmap → cepat jika masih di page cache).
+    """
+    global _bot, _bot_nbytes, _parked_sessions, _parked_tokenizer
+
+    with _lock:
+        bot = _bot
+        if bot is None or idle_seconds() < max_idle or is_busy(bot):
+            return False
+        if _startup_state.get("status") in ("loading", "warmup"):
+            return False
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+
+        # acquire_bot bisa memegang bot lewat jalur tanpa lock di antara
+        # cek di atas & sini → tutup hanya jika memang tidak dipegang
+        if not bot.close_if_unused():
+            return False
+
+        _bot = None
+        _bot_nbytes = (None, 0)
+        _parked_sessions = bot.sessions
+        _parked_tokenizer = bot.tokenizer
+        del bot
+        unload_model()
+
+    return True
+
+
+def unload_idle_variants(max_idle: float) -> list[str]:
+    return _registry.evict_idle(max_idle)
+
+
+def evict_variant(reason: str) -> str | None:
+    return _registry.evict_lru(reason)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def startup_status() -> dict:
+    return dict(_startup_state)
+
+
+def warmup(bot: ChatBot):
+    """
+    Generate pendek untuk beberapa panjang prompt agar request pertama
+    tidak menanggung inisialisasi kernel / allocator
+    """
+    for length in WARMUP_PROMPT_LENGTHS or [1]:
+        start = time.perf_counter()
+        text = " ".join(["Halo"] * max(1, length))
+        bot.reply(text, session_id=WARMUP_SESSION, max_new_tokens=WARMUP_NEW_TOKENS)
+        bot.reset(WARMUP_SESSION)
+        log.info(f"Warmup prompt ~{length} token: {time.perf_counter() - start:.2f}s")
+
+
+def _check_precision():
+    """
+    Cek presisi yang ditunda saat preload; jika gagal, model default
+    diganti versi fp32 (history sesi tetap)
+    """
+    fallback = verify_precision()
+    if fallback is None:
+        return
+
+    tokenizer, model, info = fallback
+    old = get_bot()
+    _swap_bot(ChatBot(
+        tokenizer,
+        model,
+        device=str(model.device),
+        sessions=old.sessions,
+        model_key=info["model_key"],
+        draft_model=info["draft"],
+    ))
+    log.info("Model default diganti fp32 setelah cek presisi")
+
+
+def _startup_worker():
+    _startup_state.update(status="loading", started_at=time.time())
+
+    try:
+        get_bot()
+        _check_precision()
+        bot = acquire_bot()
+        _startup_state["loaded_at"] = time.time()
+
+        _startup_state["status"] = "warmup"
+        try:
+            warmup(bot)
+        finally:
+            bot.release()
+
+        _startup_state.update(status="ready", ready_at=time.time())
+        _ready.set()
+        log.info(
+            f"Runtime siap dalam {_startup_state['ready_at'] - _startup_state['started_at']:.1f}s"
+        )
+
+    except Exception as e:
+        log.exception("Startup runtime gagal")
+        _startup_state.update(status="failed", error=str(e))
+
+
+def start_startup():
+    """
+    Load model + warmup di background (idempotent, diulang jika gagal).
+    Dipanggil dari gunicorn post_fork, atau lazy dari /ready.
+    """
+    global _startup_thread
+
+    with _lock:
+        if _startup_thread is not None and (
+            _startup_thread.is_alive() or _startup_state.get("status") != "failed"
+        ):
+            return
+
+        _startup_thread = threading.Thread(
+            target=_startup_worker,
+            name="runtime-startup",
+            daemon=True,
+        )
+        _startup_thread.start()
+
+
+# ===============================
+# HOT RELOAD
+# ===============================
+def _same_tokenizer(a, b) -> bool:
+    """
+    History sesi disimpan sebagai token id → hanya bisa dipakai ulang
+    jika vocab tokenizer sama persis
+    """
+    if a is None or b is None:
+        return False
+    return len(a) == len(b) and a.get_vocab() == b.get_vocab()
+
+
+def _current_sessions() -> tuple[SessionStore | None, object]:
+    """
+    (SessionStore, tokenizer) model default saat ini / yang di-park
+    """
+    bot = _bot
+    if bot is not None:
+        return bot.sessions, bot.tokenizer
+    return _parked_sessions, _parked_tokenizer
+
+
+def _swap_bot(bot: ChatBot):
+    global _bot, _bot_nbytes, _parked_sessions, _parked_tokenizer
+
+    with _lock:
+        old, _bot = _bot, bot
+        _bot_nbytes = (None, 0)
+        _parked_sessions = _parked_tokenizer = None
+
+    if old is not None:
+        # Ditutup setelah request yang masih memegang bot lama selesai;
+        # response cache model lama ikut dibuang
+        old.close()
+
+
+def _reload_worker():
+    _reload_state.update(status="running", started_at=time.time())
+
+    try:
+        version_dir = fetch_latest_model()
+        if version_dir is None:
+            _reload_state.update(status="up-to-date", finished_at=time.time())
+            return
+
+        tokenizer, model, info = load_model_from(version_dir)
+
+        # History sesi dipertahankan jika token id-nya tetap valid
+        sessions, old_tokenizer = _current_sessions()
+        if sessions is not None and not _same_tokenizer(tokenizer, old_tokenizer):
+            log.info("Tokenizer model baru berbeda, history sesi dimulai ulang")
+            sessions = None
+
+        bot = ChatBot(
+            tokenizer,
+            model,
+            device=str(model.device),
+            sessions=sessions,
+            model_key=info["model_key"],
+            draft_model=info["draft"],
+        )
+        warmup(bot)
+
+        activate_version(version_dir)
+        set_active_model(tokenizer, model, info)
+        _swap_bot(bot)
+
+        _reload_state.update(
+            status="updated",
+            version=version_dir.name,
+            finished_at=time.time(),
+        )
+        MODEL_LOAD_SECONDS.observe(
+            _reload_state["finished_at"] - _reload_state["started_at"],
+            kind="reload",
+        )
+        log.info(f"Hot swap selesai, model aktif: {version_dir.name}")
+
+    except Exception as e:
+        log.exception("Reload model gagal, model lama tetap dipakai")
+        _reload_state.update(status="failed", error=str(e), finished_at=time.time())
+
+
+def start_reload() -> bool:
+    """
+    Mulai reload di background. Return False jika reload sedang berjalan.
+    """
+    global _reload_thread
+
+    with _lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+
+        _reload_state.clear()
+        _reload_state["status"] = "running"
+        _reload_thread = threading.Thread(
+            target=_reload_worker,
+            name="model-reload",
+            daemon=True,
+        )
+        _reload_thread.start()
+
+    return True
+
+
+def reload_status() -> dict:
+    return dict(_reload_state)
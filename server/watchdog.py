@@ -0,0 +1,269 @@
+"""
+server/watchdog.py
+Watchdog memory runtime (idle unload & memory pressure)
+
+Fitur:
+- Pantau RSS proses (/proc/self/statm) & MemAvailable sistem (/proc/meminfo)
+- Idle: model / varian yang tidak dipakai MODEL_IDLE_UNLOAD detik di-unload;
+  request berikutnya me-load ulang otomatis (bobot safetensors via mmap,
+  biasanya masih di page cache → cepat)
+- Memory pressure: yang murah dibangun ulang dilepas lebih dulu,
+  model paling akhir:
+  1. KV cache sesi
+  2. response cache
+  3. separuh sesi yang paling lama tidak diakses
+  4. varian model (LRU)
+  5. model default (hanya jika tidak ada request berjalan)
+- Setelah tiap langkah: gc + malloc_trim → heap bebas dikembalikan ke OS
+- Keputusan di-log & dihitung di metrics (ai_watchdog_actions_total)
+
+Catatan:
+- Satu watchdog per proses worker, dimulai setelah fork
+  (gunicorn post_fork / lifespan ASGI)
+- Tanpa MODEL_IDLE_UNLOAD / WATCHDOG_MAX_RSS / WATCHDOG_MIN_AVAILABLE
+  watchdog tidak berjalan (RSS tetap terlihat di /metrics)
+"""
+
+import ctypes
+import os
+import threading
+import time
+
+from core.logger import get_logger
+from core.metrics import WATCHDOG_ACTIONS_TOTAL, Gauge
+from core.model_loader import free_memory
+from core.model_registry import DEFAULT_MODEL
+from server import runtime
+
+log = get_logger("WATCHDOG")
+
+# ===============================
+# KONFIG
+# ===============================
+WATCHDOG_INTERVAL = float(os.environ.get("WATCHDOG_INTERVAL", "10"))
+# Unload model setelah idle sekian detik (0 = nonaktif)
+MODEL_IDLE_UNLOAD = float(os.environ.get("MODEL_IDLE_UNLOAD", "0"))
+# Memory pressure jika RSS proses di atas batas ini (bytes, 0 = nonaktif)
+WATCHDOG_MAX_RSS = int(os.environ.get("WATCHDOG_MAX_RSS", "0"))
+# ... atau MemAvailable sistem di bawah batas ini (bytes, 0 = nonaktif)
+WATCHDOG_MIN_AVAILABLE = int(os.environ.get("WATCHDOG_MIN_AVAILABLE", "0"))
+
+# Porsi sesi yang dipertahankan per langkah eviksi sesi
+SESSION_KEEP = 0.5
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+try:
+    _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+except (OSError, AttributeError):
+    # Bukan glibc → heap bebas dikembalikan sesuai allocator
+    _malloc_trim = None
+
+_thread: threading.Thread | None = None
+_lock = threading.Lock()
+_state: dict = {"pressure": None, "last_action": None}
+
+
+# ===============================
+# MEMORY
+# ===============================
+def rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def available_bytes() -> int | None:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def release_memory():
+    free_memory()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+def pressure() -> str | None:
+    """
+    Alasan memory pressure, None jika aman
+    """
+    rss = rss_bytes()
+    if WATCHDOG_MAX_RSS and rss is not None and rss > WATCHDOG_MAX_RSS:
+        return f"RSS {rss / 1e6:.0f} MB > {WATCHDOG_MAX_RSS / 1e6:.0f} MB"
+
+    available = available_bytes()
+    if WATCHDOG_MIN_AVAILABLE and available is not None and available < WATCHDOG_MIN_AVAILABLE:
+        return f"MemAvailable {available / 1e6:.0f} MB < {WATCHDOG_MIN_AVAILABLE / 1e6:.0f} MB"
+
+    return None
+
+
+def memory_status() -> dict:
+    return {
+        "rss_bytes": rss_bytes(),
+        "available_bytes": available_bytes(),
+        "idle_seconds": round(runtime.idle_seconds(), 1),
+        "idle_unload": MODEL_IDLE_UNLOAD,
+        "max_rss": WATCHDOG_MAX_RSS,
+        "min_available": WATCHDOG_MIN_AVAILABLE,
+        **_state,
+    }
+
+
+Gauge("ai_process_rss_bytes", "Resident set size proses worker (bytes)").set_function(rss_bytes)
+
+
+# ===============================
+# LANGKAH PRESSURE
+# ===============================
+def _clear_kv() -> int:
+    released = 0
+    for bot in runtime.loaded_bots():
+        released += bot.kv_cache.stats()["entries"]
+        bot.kv_cache.clear()
+    return released
+
+
+def _clear_response_cache() -> int:
+    released = 0
+    for bot in runtime.loaded_bots():
+        released += bot.response_cache.stats()["entries"]
+        bot.response_cache.clear()
+    return released
+
+
+def _evict_sessions() -> int:
+    stores = [bot.sessions for bot in runtime.loaded_bots()]
+    # History model default yang di-unload tetap memakan memory
+    parked = runtime.parked_sessions()
+    if parked is not None:
+        stores.append(parked)
+    return sum(store.shrink(SESSION_KEEP) for store in stores)
+
+
+def _evict_variant() -> int:
+    return 1 if runtime.evict_variant("pressure") else 0
+
+
+def _unload_model() -> int:
+    return 1 if runtime.unload_default() else 0
+
+
+# Urutan: paling murah dibangun ulang → paling mahal
+PRESSURE_STEPS = [
+    ("kv_clear", _clear_kv),
+    ("response_cache_clear", _clear_response_cache),
+    ("session_evict", _evict_sessions),
+    ("variant_evict", _evict_variant),
+    ("model_unload", _unload_model),
+]
+
+
+def _record(action: str, detail: str):
+    WATCHDOG_ACTIONS_TOTAL.inc(action=action)
+    _state["last_action"] = {"action": action, "detail": detail, "at": time.time()}
+
+
+# ===============================
+# CHECK
+# ===============================
+def _check_idle():
+    unloaded = runtime.unload_idle_variants(MODEL_IDLE_UNLOAD)
+    if runtime.unload_default(MODEL_IDLE_UNLOAD):
+        unloaded.append(DEFAULT_MODEL)
+
+    if unloaded:
+        release_memory()
+        names = ", ".join(unloaded)
+        _record("idle_unload", names)
+        log.info(
+            f"Model idle > {MODEL_IDLE_UNLOAD:.0f}s di-unload: {names} "
+            f"(RSS sekarang {(rss_bytes() or 0) / 1e6:.0f} MB)"
+        )
+
+
+def _check_pressure():
+    reason = pressure()
+    if reason is None:
+        if _state["pressure"] is not None:
+            log.info("Memory pressure teratasi")
+        _state["pressure"] = None
+        return
+
+    if _state["pressure"] is None:
+        log.warning(f"Memory pressure: {reason}")
+
+    for action, step in PRESSURE_STEPS:
+        released = step()
+        if not released:
+            continue
+
+        release_memory()
+        _record(action, str(released))
+        log.warning(
+            f"Memory pressure → {action} ({released}), "
+            f"RSS sekarang {(rss_bytes() or 0) / 1e6:.0f} MB"
+        )
+
+        reason = pressure()
+        if reason is None:
+            log.info("Memory pressure teratasi")
+            _state["pressure"] = None
+            return
+
+    # Tidak ada lagi yang bisa dilepas; log sekali sampai kondisi berubah
+    if _state["pressure"] is None:
+        log.error(f"Memory pressure belum teratasi setelah semua langkah: {reason}")
+    _state["pressure"] = reason
+
+
+def check():
+    """
+    Satu putaran watchdog (dipanggil periodik oleh thread watchdog)
+    """
+    if MODEL_IDLE_UNLOAD > 0:
+        _check_idle()
+    if WATCHDOG_MAX_RSS or WATCHDOG_MIN_AVAILABLE:
+        _check_pressure()
+
+
+def _worker():
+    while True:
+        time.sleep(WATCHDOG_INTERVAL)
+        try:
+            check()
+        except Exception:
+            log.exception("Watchdog memory gagal")
+
+
+def start():
+    """
+    Mulai thread watchdog (idempotent). Tidak berjalan jika idle unload
+    maupun batas memory tidak dikonfigurasi.
+    """
+    global _thread
+
+    if not (MODEL_IDLE_UNLOAD > 0 or WATCHDOG_MAX_RSS or WATCHDOG_MIN_AVAILABLE):
+        return
+
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+
+        _thread = threading.Thread(target=_worker, name="memory-watchdog", daemon=True)
+        _thread.start()
+
+    log.info(
+        f"Watchdog memory aktif (interval {WATCHDOG_INTERVAL:.0f}s, "
+        f"idle unload {MODEL_IDLE_UNLOAD:.0f}s, max RSS {WATCHDOG_MAX_RSS}, "
+        f"min available {WATCHDOG_MIN_AVAILABLE})"
+    )
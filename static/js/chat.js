@@ -27,6 +27,21 @@ function hideTyping() {
     }
 }
 
+// ===============================
+// SSE PARSER
+// ===============================
+function parseEvent(block) {
+    let event = "message";
+    let data = "";
+
+    for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+    }
+
+    return { event, data: data ? JSON.parse(data) : {} };
+}
+
 // ===============================
 // CHAT
 // ===============================
@@ -40,22 +55,58 @@ async function sendMessage() {
 
     showTyping();
 
+    let msg = null;
+    const chatBox = document.getElementById("chat-box");
+
     try {
-        const res = await fetch("/chat", {
+        const res = await fetch("/chat/stream", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ text })
         });
 
-        const data = await res.json();
-        hideTyping();
-
-        if (!res.ok || data.error) {
+        if (!res.ok || !res.body) {
+            const data = await res.json().catch(() => ({}));
+            hideTyping();
             addMessage(data.error || "Terjadi kesalahan.", "ai");
             return;
         }
 
-        addMessage(data.reply, "ai");
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+
+            // Event SSE dipisah baris kosong
+            let sep;
+            while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                const { event, data } = parseEvent(buffer.slice(0, sep));
+                buffer = buffer.slice(sep + 2);
+
+                if (event === "token") {
+                    if (!msg) {
+                        hideTyping();
+                        msg = addMessage("", "ai");
+                    }
+                    msg.innerText += data.text;
+                    chatBox.scrollTop = chatBox.scrollHeight;
+                } else if (event === "done") {
+                    hideTyping();
+                    if (!msg) msg = addMessage("", "ai");
+                    msg.innerText = data.reply;
+                } else if (event === "error") {
+                    hideTyping();
+                    addMessage(data.error || "Terjadi kesalahan.", "ai");
+                }
+            }
+        }
+
+        hideTyping();
 
     } catch (e) {
         hideTyping();
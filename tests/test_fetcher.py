@@ -0,0 +1,267 @@
+"""
+tests/test_fetcher.py
+Test core.fetcher terhadap HTTP server lokal (tanpa network)
+
+Catatan:
+- Server http.server dengan dukungan Range (206 / Content-Range / 416),
+  bisa diatur: Range dimatikan, Range hanya untuk probe, atau response
+  chunk tertentu diputus di tengah
+- Jalankan dari root repo: python -m pytest tests
+  (atau python -m unittest discover tests)
+"""
+
+import hashlib
+import http.server
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+import zipfile
+from pathlib import Path
+
+from core import fetcher
+
+
+# ===============================
+# HTTP SERVER RANGE
+# ===============================
+class _Handler(http.server.BaseHTTPRequestHandler):
+    files: dict[str, bytes] = {}
+    # True = Range didukung, "probe" = hanya bytes=0-0 (server
+    # mengabaikan Range saat resume), False = tanpa Range
+    ranges: bool | str = True
+    # Offset awal Range yang response-nya diputus di tengah
+    broken: set[int] = set()
+    seen: list[str | None] = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        header = self.headers.get("Range")
+        self.seen.append(header)
+
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", header or "")
+        use_range = match and (
+            self.ranges is True or (self.ranges == "probe" and header == "bytes=0-0")
+        )
+
+        if not use_range:
+            body, start = data, None
+            self.send_response(200)
+        else:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            end = min(end, len(data) - 1)
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if start in self.broken:
+            # Koneksi putus di tengah chunk
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+
+class FetcherTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.data = os.urandom(300_000)
+        self.sha = hashlib.sha256(self.data).hexdigest()
+        _Handler.files = {"/f.bin": self.data}
+        _Handler.ranges = True
+        _Handler.broken = set()
+        _Handler.seen = []
+
+        self.url = self.base + "/f.bin"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / "f.bin"
+        self.part = Path(self.tmp.name) / "f.bin.part"
+        self.state = Path(self.tmp.name) / "f.bin.part.json"
+
+        # Gagal langsung, tanpa retry + sleep backoff
+        self._retries = fetcher.DOWNLOAD_RETRIES
+        fetcher.DOWNLOAD_RETRIES = 1
+
+    def tearDown(self):
+        fetcher.DOWNLOAD_RETRIES = self._retries
+        self.tmp.cleanup()
+
+    def assertDownloaded(self, digest: str):
+        self.assertEqual(digest, self.sha)
+        self.assertEqual(self.dest.read_bytes(), self.data)
+        self.assertFalse(self.part.exists())
+        self.assertFalse(self.state.exists())
+
+    def range_starts(self) -> list[int]:
+        return sorted(
+            int(h[6:].split("-")[0])
+            for h in _Handler.seen
+            if h and h != "bytes=0-0"
+        )
+
+    # ===============================
+    # PARALEL
+    # ===============================
+    def test_parallel_chunks(self):
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=4, chunk_size=64_000)
+
+        self.assertDownloaded(digest)
+        self.assertEqual(self.range_starts(), [0, 64_000, 128_000, 192_000, 256_000])
+
+    def test_parallel_resume_after_interrupt(self):
+        _Handler.broken = {128_000}
+        with self.assertRaises(Exception):
+            fetcher.fetch(self.url, self.dest, workers=4, chunk_size=64_000)
+
+        state = json.loads(self.state.read_text())
+        self.assertNotIn(2, state["done"])
+        self.assertEqual(self.part.stat().st_size, len(self.data))
+
+        _Handler.broken = set()
+        _Handler.seen = []
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=4, chunk_size=64_000)
+
+        self.assertDownloaded(digest)
+        # Hanya chunk yang belum selesai yang di-download ulang
+        self.assertEqual(
+            self.range_starts(),
+            sorted(i * 64_000 for i in range(5) if i not in state["done"]),
+        )
+
+    def test_parallel_state_other_chunk_size(self):
+        self.part.write_bytes(b"x" * len(self.data))
+        self.state.write_text(json.dumps({
+            "url": self.url,
+            "size": len(self.data),
+            "chunk_size": 32_000,
+            "done": list(range(10)),
+        }))
+
+        digest = fetcher.fetch(self.url, self.dest, workers=4, chunk_size=64_000)
+        self.assertDownloaded(digest)
+
+    # ===============================
+    # SATU KONEKSI
+    # ===============================
+    def _single_state(self, part: bytes, url: str | None = None):
+        self.part.write_bytes(part)
+        self.state.write_text(json.dumps({
+            "url": url or self.url,
+            "size": len(self.data),
+            "single": True,
+        }))
+
+    def test_single_resume(self):
+        self._single_state(self.data[:100_000])
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=1)
+
+        self.assertDownloaded(digest)
+        self.assertIn("bytes=100000-", _Handler.seen)
+
+    def test_single_complete_part_416(self):
+        self._single_state(self.data)
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=1)
+
+        self.assertDownloaded(digest)
+        self.assertIn(f"bytes={len(self.data)}-", _Handler.seen)
+
+    def test_single_part_from_other_url(self):
+        self._single_state(b"z" * 100_000, url=self.base + "/lain.bin")
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=1)
+
+        self.assertDownloaded(digest)
+        self.assertNotIn("bytes=100000-", _Handler.seen)
+
+    def test_single_part_without_state(self):
+        self.part.write_bytes(self.data[:1000] + b"junk")
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=1)
+        self.assertDownloaded(digest)
+
+    def test_server_without_range(self):
+        _Handler.ranges = False
+        self._single_state(b"x" * 1000)
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=4, chunk_size=64_000)
+        self.assertDownloaded(digest)
+
+    def test_server_ignores_range_on_resume(self):
+        _Handler.ranges = "probe"
+        self._single_state(self.data[:100_000])
+
+        digest = fetcher.fetch(self.url, self.dest, self.sha, workers=1)
+        self.assertDownloaded(digest)
+
+    # ===============================
+    # VERIFIKASI
+    # ===============================
+    def test_sha256_mismatch_cleanup(self):
+        self.dest.write_bytes(b"versi lama")
+
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                with self.assertRaises(fetcher.HashMismatchError):
+                    fetcher.fetch(self.url, self.dest, "0" * 64, workers=workers, chunk_size=64_000)
+
+                self.assertFalse(self.part.exists())
+                self.assertFalse(self.state.exists())
+                self.assertEqual(self.dest.read_bytes(), b"versi lama")
+
+    # ===============================
+    # FILE REMOTE SEEKABLE
+    # ===============================
+    def test_open_remote_zip(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("besar.bin", os.urandom(500_000))
+            zf.writestr("kecil.json", '{"ok": true}')
+        _Handler.files["/a.zip"] = buf.getvalue()
+
+        with fetcher.open_remote(self.base + "/a.zip", buffer_size=4096) as f:
+            with zipfile.ZipFile(f) as zf:
+                self.assertEqual(json.loads(zf.read("kecil.json")), {"ok": True})
+
+            # Hanya directory & entry kecil yang dibaca, bukan seluruh ZIP
+            self.assertLess(f.raw.requests, 5)
+
+        _Handler.ranges = False
+        self.assertIsNone(fetcher.open_remote(self.base + "/a.zip"))
+
+
+if __name__ == "__main__":
+    unittest.main()